@@ -0,0 +1,67 @@
+import threading
+from urllib.parse import urlparse
+
+from scan_helper import normalize_account_number, convert_to_float
+
+
+class AgreementSnapshot:
+    """
+    What was read from the approved agreement of one account during this run.
+    Only one invoice of an account is inputted at a time (see InvoiceQueue), so a snapshot
+    is never read and written by two browsers at the same time.
+    """
+    def __init__(self):
+        self.agreement_url = None  # only set if the agreement can be opened by its URL
+        self.comments = None
+        self.invoice_rows = None  # the invoices table, see snapshot_table
+        self.fiscal_remaining = dict()  # fiscal year -> remaining funding of the fiscal year
+        self.is_funding_pending = False
+        self.batch_invoice_numbers = set()  # the PPS invoice numbers of the bills which passed the pre-flight check
+
+    def set_agreement_url(self, url, search_url):
+        """Remembers the agreement URL, unless the agreement was opened by a postback on the search page"""
+        if urlparse(url).query != "" and url != search_url:
+            self.agreement_url = url
+
+    def has_funding_for(self, results, fiscal_year) -> bool:
+        """Whether the funding cached for the fiscal year is enough, False if it is not cached"""
+        remaining = self.fiscal_remaining.get(fiscal_year)
+        return remaining is not None and convert_to_float(results["amount_due"]) <= remaining
+
+    def set_remaining_funding(self, fiscal_year, remaining, is_funding_pending):
+        self.fiscal_remaining[fiscal_year] = remaining
+        self.is_funding_pending = is_funding_pending
+
+    def record_funding_request(self):
+        """The remaining funding is unknown until the request is approved"""
+        self.fiscal_remaining.clear()
+        self.is_funding_pending = True
+
+    def record_submission(self, results, invoice_number):
+        """Updates the snapshot with the invoice just submitted for approval"""
+        amount_due = convert_to_float(results["amount_due"])
+        # The agreement pays for every fiscal year, so each cached figure goes down
+        for fiscal_year in self.fiscal_remaining:
+            self.fiscal_remaining[fiscal_year] = round(self.fiscal_remaining[fiscal_year] - amount_due, 2)
+        if self.invoice_rows is not None:
+            # Its status is only known when the invoices tab is read again
+            self.invoice_rows.insert(0, [invoice_number] + [""] * 9)
+
+
+class AgreementCache:
+    """
+    The agreement snapshots of one batch, so the next bill of an account (e.g. catch-up months)
+    skips the comments check, and the funding check when the cached funding is enough.
+
+    Usage:
+        agreement_cache = AgreementCache()
+        pps_single_invoice_input(results, driver, agreement_cache)
+    """
+    def __init__(self):
+        self.snapshots = dict()
+        self.lock = threading.Lock()
+
+    def get(self, account_number) -> AgreementSnapshot:
+        """Returns the snapshot of the account, an empty one the first time"""
+        with self.lock:
+            return self.snapshots.setdefault(normalize_account_number(account_number), AgreementSnapshot())
@@ -0,0 +1,174 @@
+import json
+import os
+import threading
+import time
+
+import Global_variables
+from scan_helper import normalize_account_number
+
+# Invoice states, in the order a todo invoice goes through them
+PARSED = "parsed"  # the PDF is scanned and checked, the results are in the checkpoint
+VALIDATED = "validated"  # passed the pre-flight check
+SUBMITTING = "submitting"  # about to change PPS, the invoice may be in PPS from here on
+SUBMITTED = "submitted"  # inputted into PPS, the indicator is in the checkpoint
+PDF_COPIED = "pdf_copied"  # the renamed PDF is in 'Temp Hydro Invoices'
+LEDGERED = "ledgered"  # the outcome is in the outcome journal, nothing is left to resume
+
+_STATE_ORDER = [PARSED, VALIDATED, SUBMITTING, SUBMITTED, PDF_COPIED, LEDGERED]
+
+# Checkpoint path -> the BatchCheckpoint open in this process, see ledger_invoices
+_open_checkpoints = dict()
+_open_checkpoints_lock = threading.RLock()
+
+
+def get_invoice_key(account_number, pdf_file_path) -> str:
+    """
+    The key of one todo invoice in the checkpoint, made of the account number and the PDF,
+    so a PDF replaced in the folder is scanned again.
+    """
+    stat = os.stat(pdf_file_path)
+    return f"{normalize_account_number(account_number)}|{os.path.basename(pdf_file_path)}|{stat.st_size}|{stat.st_mtime_ns}"
+
+
+class BatchCheckpoint:
+    """
+    The state of every invoice of the running batch, in an append-only JSON-lines file.
+    Every line is fsync'd before 'record' returns, so when the program or the browser crashes,
+    the next run resumes each invoice from its last state: it is not scanned again once PARSED,
+    and never inputted into PPS again once SUBMITTING.
+    When a batch ends, the file keeps only the invoices which are not ledgered, and is removed if there are none.
+
+    Usage:
+        with BatchCheckpoint() as checkpoint:
+            checkpoint.record(key, SUBMITTED, indicator=2)
+    """
+    def __init__(self, checkpoint_path=None):
+        self.checkpoint_path = Global_variables.batch_checkpoint_path if checkpoint_path is None else checkpoint_path
+        self.states = dict()  # key -> state
+        self.data = dict()  # key -> the data recorded with the states
+        self.lock = threading.Lock()
+        with _open_checkpoints_lock:
+            self._load()
+            self.file = open(self.checkpoint_path, "a", encoding="utf-8")
+            _open_checkpoints[self.checkpoint_path] = self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def _load(self):
+        try:
+            with open(self.checkpoint_path, "rb") as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        # The last line was being written when the program stopped
+                        break
+                    entry = json.loads(line)
+                    self._apply(entry["key"], entry["state"], entry["data"])
+        except FileNotFoundError:
+            pass
+
+    def _apply(self, key, state, data):
+        if state == LEDGERED:
+            # Out of To Do, an invoice put back into To Do later is a new invoice
+            self.states.pop(key, None)
+            self.data.pop(key, None)
+            return
+        # A state never goes back, e.g. a late PARSED after SUBMITTING
+        if key not in self.states or _STATE_ORDER.index(state) > _STATE_ORDER.index(self.states[key]):
+            self.states[key] = state
+        self.data.setdefault(key, dict()).update(data)
+
+    def record(self, key, state, **data):
+        """
+        :param key: see get_invoice_key
+        :param state: PARSED, VALIDATED, SUBMITTING, SUBMITTED, PDF_COPIED or LEDGERED
+        :param data: JSON values kept with the invoice, e.g. results=... or indicator=...
+        """
+        entry = {"time": time.time(), "key": key, "state": state, "data": data}
+        with self.lock:
+            self.file.write(json.dumps(entry) + "\n")
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self._apply(key, state, data)
+
+    def get_state(self, key):
+        """The last state of the invoice, None if it was not started or was ledgered"""
+        with self.lock:
+            return self.states.get(key)
+
+    def get_data(self, key) -> dict:
+        with self.lock:
+            return dict(self.data.get(key, dict()))
+
+    def has_reached(self, key, state) -> bool:
+        """Whether the invoice went through 'state' already"""
+        current_state = self.get_state(key)
+        return current_state is not None and _STATE_ORDER.index(current_state) >= _STATE_ORDER.index(state)
+
+    def close(self):
+        self._unregister()
+        self.file.close()
+
+    def _unregister(self):
+        # Before self.lock is taken, ledger_invoices takes the locks in the other order
+        with _open_checkpoints_lock:
+            if _open_checkpoints.get(self.checkpoint_path) is self:
+                del _open_checkpoints[self.checkpoint_path]
+
+    def finish(self):
+        """
+        Ends the batch. The file is rewritten with one line per invoice which is not ledgered,
+        e.g. an invoice left SUBMITTING by a crashed batch and not in this one, so it is never inputted twice.
+        The file is removed if every invoice is ledgered.
+        An invoice whose outcome was journaled by a batch which stopped before recording LEDGERED
+        is ledgered by the sync which writes the outcome into the Excel files, see ledger_invoices.
+        """
+        self._unregister()
+        with self.lock:
+            self.file.close()
+            if len(self.states) == 0:
+                try:
+                    os.remove(self.checkpoint_path)
+                except FileNotFoundError:
+                    pass
+                return
+
+            # Written to a temp file first and then renamed, so a crash never leaves half of the checkpoint
+            temp_path = self.checkpoint_path + ".tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                for key, state in self.states.items():
+                    entry = {"time": time.time(), "key": key, "state": state, "data": self.data.get(key, dict())}
+                    f.write(json.dumps(entry) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.checkpoint_path)
+
+
+def ledger_invoices(keys):
+    """
+    Records LEDGERED for the invoices whose outcome is in the Excel files and which are out of To Do,
+    e.g. when the program stopped between journaling the outcome and recording LEDGERED,
+    so they are not kept in the checkpoint forever. The checkpoint of a running batch is updated in memory as well.
+    :param keys: see get_invoice_key, the keys which are not in the checkpoint are skipped
+    """
+    with _open_checkpoints_lock:
+        checkpoint = _open_checkpoints.get(Global_variables.batch_checkpoint_path)
+        if checkpoint is not None:
+            for key in keys:
+                if checkpoint.get_state(key) is not None:
+                    checkpoint.record(key, LEDGERED)
+            return
+
+        if not os.path.exists(Global_variables.batch_checkpoint_path):
+            return
+        with BatchCheckpoint() as checkpoint:
+            ledgered_keys = [key for key in keys if checkpoint.get_state(key) is not None]
+            if len(ledgered_keys) == 0:
+                return
+            for key in ledgered_keys:
+                checkpoint.record(key, LEDGERED)
+            checkpoint.finish()
@@ -0,0 +1,60 @@
+import threading
+import time
+
+from PyQt5.QtCore import QObject, pyqtSignal, pyqtSlot
+
+from Web_page_interact import pps_multiple_invoices_input
+
+
+class BatchWorker(QObject):
+    """
+    Runs pps_multiple_invoices_input in a QThread, so the window keeps responding during the batch.
+    The signals are emitted from the batch thread, Qt delivers them in the GUI thread.
+
+    Usage:
+        worker = BatchWorker(todo_invoices)
+        worker.moveToThread(thread)
+        thread.started.connect(worker.run)
+    """
+    # (account number, outcome), outcome is SUCCEED, FUNDING_REQUESTED, FAILED, SAVED, DONE, or "" if left in To Do
+    invoiceFinished = pyqtSignal(str, str)
+    # (finished invoices, total invoices)
+    progressChanged = pyqtSignal(int, int)
+    # The estimated seconds left
+    etaChanged = pyqtSignal(float)
+    # Why the batch stopped before its end, emitted before 'finished'
+    error = pyqtSignal(str)
+    # Whether the batch was cancelled
+    finished = pyqtSignal(bool)
+
+    def __init__(self, todo_invoices, parent=None):
+        """
+        :param todo_invoices: a list of [account number, vendor]
+        """
+        super().__init__(parent)
+        self.todo_invoices = todo_invoices
+        self.cancel_event = threading.Event()
+        self.start_time = None
+
+    def cancel(self):
+        """Stops the batch after the invoices in progress, called from the GUI thread"""
+        self.cancel_event.set()
+
+    @pyqtSlot()
+    def run(self):
+        # A slot, so QThread.started runs it in the batch thread
+        self.start_time = time.monotonic()
+        try:
+            pps_multiple_invoices_input(self.todo_invoices, self.report_progress, self.cancel_event)
+        except Exception as e:
+            print(f"The batch stopped: {type(e).__name__}: {e}")
+            self.error.emit(f"The batch stopped: {str(e) or type(e).__name__}")
+        finally:
+            self.finished.emit(self.cancel_event.is_set())
+
+    def report_progress(self, account_number, outcome, finished_count, total_count):
+        self.invoiceFinished.emit(str(account_number), "" if outcome is None else outcome)
+        self.progressChanged.emit(finished_count, total_count)
+        # The browsers work in parallel, so the mean time between two finished invoices is the rate
+        elapsed = time.monotonic() - self.start_time
+        self.etaChanged.emit(elapsed / finished_count * (total_count - finished_count))
@@ -0,0 +1,125 @@
+import queue
+import threading
+from collections import deque
+
+from scan_helper import normalize_account_number
+
+
+class BrowserPoolError(Exception):
+    """Exception raised for the invoices left when no browser worker is running"""
+
+
+class InvoiceQueue:
+    """
+    The todo invoices shared by the browser workers.
+    An invoice is only handed out when no other worker is working on the same account,
+    so one account is never inputted into PPS by two browsers at the same time.
+    """
+    def __init__(self, items):
+        """
+        :param items: a list of (invoice, payload), invoice[0] is the account number
+        """
+        self.items = deque(items)
+        self.in_flight_accounts = set()
+        self.condition = threading.Condition()
+
+    def take(self):
+        """
+        Returns the next (invoice, payload) whose account is not in flight, waiting if every
+        remaining invoice belongs to an account in flight. Returns None when the queue is empty.
+        """
+        with self.condition:
+            while len(self.items) > 0:
+                for i, item in enumerate(self.items):
+                    account = normalize_account_number(item[0][0])
+                    if account not in self.in_flight_accounts:
+                        del self.items[i]
+                        self.in_flight_accounts.add(account)
+                        return item
+                self.condition.wait()
+            return None
+
+    def done(self, item):
+        """Releases the account of an invoice returned by take"""
+        with self.condition:
+            self.in_flight_accounts.discard(normalize_account_number(item[0][0]))
+            self.condition.notify_all()
+
+    def drain(self) -> list:
+        """Removes and returns every invoice not taken yet"""
+        with self.condition:
+            items = list(self.items)
+            self.items.clear()
+            self.condition.notify_all()
+            return items
+
+
+def _browser_worker(invoice_queue, result_queue, start_browser, stop_browser, process_invoice, cancel_event):
+    try:
+        driver = start_browser()
+    except Exception as e:
+        print(f"Failed to start a browser worker: {type(e).__name__}: {e}")
+        return
+
+    try:
+        while cancel_event is None or not cancel_event.is_set():
+            item = invoice_queue.take()
+            if item is None:
+                break
+            invoice, payload = item
+            try:
+                result = process_invoice(invoice, payload, driver)
+            except Exception as e:
+                result = e
+            finally:
+                invoice_queue.done(item)
+            result_queue.put((invoice, result))
+    finally:
+        stop_browser(driver)
+
+
+def run_browser_pool(items, worker_count, start_browser, stop_browser, process_invoice, on_result, cancel_event=None):
+    """
+    Processes the invoices with 'worker_count' browsers, each browser in its own thread.
+    The results are handed to 'on_result' in the calling thread, one at a time,
+    so the outcomes are written by a single writer.
+    :param items: a list of (invoice, payload), invoice[0] is the account number
+    :param worker_count: the number of browsers
+    :param start_browser: a function returning a logged-in driver, called in each worker thread
+    :param stop_browser: a function closing the driver
+    :param process_invoice: a function of (invoice, payload, driver), its return value is the result
+    :param on_result: a function of (invoice, result), the result is the exception if process_invoice raised one
+    :param cancel_event: a threading.Event, once set the invoices in progress are finished and the others are
+        handed to 'on_result' with a BrowserPoolError
+    """
+    invoice_queue = InvoiceQueue(items)
+    result_queue = queue.Queue()
+    workers = [threading.Thread(target=_browser_worker,
+                                args=(invoice_queue, result_queue, start_browser, stop_browser, process_invoice, cancel_event),
+                                daemon=True)
+               for _ in range(max(1, min(worker_count, len(items))))]
+    for worker in workers:
+        worker.start()
+
+    remaining = len(items)
+    is_cancelled = False
+    while remaining > 0:
+        if not is_cancelled and cancel_event is not None and cancel_event.is_set():
+            is_cancelled = True
+            for invoice, payload in invoice_queue.drain():
+                result_queue.put((invoice, BrowserPoolError("The batch was cancelled")))
+        try:
+            invoice, result = result_queue.get(timeout=1)
+        except queue.Empty:
+            if any(worker.is_alive() for worker in workers):
+                continue
+            # Every browser is gone, e.g. none of them could log in
+            if result_queue.empty():
+                for invoice, payload in invoice_queue.drain():
+                    result_queue.put((invoice, BrowserPoolError("No browser worker is running")))
+            continue
+        on_result(invoice, result)
+        remaining -= 1
+
+    for worker in workers:
+        worker.join()
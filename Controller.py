@@ -24,27 +24,40 @@ class Controller:
         # When vendor name is dropped into account text bar, update the model
         self.view.middle_widget.dropTextChanged.connect(self.model.update_todo_invoice)
         # When todo_invoice is deleted from View, request Model to delete it as well
-        self.view.middle_widget.textBarDeleted.connect(self.model.delete_todo_invoice)
+        self.view.middle_widget.invoiceDeleted.connect(self.model.delete_todo_invoice)
         # When state of checkbox of todo_invoice in View, request Model to update it as well
         self.view.middle_widget.checkboxStateChanged.connect(self.model.update_invoice_checkbox_state)
         # Left section update required signal, request Model to return data
         self.view.left_section_update_required.connect(self.model.send_left_section_data)
         # When the Left section data is ready, update left section in View
         self.model.left_section_data_ready.connect(self.view.update_left_section)
-        # When the invoice data in Model changed, refresh in View
-        self.model.todoInvoicesChanged.connect(self.on_model_changed)
+        # When invoices are added, removed or changed in Model, patch only those rows in View
+        self.model.todoInvoiceAdded.connect(self.view.middle_widget.add_invoice_from_model)
+        self.model.todoInvoiceRemoved.connect(self.view.middle_widget.remove_invoice_from_model)
+        self.model.todoInvoiceChanged.connect(self.view.middle_widget.update_invoice_from_model)
+        self.model.todoInvoicesAdded.connect(self.view.middle_widget.add_invoices_from_model)
+        # When account numbers are pasted or a file is imported, add them all to the model at once
+        self.view.middle_widget.pasteImportRequested.connect(self.model.import_pasted_text)
+        self.view.middle_widget.fileImportRequested.connect(self.model.import_todo_file)
+        # When a search is entered, look it up in the ledgers, and list the rows found in View
+        self.view.middle_widget.ledgerSearchRequested.connect(self.model.search_ledgers)
+        self.model.ledgerMatchesFound.connect(self.view.middle_widget.show_ledger_matches)
+        # When a ledger row is chosen, open the ledger at that row
+        self.view.middle_widget.ledgerRowOpenRequested.connect(self.model.open_ledger_row)
         # Send notification from Model to View
         self.model.notificationPromted.connect(self.show_notification)
+        # When Cancel button is clicked, request the model to stop the batch after the invoices in progress
+        self.view.todoInvoicesCancelRequest.connect(self.model.cancel_processing)
+        # While a batch is running, show its progress and the outcome of each invoice in View
+        self.model.batchRunningChanged.connect(self.view.set_batch_running)
+        self.model.batchProgressChanged.connect(self.view.update_batch_progress)
+        self.model.batchEtaChanged.connect(self.view.update_batch_eta)
+        self.model.invoiceProcessed.connect(self.view.middle_widget.set_invoice_status)
 
         # Read todoinvoices from Excel, and display on View
         self.model.read_todo_invoices_from_excel()
 
 
-    def on_model_changed(self):
-        self.view.middle_widget.clear_text_bars_in_view()
-        for pair in self.model.get_todo_invoices():
-            self.view.middle_widget.add_text_bar_from_model(pair[0], pair[1][0], pair[1][1])
-
     def show_notification(self, message):
         self.view.middle_widget.expand_notification(message)
 
@@ -56,3 +56,12 @@ class NegativeAmountError(UnsaveableError):
     def __init__(self, account_number):
         UnsaveableError.__init__(self, account_number, "has negative amount")
 
+
+class AmbiguousInvoicePDFError(UnsaveableError):
+    """Exception raised when more than one invoice PDF matches the account number"""
+    def __init__(self, account_number, file_names):
+        UnsaveableError.__init__(self, account_number, "matches more than one invoice PDF: " + ", ".join(file_names))
+
+
+class InvoiceFolderError(Exception):
+    """Exception raised when the invoice PDF folder is not configured or not found, no invoice can be processed"""
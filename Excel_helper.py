@@ -3,36 +3,21 @@ from openpyxl import load_workbook
 import os
 import subprocess
 import platform
+import tempfile
+import time
 import Global_variables
 
-def populate_invoice_numbers(
-        file_path: str,
-        sheet_name: str,
-        column_name: str,
-        invoice_numbers: list
-):
-    """
-    Populates the 'Invoice Number' column in an Excel sheet with values from 'invoice_numbers'.
-    If a row already has a value in that column, it is skipped.
-    :param file_path: Full path to the Excel file (e.g., r"C:\...\Failed Invoices\invoices.xlsx").
-    :param sheet_name: The sheet name in the workbook where the data is located.
-    :param column_name: The header name for the 'Invoice Number' column.
-    :param invoice_numbers: A list of integers or strings representing invoice numbers.
-    """
-
-    # Load the workbook and select the sheet
-    wb = openpyxl.load_workbook(file_path)
-    ws = wb[sheet_name]
-
-    # Find which column index corresponds to 'column_name' in the first row
-    col_index = None
+def _find_column_index(ws, column_name: str) -> int:
+    """Returns the index of the column whose header in the first row is 'column_name'"""
     for cell in ws[1]:  # Assuming the first row has the headers
         if cell.value == column_name:
-            col_index = cell.column
-            break
+            return cell.column
+    raise ValueError(f"Column '{column_name}' not found in the header row.")
 
-    if col_index is None:
-        raise ValueError(f"Column '{column_name}' not found in the header row.")
+
+def _populate_column_in_sheet(ws, column_name: str, invoice_numbers: list) -> None:
+    """Fills the values into the empty cells of the column, see populate_invoice_numbers"""
+    col_index = _find_column_index(ws, column_name)
 
     # Iterate over rows starting from row 2 (to skip the header)
     # and fill in the invoice numbers in any empty cells under the specified column
@@ -49,8 +34,89 @@ def populate_invoice_numbers(
             current_cell.value = invoice_numbers[num_index]
             num_index += 1
 
+
+def _insert_tuples_in_sheet(ws, data: list[tuple]) -> None:
+    """Places the tuples into the first empty rows, see insert_tuples_in_excel"""
+    # Keep track of which tuple we are on
+    data_index = 0
+    total_tuples = len(data)
+
+    # We will check rows starting from 2 (to skip header row),
+    # and go up to a "safe" upper limit (current max_row + number of tuples).
+    max_possible_row = ws.max_row + total_tuples + 10  # a buffer of 10 rows, adjust if needed
+
+    # Iterate over each row until we place all tuples
+    for row in range(2, max_possible_row + 1):
+        if data_index >= total_tuples:
+            break  # we've placed all the tuples
+
+        # Check if this row is empty in *any* column up to ws.max_column
+        # You could expand this range if you want to be sure about columns beyond max_column.
+        row_has_content = any(ws.cell(row=row, column=col).value
+                              for col in range(1, ws.max_column + 1))
+
+        if not row_has_content:
+            # Row is empty, so place the tuple here
+            current_tuple = data[data_index]
+            for col_index, value in enumerate(current_tuple, start=1):
+                ws.cell(row=row, column=col_index, value=value)
+            data_index += 1
+        else:
+            # This row already has content, skip it
+            continue
+
+
+def _delete_matching_in_sheet(ws, column_name: str, match_value) -> None:
+    """Clears the matching cells and the cells next to them, see delete_cell_content_if_matches"""
+    col_index = _find_column_index(ws, column_name)
+
+    # Iterate over all rows after the header to find matching values
+    for row in range(2, ws.max_row + 1):
+        cell = ws.cell(row=row, column=col_index)
+        if cell.value == match_value:
+            # Clear the cell content
+            cell.value = None
+            # Clear the cell with col index+1
+            cell = ws.cell(row=row, column=col_index+1)
+            cell.value = None
+
+
+def save_workbook(wb, file_path: str) -> None:
+    """
+    Saves the workbook into a temp file next to 'file_path' first and then replaces the file,
+    so a crash while saving never leaves a half-written Excel file.
+    """
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(file_path)), suffix=".xlsx")
+    os.close(fd)
+    try:
+        wb.save(temp_path)
+        os.replace(temp_path, file_path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+def populate_invoice_numbers(
+        file_path: str,
+        sheet_name: str,
+        column_name: str,
+        invoice_numbers: list
+):
+    """
+    Populates the 'Invoice Number' column in an Excel sheet with values from 'invoice_numbers'.
+    If a row already has a value in that column, it is skipped.
+    :param file_path: Full path to the Excel file (e.g., r"C:\...\Failed Invoices\invoices.xlsx").
+    :param sheet_name: The sheet name in the workbook where the data is located.
+    :param column_name: The header name for the 'Invoice Number' column.
+    :param invoice_numbers: A list of integers or strings representing invoice numbers.
+    """
+
+    # Load the workbook and select the sheet
+    wb = openpyxl.load_workbook(file_path)
+    _populate_column_in_sheet(wb[sheet_name], column_name, invoice_numbers)
+
     # Save changes
-    wb.save(file_path)
+    save_workbook(wb, file_path)
 
 def read_column_values(file_path: str, sheet_name: str, column_name: str) -> list:
     """
@@ -88,6 +154,59 @@ def read_column_values(file_path: str, sheet_name: str, column_name: str) -> lis
 
     return values
 
+
+# (file path, sheet name, column name) -> (file size, modification time, rows)
+_column_rows_cache = dict()
+
+
+def read_column_value_rows(file_path: str, sheet_name: str, column_name: str) -> list[tuple]:
+    """
+    Returns (row number, value) of each value in the specified column, e.g. to find an invoice in a ledger.
+    The workbook is streamed in read-only mode, and the rows are re-used until the file changes,
+    so the same list is returned as long as the file is not written.
+
+    :param file_path: Full path to the Excel file.
+    :param sheet_name: The name of the worksheet to read from.
+    :param column_name: The exact header of the target column in the first row.
+    """
+    stat = os.stat(file_path)
+    cache_key = (os.path.abspath(file_path), sheet_name, column_name)
+    cached = _column_rows_cache.get(cache_key)
+    if cached is not None and cached[:2] == (stat.st_size, stat.st_mtime_ns):
+        return cached[2]
+
+    wb = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        rows = wb[sheet_name].iter_rows(values_only=True)
+        header = next(rows, ())
+        if column_name not in header:
+            raise ValueError(f"Column '{column_name}' not found in the first row headers.")
+        column_index = header.index(column_name)
+
+        value_rows = []
+        for row_number, row in enumerate(rows, start=2):
+            if column_index < len(row) and row[column_index] is not None:
+                value_rows.append((row_number, row[column_index]))
+    finally:
+        # A read-only workbook keeps the file open until it is closed
+        wb.close()
+
+    _column_rows_cache[cache_key] = (stat.st_size, stat.st_mtime_ns, value_rows)
+    return value_rows
+
+
+def count_column_values(file_path: str, sheet_name: str, column_name: str) -> int:
+    """
+    Returns the number of values in the specified column, the same as len(read_column_values(...)).
+    The rows are read by read_column_value_rows, so the count is re-used until the file changes.
+
+    :param file_path: Full path to the Excel file.
+    :param sheet_name: The name of the worksheet to read from.
+    :param column_name: The exact header of the target column in the first row.
+    """
+    return len(read_column_value_rows(file_path, sheet_name, column_name))
+
+
 def insert_tuples_in_excel(file_path: str, sheet_name: str, data: list[tuple]) -> None:
     """
     Inserts each tuple in 'data' into the first empty rows in the given Excel sheet.
@@ -99,38 +218,10 @@ def insert_tuples_in_excel(file_path: str, sheet_name: str, data: list[tuple]) -
     """
     # Load the workbook and select the sheet
     wb = openpyxl.load_workbook(file_path)
-    ws = wb[sheet_name]
-
-    # Keep track of which tuple we are on
-    data_index = 0
-    total_tuples = len(data)
-
-    # We will check rows starting from 2 (to skip header row),
-    # and go up to a "safe" upper limit (current max_row + number of tuples).
-    max_possible_row = ws.max_row + total_tuples + 10  # a buffer of 10 rows, adjust if needed
-
-    # Iterate over each row until we place all tuples
-    for row in range(2, max_possible_row + 1):
-        if data_index >= total_tuples:
-            break  # we've placed all the tuples
-
-        # Check if this row is empty in *any* column up to ws.max_column
-        # You could expand this range if you want to be sure about columns beyond max_column.
-        row_has_content = any(ws.cell(row=row, column=col).value
-                              for col in range(1, ws.max_column + 1))
-
-        if not row_has_content:
-            # Row is empty, so place the tuple here
-            current_tuple = data[data_index]
-            for col_index, value in enumerate(current_tuple, start=1):
-                ws.cell(row=row, column=col_index, value=value)
-            data_index += 1
-        else:
-            # This row already has content, skip it
-            continue
+    _insert_tuples_in_sheet(wb[sheet_name], data)
 
     # Save the workbook
-    wb.save(file_path)
+    save_workbook(wb, file_path)
 
 
 def delete_cell_content_if_matches(
@@ -150,30 +241,81 @@ def delete_cell_content_if_matches(
 
     # Load the workbook and select the specified sheet
     wb = openpyxl.load_workbook(file_path)
-    ws = wb[sheet_name]
+    _delete_matching_in_sheet(wb[sheet_name], column_name, match_value)
 
-    # Identify which column index corresponds to 'column_name' in the header row
-    col_index = None
-    for cell in ws[1]:  # Assuming the first row has column headers
-        if cell.value == column_name:
-            col_index = cell.column
-            break
+    # Save changes
+    save_workbook(wb, file_path)
 
-    if col_index is None:
-        raise ValueError(f"Column '{column_name}' not found in the header row.")
 
-    # Iterate over all rows after the header to find matching values
-    for row in range(2, ws.max_row + 1):
-        cell = ws.cell(row=row, column=col_index)
-        if cell.value == match_value:
-            # Clear the cell content
-            cell.value = None
-            # Clear the cell with col index+1
-            cell = ws.cell(row=row, column=col_index+1)
-            cell.value = None
+class ExcelLedgerWriter:
+    """
+    Writes the outcomes of a batch into the Succeed, Funding Requested, Failed, Saved and To Do workbooks.
+    The workbooks are loaded once and kept in memory for the whole batch. Changes are buffered and
+    written into the files every 'flush_interval' seconds, and when the batch ends (even by an exception).
+    The To Do workbook is saved last, and only when every outcome workbook is saved,
+    so an invoice never leaves To Do before its outcome is on disk.
+
+    Usage:
+        with ExcelLedgerWriter() as ledger:
+            ledger.insert_tuples_in_excel(Global_variables.failed_invoices_excel_path, "Sheet1", [(account, message)])
+    """
+    def __init__(self, flush_interval=None):
+        self.flush_interval = Global_variables.ledger_flush_interval if flush_interval is None else flush_interval
+        self.workbooks = dict()
+        self.pending_changes = dict()
+        self.unsaved_paths = set()
+        # The workbooks saved by this writer, kept even when a later save raises
+        self.saved_paths = set()
+        self.last_flush_time = time.monotonic()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.flush()
+        return False
 
-    # Save changes
-    wb.save(file_path)
+    def _add_change(self, file_path, change):
+        self.pending_changes.setdefault(file_path, []).append(change)
+        if time.monotonic() - self.last_flush_time >= self.flush_interval:
+            self.flush()
+
+    def populate_invoice_numbers(self, file_path: str, sheet_name: str, column_name: str, invoice_numbers: list):
+        """Buffered version of populate_invoice_numbers"""
+        self._add_change(file_path, lambda wb: _populate_column_in_sheet(wb[sheet_name], column_name, invoice_numbers))
+
+    def insert_tuples_in_excel(self, file_path: str, sheet_name: str, data: list[tuple]):
+        """Buffered version of insert_tuples_in_excel"""
+        self._add_change(file_path, lambda wb: _insert_tuples_in_sheet(wb[sheet_name], data))
+
+    def delete_cell_content_if_matches(self, file_path: str, sheet_name: str, column_name: str, match_value):
+        """Buffered version of delete_cell_content_if_matches"""
+        self._add_change(file_path, lambda wb: _delete_matching_in_sheet(wb[sheet_name], column_name, match_value))
+
+    def flush(self):
+        """Applies the buffered changes and saves every changed workbook"""
+        self.last_flush_time = time.monotonic()
+        for file_path, changes in self.pending_changes.items():
+            if file_path not in self.workbooks:
+                self.workbooks[file_path] = openpyxl.load_workbook(file_path)
+            for change in changes:
+                change(self.workbooks[file_path])
+            self.unsaved_paths.add(file_path)
+        self.pending_changes = dict()
+
+        # Save the outcome workbooks before the To Do workbook
+        outcomes_saved = True
+        for file_path in sorted(self.unsaved_paths, key=lambda path: path == Global_variables.todo_invoices_excel_path):
+            if file_path == Global_variables.todo_invoices_excel_path and not outcomes_saved:
+                break
+            try:
+                save_workbook(self.workbooks[file_path], file_path)
+                self.unsaved_paths.discard(file_path)
+                self.saved_paths.add(file_path)
+            except PermissionError:
+                # Usually the file is open in Excel, it is saved again on the next flush
+                print(f"Permission denied to save: {file_path}")
+                outcomes_saved = False
 
 
 def clear_all(
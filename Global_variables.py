@@ -7,6 +7,32 @@ renamed_invoices_dir_path = r"C:.\Temp Hydro Invoices"
 configuration_file_path = r"C:.\Configuration.txt"
 help_file_path = r".\Help.txt"
 
+# The PPS home page, see Mock_PPS_server for a local stand-in
+pps_url = "https://pps.mto.ad.gov.on.ca/Home.aspx"
+
 is_period_validation_needed = False
 period_need_validate = 0
-maximum_payment_amount = 20000
\ No newline at end of file
+maximum_payment_amount = 20000
+maximum_parse_workers = 4
+pdf_text_cache_dir_path = r".\PDF Text Cache"
+# The PDF text cache is pruned when a batch starts, see prune_pdf_text_cache
+pdf_text_cache_max_age_days = 90
+pdf_text_cache_max_size = 200 * 1024 * 1024
+ledger_flush_interval = 30
+outcome_journal_path = r".\Invoice Outcomes.jsonl"
+outcome_journal_offsets_path = r".\Invoice Outcomes Exported.json"
+batch_checkpoint_path = r".\Batch Checkpoint.jsonl"
+browser_workers = 1
+preflight_check = True  # Check every bill against the invoice history of its account before inputting any
+browser_profile_dir_path = r".\Browser Profiles"
+
+# Chrome options of the PPS browsers, see create_driver
+browser_headless = False
+browser_block_images = True
+browser_block_stylesheets = False  # Without stylesheets, elements hidden by CSS look visible to WebDriverWait
+browser_page_load_strategy = "eager"
+browser_window_size = (1280, 900)
+
+# Input invoices with plain HTTP postbacks instead of the browser, see PPS_http_client
+pps_http_client = False
+pps_http_timeout = 30
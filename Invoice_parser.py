@@ -0,0 +1,103 @@
+import os
+from concurrent.futures import Future, ProcessPoolExecutor
+
+import Global_variables
+from Batch_checkpoint import get_invoice_key, PARSED
+from CustomizedExceptions import AmountError, UnsaveableError
+from VendorInvoicesExtraction.registry import get_vendor_parser
+from scan_helper import self_check
+
+
+def scan_invoice(pdf_file_path, vendor):
+    """Scan the invoice PDF with the right scanning method of the vendor"""
+    parser = get_vendor_parser(vendor)
+    if parser is None:
+        print(f"Invalid Vendor Name: {vendor}")
+        return None
+    return parser(pdf_file_path)
+
+
+def parse_invoice(invoice, pdf_file_path):
+    """
+    Scan the PDF of one todo invoice and check the extracted data.
+    It runs in a worker process, so the error is returned instead of raised.
+    :param invoice: [account number, vendor]
+    :param pdf_file_path: the invoice PDF found by InvoicePDFIndex
+    :return: (pdf_file_path, results, error), results is None if scanning failed
+    """
+    results = None
+    try:
+        results = scan_invoice(pdf_file_path, invoice[1])
+        if results is None:
+            raise UnsaveableError(invoice[0], 'Invalid vendor name')
+
+        # Check invoice[0] (account number) match the account number in PDF
+        if invoice[0] not in results['account_number']:
+            raise UnsaveableError(invoice[0], f"The data in file named '{invoice[0]}' contains the data of '{results['account_number']}'")
+
+        # Check data is reasonable or not
+        if not self_check(results):
+            raise AmountError(invoice[0])
+    except Exception as e:
+        return pdf_file_path, results, e
+    return pdf_file_path, results, None
+
+
+def submit_invoices_for_parsing(executor, invoices_todo_lst, invoice_pdf_index, checkpoint=None):
+    """
+    Submit every todo invoice to the process pool, so PDFs are scanned while the browser works.
+    The PDFs are looked up here, so the folder is listed once and not in every worker process.
+    :param invoice_pdf_index: the InvoicePDFIndex of the invoice folder
+    :param checkpoint: the BatchCheckpoint of the batch, invoices parsed by an interrupted run are not scanned again
+    :return: a list of futures, in the same order as 'invoices_todo_lst'
+    """
+    parse_futures = []
+    for invoice in invoices_todo_lst:
+        parse_future = Future()
+        try:
+            pdf_file_path = invoice_pdf_index.find(invoice[0])
+        except UnsaveableError as e:
+            # Nothing to scan, the error is reported when the invoice's turn comes
+            parse_future.set_result((None, None, e))
+            parse_futures.append(parse_future)
+            continue
+
+        invoice_key = None if checkpoint is None else get_invoice_key(invoice[0], pdf_file_path)
+        checkpoint_data = dict() if invoice_key is None else checkpoint.get_data(invoice_key)
+        if "results" in checkpoint_data:
+            parse_future.set_result((pdf_file_path, checkpoint_data["results"], None))
+        else:
+            parse_future = executor.submit(parse_invoice, invoice, pdf_file_path)
+            if invoice_key is not None:
+                parse_future.add_done_callback(
+                    lambda future, invoice_key=invoice_key: _record_parsed(checkpoint, invoice_key, future))
+        parse_futures.append(parse_future)
+    return parse_futures
+
+
+def _record_parsed(checkpoint, invoice_key, future):
+    pdf_file_path, results, error = get_parsed_invoice(future)
+    if error is None:
+        checkpoint.record(invoice_key, PARSED, results=results)
+
+
+def get_parsed_invoice(future):
+    """Wait for one submitted invoice, and return (pdf_file_path, results, error)"""
+    try:
+        return future.result()
+    except Exception as e:
+        # The worker crashed, or its result could not be sent back
+        return None, None, e
+
+
+def _init_parse_worker(pdf_text_cache_dir_path):
+    # A spawned worker imports Global_variables again, so a setting changed at run time is passed on,
+    # e.g. the cache folder of PPS_benchmark
+    Global_variables.pdf_text_cache_dir_path = pdf_text_cache_dir_path
+
+
+def create_parse_executor(number_of_invoices):
+    """Create the process pool used to scan invoice PDFs"""
+    max_workers = max(1, min(number_of_invoices, Global_variables.maximum_parse_workers, os.cpu_count() or 1))
+    return ProcessPoolExecutor(max_workers=max_workers, initializer=_init_parse_worker,
+                               initargs=(Global_variables.pdf_text_cache_dir_path,))
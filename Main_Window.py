@@ -1,15 +1,23 @@
 from PyQt5.QtCore import QPropertyAnimation, QEasingCurve
-from PyQt5.QtCore import Qt, QMimeData, pyqtSignal
+from PyQt5.QtCore import Qt, QMimeData, QTimer, pyqtSignal
 from PyQt5.QtGui import QDrag, QPalette, QColor, QPixmap
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QWidget, QScrollArea,
     QHBoxLayout, QVBoxLayout, QPushButton, QLabel,
-    QFrame, QSizePolicy, QLineEdit, QCheckBox
+    QFrame, QSizePolicy, QLineEdit, QCheckBox, QProgressBar, QMenu, QFileDialog
 )
 import Global_variables
 from Configuration_Window import ConfigurationDialog
-from Excel_helper import open_excel_app, open_succeed_invoices, open_funding_requested_invoices, open_failed_invoices
+from Excel_helper import open_succeed_invoices, open_funding_requested_invoices, open_failed_invoices
+from Outcome_journal import sync_excel_from_journal
 from Help_Window import HelpDialog
+from Todo_invoice_list import TodoInvoiceListModel, TodoInvoiceFilterModel, TodoInvoiceDelegate, TodoInvoiceListView
+from VendorInvoicesExtraction.registry import get_vendor_names
+
+# The To Do list is filtered when the search text has not changed for this long
+SEARCH_DEBOUNCE_MS = 250
+# The most ledger rows listed for one search
+MAX_LEDGER_MATCHES = 20
 
 
 # -----------------------------
@@ -46,150 +54,6 @@ class DraggableLabel(QLabel):
         else:
             super().mousePressEvent(event)
 
-# ---------------------------------------------------
-# A custom widget to represent the "bar" for each Text
-# ---------------------------------------------------
-class TextBar(QWidget):
-    dropTextChanged = pyqtSignal(tuple)
-    textBarDeleted = pyqtSignal(str)
-    checkboxStateChanged = pyqtSignal(tuple)
-
-    def __init__(self, text_content, parent=None):
-        super().__init__(parent)
-        self.text_content = str(text_content)
-        self.original_style = """
-                    QLabel {
-                        background-color: #F8F9F9;
-                        border: 1px solid #E5E7E9;
-                        border-radius: 4px;
-                        padding: 6px;
-                        font: 10pt 'Arial';
-                        qproperty-alignment: AlignVCenter;
-                    }
-                """
-        self.setFixedHeight(60)
-        self.drop_text = None
-        self.init_ui()
-
-    def init_ui(self):
-        layout = QHBoxLayout(self)
-        layout.setContentsMargins(10, 5, 10, 5)
-        layout.setSpacing(10)
-
-        self.setStyleSheet("""
-            TextBar {
-                background-color: #FFFFFF;
-                border: 1px solid #CCCCCC;
-                border-radius: 8px;
-            }
-        """)
-
-        # Add checkbox
-        self.checkbox = QCheckBox()
-        self.checkbox.setStyleSheet("""
-                    QCheckBox {
-                        spacing: 8px;
-                    }
-                    QCheckBox::indicator {
-                        width: 16px;
-                        height: 16px;
-                    }
-                """)
-        self.checkbox.stateChanged.connect(self.handle_checkbox_change)
-        layout.addWidget(self.checkbox)
-
-        # Text content display
-        self.label_text = QLabel(self.text_content, self)
-        self.label_text.setStyleSheet("""
-            QLabel {
-                background-color: #F8F9F9;
-                border: 1px solid #E5E7E9;
-                border-radius: 4px;
-                padding: 6px;
-                font: 10pt 'Arial';
-                qproperty-alignment: AlignVCenter;
-            }
-        """)
-        self.label_text.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Fixed)
-        layout.addWidget(self.label_text)
-
-        # Drop area
-        self.drop_label = DropLabel("Drop here", self)
-        self.drop_label.setMinimumWidth(150)
-        layout.addWidget(self.drop_label)
-
-        # Delete button
-        self.delete_btn = QPushButton("×", self)
-        self.delete_btn.setFixedSize(30, 30)
-        self.delete_btn.setStyleSheet("""
-            QPushButton {
-                background-color: #F1948A;
-                color: white;
-                border-radius: 15px;
-                font: bold 14pt 'Arial';
-            }
-            QPushButton:hover {
-                background-color: #E74C3C;
-                cursor: pointer;
-            }
-        """)
-        self.delete_btn.clicked.connect(self.handle_delete_event)
-        layout.addWidget(self.delete_btn)
-
-        # Set initial opacity
-        self.setWindowOpacity(1.0)
-
-        # Enable transparency effects
-        self.setAttribute(Qt.WA_TranslucentBackground)
-
-        # Connect the drop label's signal to a handler
-        self.drop_label.dropped.connect(self.handle_drop_event)
-
-    def set_highlight(self, highlight: bool):
-        """Toggle highlight state"""
-        if highlight:
-            self.label_text.setStyleSheet("""
-                QLabel {
-                    background-color: #FFF3B0;
-                    border: 2px solid #F1C40F;
-                    border-radius: 4px;
-                    padding: 6px;
-                    font: 10pt 'Arial';
-                    qproperty-alignment: AlignVCenter;
-                }
-            """)
-        else:
-            self.label_text.setStyleSheet(self.original_style)
-
-    def handle_delete_event(self):
-        self.textBarDeleted.emit(self.text_content)
-        self.start_fade_out()
-
-    def handle_drop_event(self, dropped_text):
-        self.drop_text = dropped_text
-        self.dropTextChanged.emit((self.text_content, self.drop_text))
-
-    def start_fade_out(self):
-        """Animates the deletion of the TextBar"""
-        # Create fade animation
-        self.animation = QPropertyAnimation(self, b"windowOpacity")
-        self.animation.setDuration(500)
-        self.animation.setStartValue(1.0)
-        self.animation.setEndValue(0.0)
-        self.animation.setEasingCurve(QEasingCurve.OutQuad)
-
-        # Connect animation finish to actual deletion
-        self.animation.finished.connect(self.deleteLater)
-
-        # Start animation
-        self.animation.start()
-
-        # Disable interactions during animation
-        self.setEnabled(False)
-
-    def handle_checkbox_change(self, state):
-        self.checkboxStateChanged.emit((self.text_content, state))
-
     # -------------------------------------------
 # DropLabel: A label that accepts drops (text)
 # -------------------------------------------
@@ -317,12 +181,22 @@ class SplitButton(QWidget):
 class MiddleWidget(QWidget):
     todoInvoiceUpdateRequest = pyqtSignal(str)
     dropTextChanged = pyqtSignal(str, str)
-    textBarDeleted = pyqtSignal(str)
+    invoiceDeleted = pyqtSignal(str)
     checkboxStateChanged = pyqtSignal(str, bool)
+    # The search text, to find the invoice in the ledgers as well
+    ledgerSearchRequested = pyqtSignal(str)
+    # (file path, row number) of a ledger row to open in Excel
+    ledgerRowOpenRequested = pyqtSignal(str, int)
+    # Pasted text with many account numbers, e.g. a column copied from Excel
+    pasteImportRequested = pyqtSignal(str)
+    # A CSV or Excel file of account numbers to add
+    fileImportRequested = pyqtSignal(str)
 
     def __init__(self, parent=None):
         super().__init__(parent)
-        self.textBars = []
+        self.invoice_list = TodoInvoiceListModel(self)
+        self.invoice_filter = TodoInvoiceFilterModel(self)
+        self.invoice_filter.setSourceModel(self.invoice_list)
         self.init_ui()
         self.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
         self.notification_expanded = False
@@ -378,6 +252,12 @@ class MiddleWidget(QWidget):
                    }
                """)
         self.search_label.returnPressed.connect(self.perform_search)
+        # Filter as the user types, once the typing pauses
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(SEARCH_DEBOUNCE_MS)
+        self.search_timer.timeout.connect(self.filter_invoices)
+        self.search_label.textChanged.connect(self.search_timer.start)
         top_layout.addWidget(self.search_label, stretch=7)
 
         # Right Side Container (Global controls)
@@ -387,9 +267,9 @@ class MiddleWidget(QWidget):
         right_layout.setContentsMargins(0, 0, 0, 0)
         right_layout.setSpacing(5)
 
-        # Global Drop Area (Styled like TextBar's DropLabel)
+        # Global Drop Area (Styled like the vendor drop area of a row)
         self.global_drop = DropLabel("Apply to All")
-        self.global_drop.setFixedSize(150, 35)  # Match TextBar drop area size
+        self.global_drop.setFixedSize(150, 35)  # Match the vendor drop area size of a row
         self.global_drop.setStyleSheet("""
                     DropLabel {
                         background-color: #F0F3F4;
@@ -463,28 +343,16 @@ class MiddleWidget(QWidget):
         main_layout.addWidget(self.notification_container)
 
         # --------------------------------
-        # 3) Scroll Area for TextBars
+        # 3) List of todo invoices, only the rows on screen are drawn
         # --------------------------------
-        self.scroll_area = QScrollArea()
-        self.scroll_area.setWidgetResizable(True)
-        self.scroll_area.setStyleSheet("""
-            QScrollArea {
-                border: none;
-                background-color: transparent;
-            }
-            QWidget#scrollContent {
-                background-color: transparent;
-            }
-        """)
-
-        self.scroll_content = QWidget()
-        self.scroll_layout = QVBoxLayout(self.scroll_content)
-        self.scroll_layout.setContentsMargins(10, 10, 10, 10)
-        self.scroll_layout.setSpacing(10)
-        self.scroll_layout.addStretch()
-
-        self.scroll_area.setWidget(self.scroll_content)
-        main_layout.addWidget(self.scroll_area)
+        self.invoice_list_view = TodoInvoiceListView()
+        self.invoice_list_view.setModel(self.invoice_filter)
+        self.invoice_list_delegate = TodoInvoiceDelegate(self.invoice_list_view)
+        self.invoice_list_view.setItemDelegate(self.invoice_list_delegate)
+        self.invoice_list_delegate.checkboxClicked.connect(self.handle_checkbox_click_event)
+        self.invoice_list_delegate.deleteClicked.connect(self.handle_delete_event)
+        self.invoice_list_view.vendorDropped.connect(self.handle_drop_event)
+        main_layout.addWidget(self.invoice_list_view)
 
         # Fixed bottom input bar
         input_bar = QWidget()
@@ -494,7 +362,7 @@ class MiddleWidget(QWidget):
         input_layout.setContentsMargins(20, 10, 20, 10)
 
         self.text_input = QLineEdit()
-        self.text_input.setPlaceholderText("Enter text and press Enter to create TextBar")
+        self.text_input.setPlaceholderText("Enter an account number and press Enter to add it")
         self.text_input.setStyleSheet("""
             QLineEdit {
                 font: 12pt 'Arial';
@@ -503,40 +371,76 @@ class MiddleWidget(QWidget):
                 border-radius: 6px;
             }
         """)
-        self.text_input.returnPressed.connect(self.add_text_bar)
+        self.text_input.returnPressed.connect(self.add_invoice)
+
+        import_button_style = """
+            QPushButton {
+                background-color: #D5F5E3;
+                color: #1D8348;
+                font: bold 11pt 'Arial';
+                border: 2px solid #82E0AA;
+                border-radius: 6px;
+                padding: 6px 12px;
+            }
+            QPushButton:hover {
+                background-color: #ABEBC6;
+            }
+        """
+        self.paste_button = QPushButton("📋 Paste")
+        self.paste_button.setToolTip("Add every account number in the clipboard, e.g. a column copied from Excel")
+        self.paste_button.setStyleSheet(import_button_style)
+        self.paste_button.clicked.connect(self.paste_invoices)
+        self.import_button = QPushButton("📂 Import")
+        self.import_button.setToolTip("Add the account numbers of a CSV or Excel file")
+        self.import_button.setStyleSheet(import_button_style)
+        self.import_button.clicked.connect(self.import_invoices)
 
         input_layout.addWidget(self.text_input)
+        input_layout.addWidget(self.paste_button)
+        input_layout.addWidget(self.import_button)
         main_layout.addWidget(input_bar)
 
         # -------------------------
         # 3) Connect Global Drop
         # -------------------------
-        self.global_drop.dropped.connect(self.apply_to_all_bars)
-        self.global_delete_btn.clicked.connect(self.clear_text_bars)
+        self.global_drop.dropped.connect(self.apply_to_all_invoices)
+        self.global_delete_btn.clicked.connect(self.clear_invoices)
+
+    def filter_invoices(self):
+        """Shows only the todo invoices whose account number or vendor matches the search text"""
+        self.search_timer.stop()
+        self.invoice_filter.set_search_text(self.search_label.text().strip())
+        self.invoice_list_view.scrollToTop()
 
     def perform_search(self):
-        """Handle search functionality with highlighting and scrolling"""
-        search_text = self.search_label.text().strip().lower()
-        first_match = None
-
-        # Clear previous highlights
-        for i in range(self.scroll_layout.count() - 1):
-            item = self.scroll_layout.itemAt(i)
-            if item.widget() and isinstance(item.widget(), TextBar):
-                text_bar = item.widget()
-                text_bar.set_highlight(False)  # Clear previous highlight
-
-                # Check match
-                if search_text and search_text in text_bar.text_content.lower():
-                    text_bar.set_highlight(True)
-                    if not first_match:
-                        first_match = text_bar
-
-        # Scroll to first match if exists
-        if first_match:
-            self.scroll_area.ensureWidgetVisible(first_match)
-        elif search_text:
-            self.expand_notification(f"No results found for '{search_text}'")
+        """Filters the todo invoices at once, and looks the search text up in the ledgers"""
+        self.filter_invoices()
+        search_text = self.search_label.text().strip()
+        if search_text:
+            self.ledgerSearchRequested.emit(search_text)
+
+    def show_ledger_matches(self, search_text, matches):
+        """
+        Lists the ledger rows found by Model, choosing one opens it in Excel.
+        :param matches: a list of (ledger name, file path, row number, account number)
+        """
+        if search_text != self.search_label.text().strip():
+            # The search text changed since
+            return
+        if len(matches) == 0:
+            if self.invoice_filter.rowCount() == 0:
+                self.expand_notification(f"No results found for '{search_text}'")
+            return
+
+        menu = QMenu(self)
+        for ledger_name, file_path, row_number, account in matches[:MAX_LEDGER_MATCHES]:
+            action = menu.addAction(f"{ledger_name}, row {row_number}: {account}")
+            action.triggered.connect(
+                lambda checked, file_path=file_path, row_number=row_number:
+                self.ledgerRowOpenRequested.emit(file_path, row_number))
+        if len(matches) > MAX_LEDGER_MATCHES:
+            menu.addAction(f"{len(matches) - MAX_LEDGER_MATCHES} more, refine the search").setEnabled(False)
+        menu.popup(self.search_label.mapToGlobal(self.search_label.rect().bottomLeft()))
 
     def expand_notification(self, message: str, duration_ms: int = 300):
         """Expand notification section with animation"""
@@ -562,80 +466,105 @@ class MiddleWidget(QWidget):
 
         self.notification_expanded = False
 
-    def apply_to_all_bars(self, text):
-        """Apply dropped text to all TextBars"""
-        for i in range(self.scroll_layout.count() - 1):  # Exclude stretch
-            text_bar = self.scroll_layout.itemAt(i).widget()
-            if isinstance(text_bar, TextBar):
-                text_bar.drop_label.setText(text)
-                self.dropTextChanged.emit(text_bar.text_content, text)
+    def apply_to_all_invoices(self, text):
+        """Apply dropped text to all todo invoices"""
+        self.invoice_list.set_all_rows(vendor=text)
+        for account in self.invoice_list.get_accounts():
+            self.dropTextChanged.emit(account, text)
 
-    def add_text_bar(self):
+    def add_invoice(self):
         # to prevent adding duplicated invoice number
         self.collapse_notification(duration_ms=0)
         account = self.text_input.text().strip().replace(" ", "")
-        for textBar in self.textBars:
-            if account == textBar.text_content:
-                self.expand_notification("Input account number already existed")
-                return
+        if self.invoice_list.has_account(account):
+            self.expand_notification("Input account number already existed")
+            return
 
         if account:
-            text_bar = TextBar(account)
-            self.textBars.append(text_bar)
-            text_bar.dropTextChanged.connect(self.handle_drop_event)
-            text_bar.textBarDeleted.connect(self.handle_text_bar_delete_event)
-            text_bar.checkboxStateChanged.connect(self.handle_checkbox_state_change_event)
-            self.scroll_layout.insertWidget(self.scroll_layout.count() - 1, text_bar)
+            self.invoice_list.add_row(account)
             self.text_input.clear()
             self.todoInvoiceUpdateRequest.emit(account)
 
-    def add_text_bar_from_model(self, account, vendor, checkbox_state):
-        text_bar = TextBar(account)
-        text_bar.drop_label.setText(vendor)
-        text_bar.drop_text = vendor
-        text_bar.checkbox.setChecked(checkbox_state)
-        self.textBars.append(text_bar)
-        text_bar.dropTextChanged.connect(self.handle_drop_event)
-        text_bar.textBarDeleted.connect(self.handle_text_bar_delete_event)
-        text_bar.checkboxStateChanged.connect(self.handle_checkbox_state_change_event)
-        self.scroll_layout.insertWidget(self.scroll_layout.count() - 1, text_bar)
+    def paste_invoices(self):
+        """Adds the account numbers in the clipboard at once"""
+        self.collapse_notification(duration_ms=0)
+        text = QApplication.clipboard().text()
+        if not text.strip():
+            self.expand_notification("The clipboard is empty, copy some account numbers first")
+            return
+        self.pasteImportRequested.emit(text)
+
+    def import_invoices(self):
+        """Adds the account numbers of a CSV or Excel file at once"""
+        self.collapse_notification(duration_ms=0)
+        file_path, _ = QFileDialog.getOpenFileName(self, "Import account numbers", "",
+                                                   "CSV or Excel (*.csv *.txt *.xlsx *.xlsm)")
+        if file_path:
+            self.fileImportRequested.emit(file_path)
+
+    def add_invoices_from_model(self, rows):
+        """
+        Adds many invoices with one insertion, e.g. after a paste or an import.
+        :param rows: a list of (account number, vendor, checkbox state)
+        """
+        self.invoice_list.add_rows(rows)
+
+    def set_editable(self, is_editable):
+        """
+        Locks the todo invoices while a batch is running, they are read again from Excel when it ends,
+        so a change made in the meantime would be lost. Searching stays available.
+        """
+        for widget in (self.global_checkbox, self.global_drop, self.global_delete_btn,
+                       self.text_input, self.paste_button, self.import_button):
+            widget.setEnabled(is_editable)
+        self.invoice_list_view.set_editable(is_editable)
+
+    def add_invoice_from_model(self, account, vendor, checkbox_state):
+        # The row exists already if the invoice was typed in View
+        if self.invoice_list.has_account(account):
+            self.invoice_list.set_row(account, vendor, checkbox_state)
+        else:
+            self.invoice_list.add_row(account, vendor, checkbox_state)
+
+    def update_invoice_from_model(self, account, vendor, checkbox_state):
+        self.invoice_list.set_row(account, vendor, checkbox_state)
+
+    def remove_invoice_from_model(self, account):
+        # Nothing is removed if the invoice was deleted in View
+        self.invoice_list.remove_row(account)
 
     def toggle_all_checkboxes(self, state):
-        """Toggle all TextBar checkboxes based on global checkbox"""
-        for i in range(self.scroll_layout.count() - 1):
-            item = self.scroll_layout.itemAt(i)
-            if item.widget() and isinstance(item.widget(), TextBar):
-                item.widget().checkbox.setChecked(state == Qt.Checked)
-
-    def clear_text_bars(self):
-        """Remove all TextBar widgets with fade effect"""
-        for i in reversed(range(self.scroll_layout.count())):
-            item = self.scroll_layout.itemAt(i)
-            if item.widget() and isinstance(item.widget(), TextBar):
-                # Start fade out animation
-                item.widget().handle_delete_event()
-
-    def clear_text_bars_in_view(self):
-        """Remove all TextBar widgets with fade effect in View only, will not affect Model"""
-        self.textBars = []
-        for i in reversed(range(self.scroll_layout.count())):
-            item = self.scroll_layout.itemAt(i)
-            if item.widget() and isinstance(item.widget(), TextBar):
-                # Start fade out animation
-                item.widget().start_fade_out()
-
-    def handle_drop_event(self, pair):
-        self.dropTextChanged.emit(pair[0], pair[1])
-
-    def handle_text_bar_delete_event(self, account):
-        self.textBarDeleted.emit(account)
-        for i in range(len(self.textBars)):
-            if self.textBars[i].text_content == account:
-                self.textBars.pop(i)
-                break
-
-    def handle_checkbox_state_change_event(self, pair):
-        self.checkboxStateChanged.emit(pair[0], pair[1])
+        """Toggle all checkboxes based on global checkbox"""
+        checkbox_state = state == Qt.Checked
+        self.invoice_list.set_all_rows(checkbox_state=checkbox_state)
+        for account in self.invoice_list.get_accounts():
+            self.checkboxStateChanged.emit(account, checkbox_state)
+
+    def clear_invoices(self):
+        """Remove all todo invoices"""
+        accounts = self.invoice_list.get_accounts()
+        self.invoice_list.clear()
+        for account in accounts:
+            self.invoiceDeleted.emit(account)
+
+    def set_invoice_status(self, account, outcome):
+        self.invoice_list.set_row(account, status=outcome)
+        index = self.invoice_list.get_index(account)
+        if index is not None and self.invoice_filter.mapFromSource(index).isValid():
+            self.invoice_list_view.scrollTo(self.invoice_filter.mapFromSource(index))
+
+    def handle_drop_event(self, account, vendor):
+        self.invoice_list.set_row(account, vendor=vendor)
+        self.dropTextChanged.emit(account, vendor)
+
+    def handle_delete_event(self, account):
+        # Removed before Model is told, so the removal sent back by Model finds nothing to remove
+        self.invoice_list.remove_row(account)
+        self.invoiceDeleted.emit(account)
+
+    def handle_checkbox_click_event(self, account, checkbox_state):
+        self.invoice_list.set_row(account, checkbox_state=checkbox_state)
+        self.checkboxStateChanged.emit(account, checkbox_state)
 
 # ---------------------------------
 # Main Window
@@ -643,6 +572,7 @@ class MiddleWidget(QWidget):
 class MainWindow(QMainWindow):
     todoInvoicesSaveRequest = pyqtSignal()
     todoInvoicesProcessRequest = pyqtSignal()
+    todoInvoicesCancelRequest = pyqtSignal()
     left_section_update_required = pyqtSignal()
 
     def __init__(self):
@@ -764,9 +694,9 @@ class MainWindow(QMainWindow):
         self.funding_request_invoices_button.setStyleSheet("SplitButton { background-color: #48C9B0; border-color: #17A589; }")
         self.failed_invoices_button.setStyleSheet("SplitButton { background-color: #F4D03F; border-color: #D4AC0D; }")
 
-        self.succeed_invoices_button.clicked.connect(open_succeed_invoices)
-        self.funding_request_invoices_button.clicked.connect(open_funding_requested_invoices)
-        self.failed_invoices_button.clicked.connect(open_failed_invoices)
+        self.succeed_invoices_button.clicked.connect(lambda: self.open_outcome_excel(open_succeed_invoices))
+        self.funding_request_invoices_button.clicked.connect(lambda: self.open_outcome_excel(open_funding_requested_invoices))
+        self.failed_invoices_button.clicked.connect(lambda: self.open_outcome_excel(open_failed_invoices))
 
         left_layout.addWidget(self.succeed_invoices_button)
         left_layout.addWidget(self.funding_request_invoices_button)
@@ -796,7 +726,7 @@ class MainWindow(QMainWindow):
         right_layout.setContentsMargins(20, 20, 20, 20)
 
         # Draggable labels
-        texts = ["", "Alectra", "Burlington Hydro", "Elexicon", "Fortis", "Grimsby", "Hydro One", "NPE", "NTP", "Toronto Hydro", "Welland"]
+        texts = [""] + get_vendor_names()
         for t in texts:
             lbl = DraggableLabel(t)
             right_layout.addWidget(lbl)
@@ -824,10 +754,31 @@ class MainWindow(QMainWindow):
         bottom_layout.setContentsMargins(20, 10, 20, 10)
         bottom_layout.setSpacing(20)
 
-        process_button = QPushButton("Save and Process All Selected")
-        btn_bottom2 = QPushButton("💾 Save Todo Invoices")
+        self.process_button = QPushButton("Save and Process All Selected")
+        self.save_button = QPushButton("💾 Save Todo Invoices")
+        self.cancel_button = QPushButton("Cancel")
+
+        # Progress of the running batch, shown instead of the Save button
+        self.batch_progress_bar = QProgressBar()
+        self.batch_progress_bar.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
+        self.batch_progress_bar.setAlignment(Qt.AlignCenter)
+        self.batch_progress_bar.setStyleSheet("""
+                    QProgressBar {
+                        background-color: #FFFFFF;
+                        color: #2C3E50;
+                        font: bold 12pt 'Arial';
+                        border: 2px solid #2980B9;
+                        border-radius: 8px;
+                    }
+                    QProgressBar::chunk { background-color: #5DADE2; }
+                """)
+        self.batch_progress_bar.hide()
+        self.batch_eta_text = ""
+        self.is_batch_running = False
+        # The window was closed during a batch, it closes when the batch ends
+        self.is_closing_after_batch = False
 
-        for btn in [process_button, btn_bottom2]:
+        for btn in [self.process_button, self.save_button, self.cancel_button]:
             btn.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
             btn.setStyleSheet("""
                         QPushButton {
@@ -838,7 +789,7 @@ class MainWindow(QMainWindow):
                         }
                     """)
 
-        process_button.setStyleSheet("""
+        self.process_button.setStyleSheet("""
                     QPushButton {
                         background-color: #3498DB;
                         border: 2px solid #2980B9;
@@ -846,18 +797,30 @@ class MainWindow(QMainWindow):
                     QPushButton:hover { background-color: #2980B9; }
                 """)
 
-        btn_bottom2.setStyleSheet("""
+        self.save_button.setStyleSheet("""
                     QPushButton {
                         background-color: #27AE60;
                         border: 2px solid #219A52;
                     }
                     QPushButton:hover { background-color: #219A52; }
                 """)
-        process_button.clicked.connect(self._on_process_clicked)
-        btn_bottom2.clicked.connect(self._on_save_clicked)
+        self.cancel_button.setStyleSheet("""
+                    QPushButton {
+                        background-color: #E74C3C;
+                        border: 2px solid #CB4335;
+                    }
+                    QPushButton:hover { background-color: #CB4335; }
+                    QPushButton:disabled { background-color: #AAB7B8; border: 2px solid #909497; }
+                """)
+        self.cancel_button.hide()
+        self.process_button.clicked.connect(self._on_process_clicked)
+        self.save_button.clicked.connect(self._on_save_clicked)
+        self.cancel_button.clicked.connect(self._on_cancel_clicked)
 
-        bottom_layout.addWidget(process_button)
-        bottom_layout.addWidget(btn_bottom2)
+        bottom_layout.addWidget(self.process_button)
+        bottom_layout.addWidget(self.save_button)
+        bottom_layout.addWidget(self.batch_progress_bar)
+        bottom_layout.addWidget(self.cancel_button)
 
         # Combine all sections
         main_vertical_layout.addWidget(top_sections, 1)  # Expandable
@@ -866,6 +829,11 @@ class MainWindow(QMainWindow):
         # Finalize layout
         central_widget.setLayout(main_vertical_layout)
 
+    def open_outcome_excel(self, open_function):
+        # The Excel files are a view of the outcome journal, bring them up to date before opening
+        sync_excel_from_journal()
+        open_function()
+
     def show_config_dialog(self):
         dialog = ConfigurationDialog(self.config_path, self)
         dialog.exec_()
@@ -884,6 +852,48 @@ class MainWindow(QMainWindow):
         self.todoInvoicesSaveRequest.emit()
         self.todoInvoicesProcessRequest.emit()
 
+    def _on_cancel_clicked(self):
+        # The invoices in progress are finished, this can take a minute
+        self.cancel_button.setEnabled(False)
+        self.todoInvoicesCancelRequest.emit()
+
+    def set_batch_running(self, is_running: bool):
+        """
+        Swaps the Process and Save buttons for the progress bar and the Cancel button during a batch,
+        and locks the todo invoices until it ends
+        """
+        self.is_batch_running = is_running
+        self.middle_widget.set_editable(not is_running)
+        self.process_button.setVisible(not is_running)
+        self.save_button.setVisible(not is_running)
+        self.batch_progress_bar.setVisible(is_running)
+        self.cancel_button.setVisible(is_running)
+        self.cancel_button.setEnabled(is_running)
+        self.batch_eta_text = ""
+        if not is_running and self.is_closing_after_batch:
+            self.close()
+
+    def closeEvent(self, event):
+        if not self.is_batch_running:
+            event.accept()
+            return
+        # The browsers are closed with the app, so the batch is cancelled and the window closes when it ends
+        event.ignore()
+        if not self.is_closing_after_batch:
+            self.is_closing_after_batch = True
+            self._on_cancel_clicked()
+            self.middle_widget.expand_notification("Closing once the invoices in progress are finished")
+
+    def update_batch_progress(self, finished_count, total_count):
+        self.batch_progress_bar.setMaximum(total_count)
+        self.batch_progress_bar.setValue(finished_count)
+        self.batch_progress_bar.setFormat(f"{finished_count} / {total_count} invoices{self.batch_eta_text}")
+
+    def update_batch_eta(self, seconds):
+        minutes, seconds = divmod(round(seconds), 60)
+        self.batch_eta_text = f", about {minutes} min {seconds} s left" if minutes > 0 else f", about {seconds} s left"
+        self.update_batch_progress(self.batch_progress_bar.value(), self.batch_progress_bar.maximum())
+
     def update_left_section(self, numbers):
         self.succeed_invoices_button.set_text_to_right_label(str(numbers[0]))
         self.funding_request_invoices_button.set_text_to_right_label(str(numbers[1]))
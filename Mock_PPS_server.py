@@ -0,0 +1,366 @@
+"""
+A local stand-in for PPS, to run pps_multiple_invoices_input and PPS_benchmark without the real portal.
+It serves the pages of the invoice flow with the same element ids and names as PPS, posts back like
+ASP.NET WebForms (__EVENTTARGET, __EVENTARGUMENT, __VIEWSTATE), and can add latency and inject failures.
+Every searched account exists, with one approved agreement.
+
+Usage:
+    python Mock_PPS_server.py --port 8765 --latency 0.2 --failure-rate 0.05
+    and set Global_variables.pps_url to "http://127.0.0.1:8765/Home.aspx"
+"""
+import argparse
+import datetime
+import html
+import random
+import threading
+import time
+import uuid
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from scan_helper import convert_to_float
+
+SESSION_COOKIE = "ASP.NET_SessionId"
+LINE_TYPES = ["Electricity", "Late Payment Charges", "Electricity (Tax Exempt)"]
+
+POSTBACK_SCRIPT = """<script type="text/javascript">
+function __doPostBack(eventTarget, eventArgument) {
+    var form = document.forms['aspnetForm'];
+    form.__EVENTTARGET.value = eventTarget;
+    form.__EVENTARGUMENT.value = eventArgument;
+    form.submit();
+}
+</script>"""
+
+
+def name_of(element_id) -> str:
+    """The form field name ASP.NET renders for a control id, e.g. contentPlaceHolder_pbSearch -> ctl00$contentPlaceHolder$pbSearch"""
+    return "ctl00$" + element_id.replace("_", "$")
+
+
+def text_input(element_id, value="", is_date=False) -> str:
+    # The date fields have calendar extenders in PPS, Enter does not submit the form
+    onkeydown = ' onkeydown="return event.keyCode != 13;"' if is_date else ""
+    return f'<input type="text" name="{name_of(element_id)}" id="{element_id}" value="{html.escape(str(value))}"{onkeydown} />'
+
+
+def text_area(element_id) -> str:
+    return f'<textarea name="{name_of(element_id)}" id="{element_id}"></textarea>'
+
+
+def button(element_id, value) -> str:
+    return f'<input type="submit" name="{name_of(element_id)}" id="{element_id}" value="{html.escape(value)}" />'
+
+
+def postback_link(element_id, event_target, text, event_argument="") -> str:
+    id_attribute = f' id="{element_id}"' if element_id is not None else ""
+    return (f'<a{id_attribute} href="javascript:__doPostBack(&#39;{event_target}&#39;,&#39;{event_argument}&#39;)">'
+            f'{html.escape(text)}</a>')
+
+
+def table(element_id, header, rows) -> str:
+    """:param rows: lists of the cell html"""
+    header_html = "<tr>" + "".join(f"<th>{html.escape(cell)}</th>" for cell in header) + "</tr>"
+    rows_html = "".join("<tr>" + "".join(f"<td>{cell}</td>" for cell in row) + "</tr>" for row in rows)
+    return f'<table id="{element_id}">{header_html}{rows_html}</table>'
+
+
+def get_fiscal_years() -> list:
+    """The fiscal years of the agreements, from three years ago to the next one, e.g. '2024-25'"""
+    today = datetime.date.today()
+    first_year = today.year if today.month >= 4 else today.year - 1
+    return [f"{year}-{str(year + 1)[-2:]}" for year in range(first_year - 3, first_year + 2)]
+
+
+class MockPPSState:
+    """The invoices of the stand-in PPS, the browser sessions and the page each session is on"""
+    def __init__(self, remaining_funding=100000.0, latency=0.0, failure_rate=0.0, rejected_amount_rate=0.0, seed=None):
+        """
+        :param remaining_funding: the remaining funding of every agreement
+        :param latency: the mean seconds taken by every request
+        :param failure_rate: the probability of a request answered with a server error
+        :param rejected_amount_rate: the probability of a line amount answered with "Line Amount is mandatory."
+        """
+        self.remaining_funding = remaining_funding
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.rejected_amount_rate = rejected_amount_rate
+        self.random = random.Random(seed)
+        self.sessions = dict()
+        self.invoices = dict()  # account number -> [invoice number, status], the latest first
+        self.funding_pending_accounts = set()
+        self.requests_served = 0
+        self.lock = threading.Lock()
+
+    def chance(self, probability) -> bool:
+        with self.lock:
+            return self.random.random() < probability
+
+
+class MockPPSHandler(BaseHTTPRequestHandler):
+    state = None  # MockPPSState, set by create_mock_pps_server
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._handle(dict())
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        form = {key: values[-1] for key, values in
+                parse_qs(self.rfile.read(length).decode("utf-8"), keep_blank_values=True).items()}
+        self._handle(form)
+
+    def _handle(self, form):
+        state = self.state
+        if state.latency > 0:
+            time.sleep(state.latency * random.uniform(0.5, 1.5))
+
+        cookie = SimpleCookie(self.headers.get("Cookie", ""))
+        session_id = cookie[SESSION_COOKIE].value if SESSION_COOKIE in cookie else uuid.uuid4().hex
+        with state.lock:
+            state.requests_served += 1
+            session = state.sessions.setdefault(session_id, {"page": "home", "view_state": None})
+
+        if state.chance(state.failure_rate):
+            self._send(500, "<html><body><h1>Server Error in '/' Application.</h1></body></html>", session_id)
+            return
+        if self.command == "POST" and form.get("__VIEWSTATE") != session["view_state"]:
+            # Posted from a page which is not the last page of the session, e.g. a second click on a stale page
+            self._send(500, "<html><body><h1>Validation of viewstate MAC failed.</h1></body></html>", session_id)
+            return
+
+        if self.command == "GET":
+            session["page"] = "search" if urlparse(self.path).path.lower().endswith("/search.aspx") else "home"
+            session["account_number"] = None
+        else:
+            self._post_back(session, form)
+        session["view_state"] = uuid.uuid4().hex
+        self._send(200, self._render(session), session_id)
+
+    def _send(self, status, body, session_id):
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Set-Cookie", f"{SESSION_COOKIE}={session_id}; path=/")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _post_back(self, session, form):
+        state = self.state
+        event_target = form.get("__EVENTTARGET", "")
+
+        def clicked(element_id):
+            return name_of(element_id) in form
+
+        def value(element_id):
+            return form.get(name_of(element_id), "").strip()
+
+        page = session["page"]
+        if page == "search":
+            if clicked("contentPlaceHolder_pbSearch"):
+                session["account_number"] = value("contentPlaceHolder_utilityAccount")
+            elif event_target == name_of("contentPlaceHolder_searchResult") and session["account_number"]:
+                session["page"] = "agreement"
+                session["tab"] = "general"
+        elif page == "agreement":
+            if event_target == name_of("tabControl_InvoicesTab"):
+                session["tab"] = "invoices"
+            elif event_target == name_of("tabControl_Financials"):
+                session["tab"] = "financials"
+            elif clicked("contentPlaceHolder_operationsControl_btnNew"):
+                session["tab"] = "adjustment"
+            elif clicked("contentPlaceHolder_operationsControl_btnRequestApproval"):
+                with state.lock:
+                    state.funding_pending_accounts.add(session["account_number"])
+                session["tab"] = "financials"
+            elif clicked("contentPlaceHolder_invoiceControl_btnNewInvoice"):
+                session["page"] = "invoice_header"
+        elif page == "invoice_header" and clicked("contentPlaceHolder_btnNext"):
+            session["invoice"] = {
+                "number": value("contentPlaceHolder_ContentPlaceHolder1_ctl00_txtInvoiceNumber"),
+                "subtotal": convert_to_float(value("contentPlaceHolder_ContentPlaceHolder1_ctl00_summaryInvoiceTotal") or "0"),
+                "lines": [],
+            }
+            session["page"] = "invoice_lines"
+            session["line_form"] = False
+            session["message"] = ""
+        elif page == "invoice_lines":
+            if clicked("contentPlaceHolder_ContentPlaceHolder1_invoiceLines_newLine"):
+                session["line_form"] = True
+                session["message"] = ""
+            elif clicked("contentPlaceHolder_ContentPlaceHolder1_invoiceLines_btnSave"):
+                amount = convert_to_float(value("contentPlaceHolder_ContentPlaceHolder1_invoiceLines_amount"))
+                if amount is None or state.chance(state.rejected_amount_rate):
+                    session["message"] = "Line Amount is mandatory."
+                else:
+                    session["invoice"]["lines"].append(
+                        (value("contentPlaceHolder_ContentPlaceHolder1_invoiceLines_accountDescription"), amount))
+                    session["line_form"] = False
+                    session["message"] = ""
+            elif clicked("contentPlaceHolder_btnNext"):
+                session["page"] = "invoice_confirm"
+        elif page == "invoice_confirm" and clicked("contentPlaceHolder_ContentPlaceHolder1_btnSaveAsPendingPayment"):
+            with state.lock:
+                state.invoices.setdefault(session["account_number"], []).insert(
+                    0, [session["invoice"]["number"], "Pending Payment"])
+            session["page"] = "invoice_saved"
+        elif page == "invoice_saved" and clicked("contentPlaceHolder_TabContainer1_TabPanel4_btnNewPaymentCertificate"):
+            session["page"] = "pc_header"
+        elif page == "pc_header" and clicked("contentPlaceHolder_btnNext"):
+            session["page"] = "pc_confirm"
+        elif page == "pc_confirm" and clicked("contentPlaceHolder_ContentPlaceHolder1_SavePC"):
+            session["page"] = "pc_saved"
+        elif page == "pc_saved" and clicked("contentPlaceHolder_TabContainer1_TabPanel4_btnRequestApproval"):
+            # The payment is approved right away, so the next invoice of the account is not pending
+            with state.lock:
+                for invoice in state.invoices.get(session["account_number"], []):
+                    if invoice[0] == session["invoice"]["number"]:
+                        invoice[1] = "Asserted"
+            session["page"] = "pc_requested"
+
+    def _render(self, session) -> str:
+        page = session["page"]
+        if page == "home":
+            body = ('<span id="contentPlaceHolder_tabControl1_tabA4">Utilities</span>'
+                    '<a class="homeLink" href="Search.aspx?AwardTypeId=8">View/Update</a>')
+        elif page == "search":
+            body = self._render_search(session)
+        elif page == "agreement":
+            body = self._render_agreement(session)
+        elif page == "invoice_header":
+            body = "".join(text_input(f"contentPlaceHolder_ContentPlaceHolder1_ctl00_{field}", is_date=is_date)
+                           for field, is_date in (("txtInvoiceNumber", False), ("workPeriodFrom", True),
+                                                  ("workPeriodTo", True), ("invoiceDate", True), ("dateReceived", True),
+                                                  ("summaryInvoiceTotal", False), ("summaryHSTTotal", False)))
+            body += text_area("contentPlaceHolder_ContentPlaceHolder1_ctl00_commentsBox")
+            body += button("contentPlaceHolder_btnNext", "Line Items")
+        elif page == "invoice_lines":
+            body = self._render_invoice_lines(session)
+        elif page == "invoice_confirm":
+            body = button("contentPlaceHolder_ContentPlaceHolder1_btnSaveAsPendingPayment", "Save As Pending Payment")
+        elif page == "invoice_saved":
+            body = button("contentPlaceHolder_TabContainer1_TabPanel4_btnNewPaymentCertificate", "New Payment Certificate")
+        elif page == "pc_header":
+            body = text_area("contentPlaceHolder_ContentPlaceHolder1_paymentCertificateHeader_comments")
+            body += button("contentPlaceHolder_btnNext", "Confirmation")
+        elif page == "pc_confirm":
+            body = button("contentPlaceHolder_ContentPlaceHolder1_SavePC", "Save As Draft")
+        elif page == "pc_saved":
+            body = button("contentPlaceHolder_TabContainer1_TabPanel4_btnRequestApproval", "Request Approval")
+        else:
+            body = "<p>The payment certificate is submitted for approval.</p>"
+
+        return ('<html><head><title>PPS</title></head><body>'
+                '<form method="post" action="Pps.aspx" id="aspnetForm">'
+                '<input type="hidden" name="__EVENTTARGET" id="__EVENTTARGET" value="" />'
+                '<input type="hidden" name="__EVENTARGUMENT" id="__EVENTARGUMENT" value="" />'
+                f'<input type="hidden" name="__VIEWSTATE" id="__VIEWSTATE" value="{session["view_state"]}" />'
+                f'{POSTBACK_SCRIPT}{body}</form></body></html>')
+
+    def _render_search(self, session) -> str:
+        body = text_input("contentPlaceHolder_utilityAccount", session["account_number"] or "")
+        body += button("contentPlaceHolder_pbSearch", "Search")
+        if session["account_number"]:
+            account_number = html.escape(session["account_number"])
+            rows = [[postback_link(None, name_of("contentPlaceHolder_searchResult"), account_number, "Select$0"), "Approved"],
+                    [account_number, "Completed"]]
+            body += table("contentPlaceHolder_searchResult", ["Agreement", "Status"], rows)
+        return body
+
+    def _render_agreement(self, session) -> str:
+        state = self.state
+        account_number = session["account_number"]
+        with state.lock:
+            is_funding_pending = account_number in state.funding_pending_accounts
+        body = text_input("contentPlaceHolder_agreementControl_ctl00_description", f"Utility account {account_number}")
+        body += f'<span id="contentPlaceHolder_awardTitle_remaining">{state.remaining_funding:,.2f}</span>'
+        body += postback_link("tabControl_InvoicesTab_HyperLink", name_of("tabControl_InvoicesTab"), "Invoices")
+        body += postback_link("tabControl_Financials_HyperLink", name_of("tabControl_Financials"),
+                              "Financial (Approval Pending)" if is_funding_pending else "Financial Information")
+
+        tab = session["tab"]
+        if tab == "invoices":
+            with state.lock:
+                invoices = [list(invoice) for invoice in state.invoices.get(account_number, [])]
+            rows = [[html.escape(number), "", "", "", "", "", "", "", "", status] for number, status in invoices]
+            body += table("contentPlaceHolder_invoiceControl_invoices",
+                          ["Invoice Number", "", "", "", "", "", "", "", "", "Status"], rows)
+            body += button("contentPlaceHolder_invoiceControl_btnNewInvoice", "New Invoice")
+        elif tab == "financials":
+            body += button("contentPlaceHolder_operationsControl_btnNew", "New Adjustment")
+        elif tab == "adjustment":
+            rows = [[fiscal_year, "0.00", text_input(f"contentPlaceHolder_financialControl_distribution_gridFiscal_amount_{i}")]
+                    for i, fiscal_year in enumerate(get_fiscal_years())]
+            body += table("contentPlaceHolder_financialControl_distribution_gridFiscal", ["Fiscal Year", "Amount", "Adjustment"], rows)
+            body += text_input("contentPlaceHolder_financialControl_amount")
+            body += text_area("contentPlaceHolder_financialControl_comments")
+            body += button("contentPlaceHolder_operationsControl_btnRequestApproval", "Request Approval")
+        return body
+
+    def _render_invoice_lines(self, session) -> str:
+        invoice = session["invoice"]
+        rows = [[html.escape(line_type), f"{amount:,.2f}"] for line_type, amount in invoice["lines"]]
+        body = table("contentPlaceHolder_ContentPlaceHolder1_invoiceLines_lines", ["Account", "Amount"], rows)
+        if len(invoice["lines"]) > 0:
+            lines_total = round(sum(amount for line_type, amount in invoice["lines"]), 2)
+            message = ("The line items total matches the invoice total." if lines_total == round(invoice["subtotal"], 2)
+                       else "The line items total does not match the invoice total.")
+            body = f'<span id="PPSHeader_messageText">{message}</span>' + body
+        if session["message"]:
+            body += f'<ul><li>{html.escape(session["message"])}</li></ul>'
+        if session["line_form"]:
+            options = "".join(f"<option value=\"{html.escape(line_type)}\">{html.escape(line_type)}</option>" for line_type in LINE_TYPES)
+            body += (f'<select name="{name_of("contentPlaceHolder_ContentPlaceHolder1_invoiceLines_accountDescription")}" '
+                     f'id="contentPlaceHolder_ContentPlaceHolder1_invoiceLines_accountDescription">{options}</select>')
+            body += text_input("contentPlaceHolder_ContentPlaceHolder1_invoiceLines_amount")
+            body += button("contentPlaceHolder_ContentPlaceHolder1_invoiceLines_btnSave", "Update")
+        else:
+            body += button("contentPlaceHolder_ContentPlaceHolder1_invoiceLines_newLine", "Add New Line")
+        body += button("contentPlaceHolder_btnNext", "Confirmation")
+        return body
+
+
+def create_mock_pps_server(port=0, **options) -> ThreadingHTTPServer:
+    """
+    Creates the server on 127.0.0.1, the caller runs serve_forever, e.g. in a daemon thread.
+    :param port: 0 picks a free port, see server.server_address
+    :param options: the options of MockPPSState
+    """
+    handler = type("MockPPSHandler", (MockPPSHandler,), {"state": MockPPSState(**options)})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def get_home_url(server) -> str:
+    return f"http://127.0.0.1:{server.server_address[1]}/Home.aspx"
+
+
+def start_mock_pps_server(port=0, **options) -> ThreadingHTTPServer:
+    """Creates the server and serves it in a daemon thread, stop it with server.shutdown()"""
+    server = create_mock_pps_server(port, **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="A local stand-in for PPS")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="mean seconds taken by every request")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="probability of a server error per request")
+    parser.add_argument("--rejected-amount-rate", type=float, default=0.0,
+                        help="probability of 'Line Amount is mandatory.' per line amount")
+    parser.add_argument("--remaining-funding", type=float, default=100000.0)
+    args = parser.parse_args()
+
+    server = create_mock_pps_server(args.port, remaining_funding=args.remaining_funding, latency=args.latency,
+                                    failure_rate=args.failure_rate, rejected_amount_rate=args.rejected_amount_rate)
+    print(f"Mock PPS is running at {get_home_url(server)}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
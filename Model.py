@@ -1,18 +1,51 @@
-from PyQt5.QtCore import Qt, pyqtSignal, QObject
+import csv
+import os
 
-from Excel_helper import insert_tuples_in_excel, read_column_values, clear_all, read_cell_content_from_first_two_col
+from PyQt5.QtCore import Qt, pyqtSignal, QObject, QThread
+
+from Excel_helper import insert_tuples_in_excel, read_column_values, clear_all, read_cell_content_from_first_two_col, \
+    count_column_values, read_column_value_rows, open_excel_app
 import Global_variables
-from Web_page_interact import pps_multiple_invoices_input
+from Batch_worker import BatchWorker
+from Outcome_journal import sync_excel_from_journal, read_unsynced_done_accounts, SUCCEED, FUNDING_REQUESTED, FAILED
+from Search_index import SearchIndex
+from Todo_import import parse_pasted_text, read_import_file, describe_rejected_rows
+from VendorInvoicesExtraction.registry import get_vendor_for_account
+from scan_helper import normalize_account_number
 
 
 class Model(QObject):
-    todoInvoicesChanged = pyqtSignal()
+    # (account number, vendor, checkbox state) of a todo invoice added or changed in the Model
+    todoInvoiceAdded = pyqtSignal(str, str, bool)
+    # [(account number, vendor, checkbox state)] of todo invoices added at once, see add_todo_invoices
+    todoInvoicesAdded = pyqtSignal(list)
+    todoInvoiceChanged = pyqtSignal(str, str, bool)
+    # The account number of a todo invoice removed from the Model
+    todoInvoiceRemoved = pyqtSignal(str)
     left_section_data_ready = pyqtSignal(tuple)
     notificationPromted = pyqtSignal(str)
+    # Whether a batch is running
+    batchRunningChanged = pyqtSignal(bool)
+    # (account number, outcome) of each invoice of the running batch, see BatchWorker.invoiceFinished
+    invoiceProcessed = pyqtSignal(str, str)
+    # (finished invoices, total invoices) of the running batch
+    batchProgressChanged = pyqtSignal(int, int)
+    # The estimated seconds left of the running batch
+    batchEtaChanged = pyqtSignal(float)
+    # (search text, [(ledger name, file path, row number, account number)]) found by search_ledgers
+    ledgerMatchesFound = pyqtSignal(str, list)
 
     def __init__(self, parent=None):
         super().__init__(parent)
         self.todo_invoices = dict()
+        # Deleted by Qt once the thread has finished, see on_batch_finished
+        self.batch_thread = None
+        self.batch_worker = None
+        self.batch_running = False
+        # The left section numbers, counted live during a batch
+        self.left_section_numbers = [0, 0, 0]
+        # file path -> (the rows read from the ledger, SearchIndex of the rows), rebuilt when the ledger changes
+        self.ledger_indexes = dict()
         try:
             with open(Global_variables.configuration_file_path, 'r') as f:
                 lines = f.readlines()
@@ -26,18 +59,74 @@ class Model(QObject):
     def add_todo_invoice(self, account: str):
         print(f"added {account}")
         self.todo_invoices.update({account: [None, False]})
+        self.todoInvoiceAdded.emit(str(account), "", False)
+
+    def add_todo_invoices(self, invoices: list, rejected_rows=()):
+        """
+        Adds many todo invoices at once, e.g. pasted from an email or imported from a file.
+        The accounts already in To Do, or repeated in 'invoices', are skipped, and View gets all the others in one signal.
+        :param invoices: a list of [account number, vendor], the vendor is found from the account number if it is None
+        :param rejected_rows: the (row number, row text) of the rows which gave no account number, they are reported
+        """
+        known_accounts = {normalize_account_number(account) for account in self.todo_invoices}
+        added = []
+        vendors_found = 0
+        for account, vendor in invoices:
+            normalized_account = normalize_account_number(account)
+            if normalized_account in known_accounts:
+                continue
+            known_accounts.add(normalized_account)
+            if vendor is None:
+                vendor = get_vendor_for_account(account)
+                vendors_found += vendor is not None
+            self.todo_invoices[account] = [vendor, False]
+            added.append((str(account), "" if vendor is None else vendor, False))
+        print(f"added {len(added)} invoices")
+
+        if len(added) > 0:
+            self.todoInvoicesAdded.emit(added)
+        notification = (f"Added {len(added)} accounts, skipped {len(invoices) - len(added)} duplicates, "
+                        f"found the vendor of {vendors_found} from their account numbers.")
+        if len(rejected_rows) > 0:
+            notification += f" {describe_rejected_rows(rejected_rows)}."
+        self.notificationPromted.emit(notification + " Save to keep them.")
+
+    def import_pasted_text(self, text: str):
+        invoices, rejected_rows = parse_pasted_text(text)
+        if len(invoices) == 0:
+            self.notificationPromted.emit("No account numbers found in the pasted text")
+            return
+        self.add_todo_invoices(invoices, rejected_rows)
+
+    def import_todo_file(self, file_path: str):
+        try:
+            invoices, rejected_rows = read_import_file(file_path)
+        except (OSError, ValueError, csv.Error) as e:
+            self.notificationPromted.emit(f"Failed to import {os.path.basename(file_path)}: {e}")
+            return
+        if len(invoices) == 0:
+            self.notificationPromted.emit(f"No account numbers found in {os.path.basename(file_path)}")
+            return
+        self.add_todo_invoices(invoices, rejected_rows)
 
     def delete_todo_invoice(self, account: str):
         print(f"deleted {account}")
         self.todo_invoices.pop(account)
+        self.todoInvoiceRemoved.emit(str(account))
 
     def update_todo_invoice(self, account: str, vendor=None):
         print(f"updated {account} with vendor {vendor}")
         self.todo_invoices.update({account: [vendor, self.todo_invoices.get(account)[1]]})
+        self.emit_todo_invoice_changed(account)
 
     def update_invoice_checkbox_state(self, account: str, checkbox_state: bool):
         print(f"set {account}'s checkbox to {checkbox_state}")
         self.todo_invoices.update({account: [self.todo_invoices.get(account)[0], checkbox_state]})
+        self.emit_todo_invoice_changed(account)
+
+    def emit_todo_invoice_changed(self, account):
+        vendor, checkbox_state = self.todo_invoices[account]
+        self.todoInvoiceChanged.emit(str(account), "" if vendor is None else vendor, bool(checkbox_state))
 
     def save_todo_invoices_in_excel(self):
         clear_all(Global_variables.todo_invoices_excel_path,
@@ -49,6 +138,14 @@ class Model(QObject):
 
     def process_all_todo_invoices(self):
         print(self.todo_invoices)
+        if self.is_batch_running():
+            self.notificationPromted.emit("A batch is already running")
+            return
+
+        # The outcomes not in the Excel files yet are written first, so no invoice done by an earlier batch is selected
+        self.remove_done_todo_invoices()
+        self.left_section_numbers = [self.get_succeed_invoices(), self.get_funding_requested_invoices(),
+                                     self.get_failed_invoices()]
 
         todo_invoices = []
         for invoice in self.todo_invoices.items():
@@ -58,34 +155,160 @@ class Model(QObject):
         if len(todo_invoices) == 0:
             self.notificationPromted.emit("No Selected Invoices")
             return
-        pps_multiple_invoices_input(todo_invoices)
+
+        # The batch runs in its own thread, the window keeps responding and shows the progress
+        self.batch_thread = QThread(self)
+        self.batch_worker = BatchWorker(todo_invoices)
+        self.batch_worker.moveToThread(self.batch_thread)
+        self.batch_thread.started.connect(self.batch_worker.run)
+        self.batch_worker.invoiceFinished.connect(self.on_invoice_finished)
+        self.batch_worker.progressChanged.connect(self.batchProgressChanged)
+        self.batch_worker.etaChanged.connect(self.batchEtaChanged)
+        self.batch_worker.error.connect(self.notificationPromted)
+        self.batch_worker.finished.connect(self.on_batch_finished)
+        self.batch_thread.finished.connect(self.batch_worker.deleteLater)
+        self.batch_thread.finished.connect(self.batch_thread.deleteLater)
+        self.batch_running = True
+        self.batch_thread.start()
+        self.batchRunningChanged.emit(True)
+        self.batchProgressChanged.emit(0, len(todo_invoices))
+
+    def remove_done_todo_invoices(self):
+        """
+        Syncs the Excel files with the outcome journal, and removes the invoices which are done from To Do:
+        the ones the sync removed from the To Do file, e.g. after a crash, and the ones it could not remove
+        because the To Do file is open in Excel. The other To Do changes, e.g. not saved yet, are kept.
+        """
+        todo_path = Global_variables.todo_invoices_excel_path
+        old_accounts = {normalize_account_number(row[0]) for row in read_cell_content_from_first_two_col(todo_path, "Sheet1")}
+        sync_excel_from_journal()
+        accounts = {normalize_account_number(row[0]) for row in read_cell_content_from_first_two_col(todo_path, "Sheet1")}
+        done_accounts = (old_accounts - accounts) | {normalize_account_number(account)
+                                                    for account in read_unsynced_done_accounts()}
+
+        removed_count = 0
+        for account in list(self.todo_invoices):
+            if normalize_account_number(account) in done_accounts:
+                self.delete_todo_invoice(account)
+                removed_count += 1
+        if removed_count > 0:
+            self.notificationPromted.emit(f"Removed {removed_count} invoices processed by an earlier batch from To Do")
+
+    def cancel_processing(self):
+        """Stops the running batch after the invoices in progress"""
+        if not self.is_batch_running():
+            return
+        self.batch_worker.cancel()
+        self.notificationPromted.emit("Cancelling, the invoices in progress are finished first")
+
+    def is_batch_running(self) -> bool:
+        return self.batch_running
+
+    def on_invoice_finished(self, account: str, outcome: str):
+        for i, counted_outcome in enumerate((SUCCEED, FUNDING_REQUESTED, FAILED)):
+            if outcome == counted_outcome:
+                self.left_section_numbers[i] += 1
+                self.left_section_data_ready.emit(tuple(self.left_section_numbers))
+        self.invoiceProcessed.emit(account, outcome)
+
+    def on_batch_finished(self, is_cancelled: bool):
+        # BatchWorker.run returns right after 'finished', so the thread stops at once,
+        # and has stopped before View can close the app
+        self.batch_thread.quit()
+        self.batch_thread.wait()
+        self.batch_thread = None
+        self.batch_worker = None
+        self.batch_running = False
+        self.batchRunningChanged.emit(False)
+        if is_cancelled:
+            self.notificationPromted.emit("Batch cancelled, the invoices not processed are still in To Do")
         self.read_todo_invoices_from_excel()
         self.send_left_section_data()
 
+    def get_ledgers(self) -> list:
+        """The Excel files searched by search_ledgers, (ledger name, file path)"""
+        return [("Succeed Invoices", Global_variables.succeed_invoices_excel_path),
+                ("Funding Requested", Global_variables.funding_requested_excel_path),
+                ("Failed Invoices", Global_variables.failed_invoices_excel_path),
+                ("Saved Invoices", Global_variables.saved_invoices_excel_path)]
+
+    def get_ledger_index(self, file_path) -> SearchIndex:
+        """Returns the SearchIndex of the account numbers of a ledger, the keys are (row number, account number)"""
+        value_rows = read_column_value_rows(file_path, "Sheet1", "Invoice Number")
+        cached = self.ledger_indexes.get(file_path)
+        # The same rows are returned until the file changes
+        if cached is not None and cached[0] is value_rows:
+            return cached[1]
+        ledger_index = SearchIndex()
+        for row_number, account in value_rows:
+            ledger_index.add((row_number, account), [account])
+        self.ledger_indexes[file_path] = (value_rows, ledger_index)
+        return ledger_index
+
+    def search_ledgers(self, search_text: str):
+        # Bring the ledgers up to date with the outcome journal first
+        sync_excel_from_journal()
+        matches = []
+        for ledger_name, file_path in self.get_ledgers():
+            try:
+                ledger_index = self.get_ledger_index(file_path)
+            except (OSError, ValueError) as e:
+                print(f"Failed to search {ledger_name}: {e}")
+                continue
+            for row_number, account in sorted(ledger_index.find(search_text)):
+                matches.append((ledger_name, file_path, row_number, str(account)))
+        self.ledgerMatchesFound.emit(search_text, matches)
+
+    def open_ledger_row(self, file_path: str, row_number: int):
+        if self.is_batch_running():
+            self.notificationPromted.emit("The ledgers are written when the batch ends, please open it after the batch")
+            return
+        # The ledger is opened as it is, saving it with openpyxl to select the row could drop what openpyxl does not support
+        if open_excel_app(file_path):
+            self.notificationPromted.emit(f"Opened {os.path.basename(file_path)}, the invoice is on row {row_number}")
+
     def read_todo_invoices_from_excel(self):
+        # Write the outcomes not in the Excel files yet, e.g. after a crash or a locked file
+        sync_excel_from_journal()
+
         # Read invoices
         todo_invoices = read_cell_content_from_first_two_col(
             Global_variables.todo_invoices_excel_path,
             "Sheet1")
+        old_todo_invoices = self.todo_invoices
         self.todo_invoices = {}
         for todo_invoice in todo_invoices:
             self.todo_invoices.update({todo_invoice[0]:[("" if todo_invoice[1] is None else todo_invoice[1]), False]})
-        self.todoInvoicesChanged.emit()
+
+        # Only the invoices which differ are sent to View, e.g. the ones processed by a batch are removed
+        for account in old_todo_invoices:
+            if account not in self.todo_invoices:
+                self.todoInvoiceRemoved.emit(str(account))
+        for account, (vendor, checkbox_state) in self.todo_invoices.items():
+            if account not in old_todo_invoices:
+                self.todoInvoiceAdded.emit(str(account), vendor, checkbox_state)
+            elif old_todo_invoices[account] != [vendor, checkbox_state]:
+                self.todoInvoiceChanged.emit(str(account), vendor, checkbox_state)
 
     def get_todo_invoices(self):
         return self.todo_invoices.items()
 
     def send_left_section_data(self):
+        if self.is_batch_running():
+            # The Excel files are written when the batch ends
+            self.left_section_data_ready.emit(tuple(self.left_section_numbers))
+            return
+        sync_excel_from_journal()
         self.left_section_data_ready.emit((self.get_succeed_invoices(), self.get_funding_requested_invoices(), self.get_failed_invoices()))
 
     def get_failed_invoices(self) -> int:
-        return len(read_column_values(Global_variables.failed_invoices_excel_path,
-        "Sheet1", "Invoice Number"))
+        return count_column_values(Global_variables.failed_invoices_excel_path,
+        "Sheet1", "Invoice Number")
 
     def get_succeed_invoices(self) -> int:
-        return len(read_column_values(Global_variables.succeed_invoices_excel_path,
-        "Sheet1", "Invoice Number"))
+        return count_column_values(Global_variables.succeed_invoices_excel_path,
+        "Sheet1", "Invoice Number")
 
     def get_funding_requested_invoices(self) -> int:
-        return len(read_column_values(Global_variables.funding_requested_excel_path,
-        "Sheet1", "Invoice Number"))
\ No newline at end of file
+        return count_column_values(Global_variables.funding_requested_excel_path,
+        "Sheet1", "Invoice Number")
\ No newline at end of file
@@ -0,0 +1,221 @@
+import json
+import os
+import tempfile
+import threading
+import time
+
+import Global_variables
+from Batch_checkpoint import ledger_invoices
+from Excel_helper import ExcelLedgerWriter
+
+# Outcome kinds written into the journal
+SUCCEED = "succeed"
+FUNDING_REQUESTED = "funding_requested"
+FAILED = "failed"
+SAVED = "saved"
+DONE = "done"  # the invoice is processed, and removed from To Do
+
+_sync_lock = threading.Lock()
+# The journals open in this process, the journal is only compacted while none is open
+_open_journal_count = 0
+
+
+class OutcomeJournal:
+    """
+    Append-only journal of the invoice outcomes of a batch, one JSON object per line.
+    Every line is flushed and fsync'd before 'record' returns, so an outcome is never lost,
+    even when the program crashes or an Excel file is locked by Excel.
+    The Excel files are only a view of the journal, see sync_excel_from_journal,
+    which removes the journal once every entry is in the Excel files.
+
+    Usage:
+        with OutcomeJournal() as journal:
+            journal.record(FAILED, account_number, (account_number, message))
+    """
+    def __init__(self, journal_path=None):
+        global _open_journal_count
+        self.journal_path = Global_variables.outcome_journal_path if journal_path is None else journal_path
+        with _sync_lock:
+            if self.journal_path == Global_variables.outcome_journal_path and not _has_entries(self.journal_path):
+                # Offsets left by a sync which stopped while compacting belong to the removed journal
+                _remove_file(Global_variables.outcome_journal_offsets_path)
+            self.file = open(self.journal_path, "a", encoding="utf-8")
+            _open_journal_count += 1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def record(self, outcome, account_number, row=None, checkpoint_key=None):
+        """
+        :param outcome: SUCCEED, FUNDING_REQUESTED, FAILED, SAVED or DONE
+        :param account_number: the account number of the invoice
+        :param row: the row written into the Excel file of the outcome
+        :param checkpoint_key: the key of the invoice in the BatchCheckpoint, ledgered once DONE is synced
+        """
+        entry = {"time": time.time(), "outcome": outcome, "account_number": account_number,
+                 "row": None if row is None else list(row), "checkpoint_key": checkpoint_key}
+        self.file.write(json.dumps(entry) + "\n")
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        global _open_journal_count
+        with _sync_lock:
+            if not self.file.closed:
+                self.file.close()
+                _open_journal_count -= 1
+
+
+def _has_entries(file_path) -> bool:
+    return os.path.exists(file_path) and os.path.getsize(file_path) > 0
+
+
+def _remove_file(file_path):
+    try:
+        os.remove(file_path)
+    except FileNotFoundError:
+        pass
+
+
+def _apply_entry_to_ledger(ledger, entry, file_path):
+    """Writes one journal entry into the Excel file it belongs to"""
+    outcome = entry["outcome"]
+    if outcome == SAVED:
+        ledger.populate_invoice_numbers(file_path, "Sheet1", "Invoice Number", [entry["account_number"]])
+    elif outcome == DONE:
+        ledger.delete_cell_content_if_matches(file_path, "Sheet1", "Invoice Number", entry["account_number"])
+    else:
+        ledger.insert_tuples_in_excel(file_path, "Sheet1", [tuple(entry["row"])])
+
+
+def _get_outcome_excel_paths() -> dict:
+    return {
+        SUCCEED: Global_variables.succeed_invoices_excel_path,
+        FUNDING_REQUESTED: Global_variables.funding_requested_excel_path,
+        FAILED: Global_variables.failed_invoices_excel_path,
+        SAVED: Global_variables.saved_invoices_excel_path,
+        DONE: Global_variables.todo_invoices_excel_path,
+    }
+
+
+def _read_exported_offsets() -> dict:
+    """Returns Excel path -> journal offset written into that Excel file"""
+    try:
+        with open(Global_variables.outcome_journal_offsets_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return dict()
+
+
+def _write_exported_offsets(offsets):
+    directory_path = os.path.dirname(os.path.abspath(Global_variables.outcome_journal_offsets_path))
+    fd, temp_path = tempfile.mkstemp(dir=directory_path, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(offsets, f)
+    os.replace(temp_path, Global_variables.outcome_journal_offsets_path)
+
+
+def sync_excel_from_journal() -> bool:
+    """
+    Writes the journal entries which are not in the Excel files yet into the Excel files.
+    Each Excel file remembers how far of the journal it has, so a file locked by Excel
+    is simply written on the next sync, and the other files are not written twice.
+    Once every Excel file has the whole journal and no batch is writing it, the journal is removed.
+    :return: True if every Excel file is up to date
+    """
+    # The batch thread and the window both sync, one sync at a time
+    with _sync_lock:
+        return _sync_excel_from_journal()
+
+
+def _sync_excel_from_journal() -> bool:
+    if not os.path.exists(Global_variables.outcome_journal_path):
+        return True
+
+    outcome_excel_paths = _get_outcome_excel_paths()
+    offsets = _read_exported_offsets()
+    start_offset = min(offsets.get(file_path, 0) for file_path in outcome_excel_paths.values())
+    # The checkpoint keys of the invoices removed from To Do by this sync
+    done_checkpoint_keys = []
+
+    ledger = ExcelLedgerWriter()
+    with open(Global_variables.outcome_journal_path, "rb") as f:
+        f.seek(start_offset)
+        offset = start_offset
+        for line in f:
+            if not line.endswith(b"\n"):
+                # A line still being written, it is synced next time
+                break
+            entry = json.loads(line)
+            file_path = outcome_excel_paths[entry["outcome"]]
+            if offset >= offsets.get(file_path, 0):
+                _apply_entry_to_ledger(ledger, entry, file_path)
+                if entry["outcome"] == DONE and entry.get("checkpoint_key") is not None:
+                    done_checkpoint_keys.append(entry["checkpoint_key"])
+            offset += len(line)
+        end_offset = offset
+        journal_size = os.fstat(f.fileno()).st_size
+
+    try:
+        ledger.flush()
+        is_flushed = True
+    except Exception as e:
+        print(f"Failed to write outcomes into Excel: {type(e).__name__}: {e}")
+        is_flushed = False
+
+    # A workbook saved before the flush failed has its entries, they must not be written into it again
+    synced_paths = [file_path for file_path in outcome_excel_paths.values()
+                    if file_path in ledger.saved_paths or (is_flushed and file_path not in ledger.unsaved_paths)]
+    for file_path in synced_paths:
+        offsets[file_path] = max(offsets.get(file_path, 0), end_offset)
+    _write_exported_offsets(offsets)
+    if outcome_excel_paths[DONE] in synced_paths and len(done_checkpoint_keys) > 0:
+        # Out of To Do, even if the batch stopped before recording LEDGERED in the checkpoint
+        try:
+            ledger_invoices(done_checkpoint_keys)
+        except OSError as e:
+            print(f"Failed to ledger the synced invoices in the batch checkpoint: {e}")
+    if not is_flushed or len(ledger.unsaved_paths) > 0:
+        return False
+
+    if end_offset == journal_size and _open_journal_count == 0:
+        _compact_journal()
+    return True
+
+
+def read_unsynced_done_accounts() -> list:
+    """
+    Returns the account numbers of the DONE entries which are not written into To Do yet,
+    e.g. because To Do is open in Excel, so those invoices are not processed again.
+    """
+    with _sync_lock:
+        if not os.path.exists(Global_variables.outcome_journal_path):
+            return []
+        todo_offset = _read_exported_offsets().get(Global_variables.todo_invoices_excel_path, 0)
+        accounts = []
+        with open(Global_variables.outcome_journal_path, "rb") as f:
+            f.seek(todo_offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                entry = json.loads(line)
+                if entry["outcome"] == DONE:
+                    accounts.append(entry["account_number"])
+        return accounts
+
+
+def _compact_journal():
+    """
+    Removes the journal whose entries are all in the Excel files, and then the offsets into it.
+    If the program stops in between, the next OutcomeJournal removes the offsets left behind.
+    """
+    try:
+        _remove_file(Global_variables.outcome_journal_path)
+        _remove_file(Global_variables.outcome_journal_offsets_path)
+    except OSError as e:
+        # e.g. the journal is open in another program, it is removed on a later sync
+        print(f"Failed to remove the outcome journal: {e}")
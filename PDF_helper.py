@@ -0,0 +1,224 @@
+import datetime
+import hashlib
+import os
+import re
+import tempfile
+import time
+
+import Global_variables
+from CustomizedExceptions import AmountError, NegativeAmountError
+from scan_helper import self_check
+
+
+def _get_cache_key(pdf_path, mode) -> str:
+    """
+    The cache key is made of the file path, size and modification time,
+    so a PDF replaced or edited in the folder is always extracted again.
+    """
+    stat = os.stat(pdf_path)
+    raw_key = f"{os.path.abspath(pdf_path)}|{stat.st_size}|{stat.st_mtime_ns}|{mode}"
+    return hashlib.sha1(raw_key.encode("utf-8")).hexdigest()
+
+
+def _read_cached_text(cache_key):
+    """Returns the cached text, or None if it is not cached yet"""
+    cache_file_path = os.path.join(Global_variables.pdf_text_cache_dir_path, cache_key + ".txt")
+    try:
+        with open(cache_file_path, "r", encoding="utf-8") as f:
+            text = f.read()
+        # A used entry is kept by prune_pdf_text_cache, which removes the least recently used ones
+        os.utime(cache_file_path)
+        return text
+    except FileNotFoundError:
+        return None
+    except OSError as e:
+        print(f"Failed to read PDF text cache: {e}")
+        return None
+
+
+def _write_cached_text(cache_key, text):
+    """
+    Writes the text into the cache. The file is written to a temp file first and then renamed,
+    so scanning processes running at the same time never read a half-written cache file.
+    """
+    try:
+        os.makedirs(Global_variables.pdf_text_cache_dir_path, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=Global_variables.pdf_text_cache_dir_path, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(temp_path, os.path.join(Global_variables.pdf_text_cache_dir_path, cache_key + ".txt"))
+    except OSError as e:
+        # A failed cache write only costs a re-extraction next time
+        print(f"Failed to write PDF text cache: {e}")
+
+
+def prune_pdf_text_cache(max_age_days=None, max_size=None):
+    """
+    Removes the cache files not used for 'max_age_days', then the least recently used ones
+    until the cache is smaller than 'max_size' bytes. Called when a batch starts, so the texts
+    of renamed, replaced or paid bills do not pile up.
+    The cache keys are hashes, so a file can not be matched back to its PDF, the time it was last used is used instead.
+    """
+    max_age_days = Global_variables.pdf_text_cache_max_age_days if max_age_days is None else max_age_days
+    max_size = Global_variables.pdf_text_cache_max_size if max_size is None else max_size
+    try:
+        with os.scandir(Global_variables.pdf_text_cache_dir_path) as it:
+            entries = [(entry.stat().st_mtime, entry.stat().st_size, entry.path) for entry in it if entry.is_file()]
+    except FileNotFoundError:
+        return
+    except OSError as e:
+        print(f"Failed to list PDF text cache: {e}")
+        return
+
+    oldest_time = time.time() - max_age_days * 24 * 60 * 60
+    total_size = sum(size for _, size, _ in entries)
+    removed_count = 0
+    # The least recently used first
+    for used_time, size, path in sorted(entries):
+        if used_time >= oldest_time and total_size <= max_size:
+            break
+        try:
+            os.remove(path)
+        except OSError as e:
+            # Read by a scanning process at the moment, it is removed next time
+            print(f"Failed to remove PDF text cache file: {e}")
+            continue
+        total_size -= size
+        removed_count += 1
+    if removed_count > 0:
+        print(f"Removed {removed_count} old files from the PDF text cache")
+
+
+def _get_or_extract(pdf_path, mode, extract):
+    cache_key = _get_cache_key(pdf_path, mode)
+    text = _read_cached_text(cache_key)
+    if text is None:
+        text = extract()
+        _write_cached_text(cache_key, text)
+    return text
+
+
+def _extract_text_with_fitz(pdf_path, max_pages=None) -> str:
+    import fitz
+
+    doc = fitz.open(pdf_path)
+    try:
+        page_count = doc.page_count if max_pages is None else min(max_pages, doc.page_count)
+        return "".join(doc[page_number].get_text() for page_number in range(page_count))
+    finally:
+        doc.close()
+
+
+def _extract_text_with_pdfplumber(pdf_path, max_pages=None) -> str:
+    import pdfplumber
+
+    with pdfplumber.open(pdf_path) as pdf:
+        return "".join((page.extract_text() or "") + "\n" for page in pdf.pages[:max_pages])
+
+
+def get_pdf_text(pdf_path, backend="fitz", max_pages=None) -> str:
+    """
+    Returns the text of the PDF.
+    The text is extracted only once, and re-used until the PDF file changes.
+    :param pdf_path: Full path to the PDF file.
+    :param backend: 'fitz' (PyMuPDF page.get_text) or 'pdfplumber' (page.extract_text)
+    :param max_pages: only extract the first 'max_pages' pages, None for all pages
+    """
+    mode = backend if max_pages is None else f"{backend}-first-{max_pages}"
+    if backend == "fitz":
+        return _get_or_extract(pdf_path, mode, lambda: _extract_text_with_fitz(pdf_path, max_pages))
+    elif backend == "pdfplumber":
+        return _get_or_extract(pdf_path, mode, lambda: _extract_text_with_pdfplumber(pdf_path, max_pages))
+    raise ValueError(f"Unknown PDF text backend: {backend}")
+
+
+def get_pdf_region_text(pdf_path, bbox, page_number=0) -> str:
+    """
+    Returns the text inside the bbox (x0, top, x1, bottom) of one page, extracted by pdfplumber.
+    The text is cached in the same way as get_pdf_text.
+    """
+    def extract():
+        import pdfplumber
+
+        with pdfplumber.open(pdf_path) as pdf:
+            return pdf.pages[page_number].crop(bbox).extract_text() or ""
+
+    return _get_or_extract(pdf_path, f"pdfplumber-crop-{page_number}-{bbox}", extract)
+
+
+# Digits with dashes between them, e.g. '106703-0001284'
+_ACCOUNT_NUMBER_FORMAT = re.compile(r"\d[\d-]*\d")
+# Longer periods, or a statement long after the period, mean a date was read from the wrong place
+MAX_BILLING_PERIOD_DAYS = 366
+MAX_STATEMENT_DELAY_DAYS = 120
+
+
+def _has_valid_account_and_dates(results) -> bool:
+    """
+    The account number looks like one and is in the suggested file name, the dates are 'dd/mm/yyyy',
+    the period ends after it starts, and the statement is not dated before the period.
+    A text layout which the patterns were not written for can still give a value for every field,
+    e.g. the due date read as the statement date, so the amounts adding up is not enough.
+    """
+    account_number = str(results["account_number"])
+    if not _ACCOUNT_NUMBER_FORMAT.fullmatch(account_number):
+        return False
+    if not str(results["suggested_file_name"]).startswith(account_number):
+        return False
+    try:
+        period_start_date = datetime.datetime.strptime(results["period_start_date"], "%d/%m/%Y")
+        period_end_date = datetime.datetime.strptime(results["period_end_date"], "%d/%m/%Y")
+        statement_date = datetime.datetime.strptime(results["statement_date"], "%d/%m/%Y")
+    except (TypeError, ValueError):
+        return False
+    if not period_start_date < period_end_date <= period_start_date + datetime.timedelta(MAX_BILLING_PERIOD_DAYS):
+        return False
+    return period_start_date <= statement_date <= period_end_date + datetime.timedelta(MAX_STATEMENT_DELAY_DAYS)
+
+
+def _is_complete(results) -> bool:
+    """Every field is found, the account number and dates are consistent, and the amounts add up, see self_check"""
+    if None in results.values():
+        return False
+    if not _has_valid_account_and_dates(results):
+        return False
+    try:
+        self_check(results)
+    except NegativeAmountError:
+        # The amounts add up, the bill is just not payable
+        return True
+    except (AmountError, TypeError, ValueError):
+        return False
+    return True
+
+
+def parse_pdf_with_fallback(pdf_path, extract_fields, backends=("fitz", "pdfplumber"), page_hints=()) -> dict:
+    """
+    Extracts the fields of a bill with the fast fitz text first, and only falls back to
+    pdfplumber when the fitz text layout does not give every field with consistent dates.
+    With page hints, the first pages are tried before the whole document, so a long bill
+    stops being extracted once every field is found and the amounts add up.
+    :param pdf_path: Full path to the PDF file.
+    :param extract_fields: a function which takes the text of the bill and returns the extracted data
+    :param backends: the text backends to try, in order
+    :param page_hints: numbers of first pages to try before the whole document, e.g. (1,)
+    :return: the first complete extracted data, otherwise the extracted data of the whole document
+    """
+    results = None
+    error = None
+    for backend in backends:
+        for max_pages in (*page_hints, None):
+            try:
+                page_results = extract_fields(get_pdf_text(pdf_path, backend, max_pages))
+            except Exception as e:
+                # The text layout does not match the patterns of the vendor
+                error = e
+                continue
+            if _is_complete(page_results):
+                return page_results
+            if max_pages is None:
+                results = page_results
+                print(f"Missing fields in {backend} text of {pdf_path}")
+    if results is None:
+        raise error
+    return results
@@ -0,0 +1,236 @@
+"""
+End-to-end benchmark of pps_multiple_invoices_input against Mock_PPS_server.
+It generates Welland bills, writes them into a temporary To Do file, inputs them into the mock PPS
+and reports invoices per minute, the p50/p95 latency of one invoice and the time spent in each stage.
+Nothing of the real Excel files, invoice folder or browser profiles is touched.
+
+Usage:
+    python PPS_benchmark.py --invoices 20 --workers 2 --latency 0.2 --failure-rate 0.02
+    python PPS_benchmark.py --invoices 50 --http-only    (the HTTP client without Chrome)
+"""
+import argparse
+import datetime
+import multiprocessing
+import os
+import random
+import tempfile
+import threading
+import time
+
+import openpyxl
+
+import Global_variables
+import Web_page_interact
+from Mock_PPS_server import start_mock_pps_server, get_home_url
+
+WELLAND_BILL_TEXT = """Account Number
+{account_number}
+Amount Due
+{statement_date}
+Amount Due ${amount_due}
+Billing Period: {period_start} to {period_end}
+TOTAL ELECTRICITY CHARGES
+${electricity:.2f}
+ONTARIO ELECTRICITY REBATE
+-${rebate:.2f}
+BALANCE FORWARD (Due Now)
+${balance_forward:.2f}
+OVERDUE INTEREST
+${overdue_interest:.2f}
+TAXES *HST (863759692RT0001)
+${hst:.2f}"""
+
+
+class StageTimer:
+    """Collects the seconds spent in each stage, from every browser worker thread"""
+    def __init__(self):
+        self.durations = dict()
+        self.lock = threading.Lock()
+
+    def record(self, stage, seconds):
+        with self.lock:
+            self.durations.setdefault(stage, []).append(seconds)
+
+    def wrap(self, stage, function):
+        """Returns 'function' timed as 'stage'"""
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.record(stage, time.perf_counter() - start)
+        return timed
+
+
+def percentile(values, fraction) -> float:
+    """The nearest-rank percentile, e.g. percentile(values, 0.95)"""
+    ordered = sorted(values)
+    if len(ordered) == 0:
+        return 0.0
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))]
+
+
+def write_welland_bill(pdf_path, account_number, rng):
+    """Writes a one-page Welland bill whose amounts add up, see extract_welland_fields"""
+    import fitz
+
+    statement_date = datetime.date.today() - datetime.timedelta(days=rng.randint(5, 25))
+    period_end = statement_date.replace(day=1) - datetime.timedelta(days=1)
+    period_start = period_end.replace(day=1)
+    electricity = rng.randint(2000, 90000) / 100
+    rebate = round(electricity * 0.117, 2)
+    balance_forward = rng.choice([0, rng.randint(100, 20000) / 100])
+    overdue_interest = rng.choice([0, rng.randint(1, 500) / 100])
+    hst = round(electricity * 0.13, 2)
+    subtotal = round(electricity - rebate + balance_forward + overdue_interest, 2)
+
+    text = WELLAND_BILL_TEXT.format(
+        account_number=account_number, statement_date=statement_date.isoformat(),
+        amount_due=f"{subtotal + hst:,.2f}", period_start=period_start.isoformat(), period_end=period_end.isoformat(),
+        electricity=electricity, rebate=rebate, balance_forward=balance_forward,
+        overdue_interest=overdue_interest, hst=hst)
+    document = fitz.open()
+    document.new_page().insert_text((50, 72), text, fontsize=10)
+    document.save(pdf_path)
+    document.close()
+
+
+def write_excel(file_path, header, rows=()):
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "Sheet1"
+    ws.append(header)
+    for row in rows:
+        ws.append(list(row))
+    wb.save(file_path)
+
+
+def prepare_batch(work_dir_path, invoice_count, seed) -> list:
+    """
+    Generates the bills and the Excel files in 'work_dir_path', and points Global_variables at them.
+    :return: the todo invoices, [account number, vendor]
+    """
+    rng = random.Random(seed)
+    invoice_dir_path = os.path.join(work_dir_path, "Invoice PDF")
+    os.makedirs(invoice_dir_path)
+    # Fresh account numbers every run, so the mock never sees a duplicate invoice
+    account_numbers = [f"{number:08d}-00" for number in rng.sample(range(10 ** 7, 10 ** 8), invoice_count)]
+    for account_number in account_numbers:
+        write_welland_bill(os.path.join(invoice_dir_path, account_number + ".pdf"), account_number, rng)
+    invoices_todo_lst = [[account_number, "Welland"] for account_number in account_numbers]
+
+    Global_variables.todo_invoices_excel_path = os.path.join(work_dir_path, "Invoices To Do.xlsx")
+    Global_variables.succeed_invoices_excel_path = os.path.join(work_dir_path, "Succeed Invoices.xlsx")
+    Global_variables.funding_requested_excel_path = os.path.join(work_dir_path, "Funding Requested.xlsx")
+    Global_variables.failed_invoices_excel_path = os.path.join(work_dir_path, "Failed Invoices.xlsx")
+    Global_variables.saved_invoices_excel_path = os.path.join(work_dir_path, "Saved Invoices.xlsx")
+    Global_variables.renamed_invoices_dir_path = os.path.join(work_dir_path, "Temp Hydro Invoices")
+    Global_variables.configuration_file_path = os.path.join(work_dir_path, "Configuration.txt")
+    Global_variables.outcome_journal_path = os.path.join(work_dir_path, "Invoice Outcomes.jsonl")
+    Global_variables.outcome_journal_offsets_path = os.path.join(work_dir_path, "Invoice Outcomes Exported.json")
+    Global_variables.batch_checkpoint_path = os.path.join(work_dir_path, "Batch Checkpoint.jsonl")
+    Global_variables.browser_profile_dir_path = os.path.join(work_dir_path, "Browser Profiles")
+    # The parse worker processes get it from create_parse_executor, so the user's cache is left alone
+    Global_variables.pdf_text_cache_dir_path = os.path.join(work_dir_path, "PDF Text Cache")
+
+    write_excel(Global_variables.todo_invoices_excel_path, ["Invoice Number", "Vendor"], invoices_todo_lst)
+    write_excel(Global_variables.succeed_invoices_excel_path, ["Invoice Number", "Date", "Accrual Total"])
+    write_excel(Global_variables.funding_requested_excel_path, ["Invoice Number", "Date", "Accrual Total"])
+    write_excel(Global_variables.failed_invoices_excel_path, ["Invoice Number", "Comments"])
+    write_excel(Global_variables.saved_invoices_excel_path, ["Invoice Number"])
+    with open(Global_variables.configuration_file_path, "w") as f:
+        f.write(f"benchmark@example.com\n\n{invoice_dir_path}\n")
+    return invoices_todo_lst
+
+
+def instrument(timer, http_only):
+    """Times the stages of pps_multiple_invoices_input by wrapping the functions it looks up at call time"""
+    if http_only:
+        # One requests session per worker instead of a browser, the session keeps the mock's cookie
+        import requests
+        from PPS_http_client import PPSHttpClient, http_single_invoice_input, http_read_agreement
+
+        Web_page_interact.pps_sessions.acquire_driver = requests.Session
+        Web_page_interact.pps_sessions.release_driver = lambda session: session.close()
+        Web_page_interact.input_invoice_into_pps = lambda results, session, agreement_cache=None, before_write=None: \
+            http_single_invoice_input(results, PPSHttpClient(session), agreement_cache, before_write)
+        Web_page_interact.read_agreement_for_preflight = lambda session, results, agreement: \
+            http_read_agreement(results, PPSHttpClient(session), agreement)
+
+    Web_page_interact.pps_sessions.acquire_driver = timer.wrap("start browser", Web_page_interact.pps_sessions.acquire_driver)
+    Web_page_interact.preflight_todo_invoice = timer.wrap("pre-flight check", Web_page_interact.preflight_todo_invoice)
+    Web_page_interact.get_parsed_invoice = timer.wrap("wait for parsed PDF", Web_page_interact.get_parsed_invoice)
+    Web_page_interact.input_invoice_into_pps = timer.wrap("input into PPS", Web_page_interact.input_invoice_into_pps)
+    Web_page_interact.copy_as_pdf_in_original_and_destination = timer.wrap(
+        "copy renamed PDF", Web_page_interact.copy_as_pdf_in_original_and_destination)
+    Web_page_interact.sync_excel_from_journal = timer.wrap("write Excel", Web_page_interact.sync_excel_from_journal)
+    Web_page_interact.input_todo_invoice = timer.wrap("invoice", Web_page_interact.input_todo_invoice)
+
+
+class OutcomeCounter:
+    """The on_progress of pps_multiple_invoices_input, counts the outcomes, the journal is removed once synced"""
+    def __init__(self):
+        self.outcomes = dict()
+
+    def __call__(self, account_number, outcome, finished_count, total_count):
+        self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+
+
+def print_report(timer, outcome_counter, invoice_count, elapsed, server):
+    latencies = timer.durations.get("invoice", [])
+    print("=============================")
+    print(f"Invoices:            {invoice_count}")
+    print(f"Wall time:           {elapsed:.2f} s")
+    print(f"Invoices per minute: {invoice_count / elapsed * 60:.1f}")
+    print(f"Invoice latency p50: {percentile(latencies, 0.5):.2f} s")
+    print(f"Invoice latency p95: {percentile(latencies, 0.95):.2f} s")
+    print(f"PPS requests:        {server.RequestHandlerClass.state.requests_served}")
+    print(f"Outcomes:            {outcome_counter.outcomes}")
+    print("Stage                  count    total s   mean s")
+    for stage, durations in timer.durations.items():
+        if stage == "invoice":
+            continue
+        print(f"{stage:<22} {len(durations):>5} {sum(durations):>10.2f} {sum(durations) / len(durations):>8.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the PPS invoice input against the mock PPS")
+    parser.add_argument("--invoices", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=Global_variables.browser_workers, help="browser workers")
+    parser.add_argument("--latency", type=float, default=0.1, help="mean seconds taken by every mock PPS request")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="probability of a server error per request")
+    parser.add_argument("--rejected-amount-rate", type=float, default=0.0,
+                        help="probability of 'Line Amount is mandatory.' per line amount")
+    parser.add_argument("--http-client", action="store_true", help="input with the HTTP client, see pps_http_client")
+    parser.add_argument("--http-only", action="store_true", help="input with the HTTP client alone, without Chrome")
+    parser.add_argument("--headless", action="store_true")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    server = start_mock_pps_server(latency=args.latency, failure_rate=args.failure_rate,
+                                   rejected_amount_rate=args.rejected_amount_rate, seed=args.seed)
+    Global_variables.pps_url = get_home_url(server)
+    Global_variables.browser_workers = args.workers
+    Global_variables.browser_headless = args.headless
+    Global_variables.pps_http_client = args.http_client
+
+    with tempfile.TemporaryDirectory(prefix="PPS benchmark ") as work_dir_path:
+        invoices_todo_lst = prepare_batch(work_dir_path, args.invoices, args.seed)
+        timer = StageTimer()
+        instrument(timer, args.http_only)
+        outcome_counter = OutcomeCounter()
+
+        start = time.perf_counter()
+        try:
+            Web_page_interact.pps_multiple_invoices_input(invoices_todo_lst, outcome_counter)
+        finally:
+            elapsed = time.perf_counter() - start
+            Web_page_interact.pps_sessions.quit_all()
+        print_report(timer, outcome_counter, len(invoices_todo_lst), elapsed, server)
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    # The PDFs are parsed in worker processes, which re-import this module on Windows
+    multiprocessing.freeze_support()
+    main()
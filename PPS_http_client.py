@@ -0,0 +1,462 @@
+import re
+from html.parser import HTMLParser
+from urllib.parse import urljoin, urlparse
+
+import requests
+
+import Global_variables
+from Agreement_cache import AgreementCache
+from CustomizedExceptions import UnsaveableError, ExtractedDataUnmatchError, RequestApprovalError
+from OCR_helper import get_today_date
+from scan_helper import convert_to_float, calculate_fiscal_year
+from Web_page_interact import get_pps_invoice_number, find_approved_row, check_agreement_comments, \
+    check_invoice_history, get_fiscal_year_remaining
+
+
+class PPSHttpError(Exception):
+    """Exception raised when a PPS page is not what the HTTP client expects"""
+
+
+class PPSHttpFallback(Exception):
+    """
+    Exception raised when the HTTP client stops before anything is written into PPS,
+    the invoice can be inputted with the browser instead.
+    """
+
+
+# Void elements have no end tag, they never contain text
+_VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+
+# __doPostBack('target','argument') and WebForm_DoPostBackWithOptions(new WebForm_PostBackOptions("target", ...
+# The quotes are escaped when the call is inside setTimeout('...'), as in auto-postback dropdowns
+_DO_POSTBACK_PATTERN = re.compile(r"""__doPostBack\(\s*\\?['"]([^'"\\]*)\\?['"]\s*,\s*\\?['"]([^'"\\]*)\\?['"]""")
+_POSTBACK_OPTIONS_PATTERN = re.compile(r"""WebForm_PostBackOptions\(\s*\\?["']([^"'\\]*)\\?["']""")
+
+
+class WebFormsPage(HTMLParser):
+    """
+    One ASP.NET WebForms page, parsed into what the postbacks need:
+    the form fields with their ids and names, the texts and links of elements with an id, and the tables.
+    """
+    def __init__(self, url, html):
+        super().__init__(convert_charrefs=True)
+        self.url = url
+        self.html = html
+        self.action = url
+        self.fields = []  # dicts of tag, type, id, name, value, checked, options, onchange
+        self.id_to_field = dict()
+        self.texts = dict()  # element id -> text
+        self.links = []  # dicts of id, href, class, text
+        self.tables = dict()  # table id -> rows -> cells -> {"text", "hrefs", "field_ids"}
+
+        self._open_elements = []  # (tag, id)
+        self._open_tables = []  # the rows of the open tables with an id
+        self._open_rows = []
+        self._open_cells = []
+        self._open_link = None
+        self._open_option = None
+        self._open_textarea = None
+        self._open_select = None
+        self.feed(html)
+        self.close()
+
+    def handle_starttag(self, tag, attrs):
+        attrs = {key: ("" if value is None else value) for key, value in attrs}
+        element_id = attrs.get("id")
+
+        if tag == "form" and "action" in attrs:
+            self.action = urljoin(self.url, attrs["action"])
+        elif tag in ("input", "select", "textarea"):
+            field_type = attrs.get("type", "text").lower()
+            # A checkbox without a value is posted as 'on' by the browser
+            default_value = "on" if field_type in ("checkbox", "radio") else ""
+            field = {"tag": tag, "type": field_type, "id": element_id,
+                     "name": attrs.get("name"), "value": attrs.get("value", default_value), "checked": "checked" in attrs,
+                     "options": [], "onchange": attrs.get("onchange", "")}
+            self.fields.append(field)
+            if element_id is not None:
+                self.id_to_field[element_id] = field
+            for cell in self._open_cells:
+                cell["field_ids"].append(element_id)
+            if tag == "select":
+                self._open_select = field
+            elif tag == "textarea":
+                self._open_textarea = field
+        elif tag == "option" and self._open_select is not None:
+            self._open_option = {"value": attrs.get("value"), "text": "", "selected": "selected" in attrs}
+            self._open_select["options"].append(self._open_option)
+        elif tag == "a":
+            self._open_link = {"id": element_id, "href": attrs.get("href", ""), "class": attrs.get("class", ""), "text": ""}
+            self.links.append(self._open_link)
+            for cell in self._open_cells:
+                cell["hrefs"].append(self._open_link["href"])
+        elif tag == "table":
+            rows = []
+            if element_id is not None:
+                self.tables[element_id] = rows
+            self._open_tables.append(rows if element_id is not None else None)
+        elif tag == "tr":
+            # A row belongs to every open table, like table.querySelectorAll('tr')
+            row = []
+            for rows in self._open_tables:
+                if rows is not None:
+                    rows.append(row)
+            self._open_rows.append(row)
+        elif tag == "td":
+            cell = {"text": "", "hrefs": [], "field_ids": []}
+            for row in self._open_rows:
+                row.append(cell)
+            self._open_cells.append(cell)
+
+        if tag in _VOID_TAGS:
+            return
+        if element_id is not None:
+            self.texts.setdefault(element_id, "")
+        self._open_elements.append((tag, element_id))
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in _VOID_TAGS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag == "select":
+            self._open_select = None
+        elif tag == "option":
+            self._open_option = None
+        elif tag == "textarea":
+            self._open_textarea = None
+        elif tag == "a":
+            self._open_link = None
+        elif tag == "table" and len(self._open_tables) > 0:
+            self._open_tables.pop()
+        elif tag == "tr" and len(self._open_rows) > 0:
+            self._open_rows.pop()
+        elif tag == "td" and len(self._open_cells) > 0:
+            self._open_cells.pop()
+
+        # Close the element, and the elements left open inside it
+        for i in range(len(self._open_elements) - 1, -1, -1):
+            if self._open_elements[i][0] == tag:
+                del self._open_elements[i:]
+                break
+
+    def handle_data(self, data):
+        for tag, element_id in self._open_elements:
+            if element_id is not None:
+                self.texts[element_id] += data
+        for cell in self._open_cells:
+            cell["text"] += data
+        if self._open_link is not None:
+            self._open_link["text"] += data
+        if self._open_option is not None:
+            self._open_option["text"] += data
+        if self._open_textarea is not None:
+            self._open_textarea["value"] += data
+
+    def has_element(self, element_id) -> bool:
+        return element_id in self.texts or element_id in self.id_to_field
+
+    def get_text(self, element_id) -> str:
+        if element_id not in self.texts:
+            raise PPSHttpError(f"Element '{element_id}' not found in {self.url}")
+        return self.texts[element_id].strip()
+
+    def get_field(self, element_id) -> dict:
+        if element_id not in self.id_to_field:
+            raise PPSHttpError(f"Field '{element_id}' not found in {self.url}")
+        return self.id_to_field[element_id]
+
+    def get_link(self, element_id) -> dict:
+        for link in self.links:
+            if link["id"] == element_id:
+                return link
+        raise PPSHttpError(f"Link '{element_id}' not found in {self.url}")
+
+    def get_table_rows(self, table_id) -> list:
+        """Returns the cell texts of the table, the same as snapshot_table"""
+        if table_id not in self.tables:
+            raise PPSHttpError(f"Table '{table_id}' not found in {self.url}")
+        return [[cell["text"].strip() for cell in row] for row in self.tables[table_id]]
+
+    def get_option_value(self, select_id, visible_text) -> str:
+        for option in self.get_field(select_id)["options"]:
+            if option["text"].strip() == visible_text:
+                return option["text"].strip() if option["value"] is None else option["value"]
+        raise PPSHttpError(f"Option '{visible_text}' not found in '{select_id}' of {self.url}")
+
+    def has_message(self, message) -> bool:
+        """Whether a validation message is shown as a list item, e.g. 'Line Amount is mandatory.'"""
+        return re.search(r"<li>\s*" + re.escape(message) + r"\s*</li>", self.html) is not None
+
+    def get_form_data(self) -> dict:
+        """The values the browser would post, without any button"""
+        data = dict()
+        for field in self.fields:
+            if field["name"] is None or field["type"] in ("submit", "button", "image", "reset", "file"):
+                continue
+            if field["type"] in ("checkbox", "radio") and not field["checked"]:
+                continue
+            if field["tag"] == "select":
+                selected = [option for option in field["options"] if option["selected"]] or field["options"][:1]
+                if len(selected) == 0:
+                    continue
+                data[field["name"]] = selected[0]["text"].strip() if selected[0]["value"] is None else selected[0]["value"]
+            else:
+                data[field["name"]] = field["value"]
+        return data
+
+
+def get_postback_target(script) -> tuple:
+    """
+    Returns the (event target, event argument) of a javascript postback,
+    e.g. "javascript:__doPostBack('ctl00$tabControl$InvoicesTab','')", or None if it is not a postback.
+    """
+    match = _DO_POSTBACK_PATTERN.search(script)
+    if match:
+        return match.group(1), match.group(2)
+    match = _POSTBACK_OPTIONS_PATTERN.search(script)
+    if match:
+        return match.group(1), ""
+    return None
+
+
+class PPSHttpClient:
+    """
+    Replays the PPS WebForms postbacks with plain HTTP requests, with the cookies of a logged-in browser.
+    A postback posts the hidden fields (__VIEWSTATE, __EVENTVALIDATION, ...) and every field of the page,
+    so PPS sees the same form the browser would post, without rendering any page.
+    """
+    def __init__(self, session):
+        self.session = session
+
+    @classmethod
+    def from_driver(cls, driver):
+        """Creates the client with the cookies and user agent of the logged-in driver"""
+        session = requests.Session()
+        session.headers["User-Agent"] = driver.execute_script("return navigator.userAgent")
+        for cookie in driver.get_cookies():
+            session.cookies.set(cookie["name"], cookie["value"], domain=cookie.get("domain"), path=cookie.get("path", "/"))
+        return cls(session)
+
+    def _to_page(self, response) -> WebFormsPage:
+        response.raise_for_status()
+        if urlparse(response.url).netloc != urlparse(Global_variables.pps_url).netloc:
+            # Redirected to the Microsoft login page
+            raise PPSHttpError(f"The PPS session has expired, redirected to {response.url}")
+        return WebFormsPage(response.url, response.text)
+
+    def get(self, url) -> WebFormsPage:
+        return self._to_page(self.session.get(url, timeout=Global_variables.pps_http_timeout))
+
+    def post_back(self, page, fields=None, event_target="", event_argument="", button_id=None) -> WebFormsPage:
+        """
+        Posts the form of the page back to PPS.
+        :param fields: element id -> value, the values typed into the page
+        :param event_target: the control raising the postback, for links and auto-postback fields
+        :param button_id: the id of the submit button clicked
+        """
+        data = page.get_form_data()
+        for element_id, value in (fields or dict()).items():
+            data[page.get_field(element_id)["name"]] = value
+        data["__EVENTTARGET"] = event_target
+        data["__EVENTARGUMENT"] = event_argument
+        if button_id is not None:
+            button = page.get_field(button_id)
+            data[button["name"]] = button["value"]
+        return self._to_page(self.session.post(page.action, data=data, timeout=Global_variables.pps_http_timeout))
+
+    def click_link(self, page, link) -> WebFormsPage:
+        """Follows a link of the page, a javascript:__doPostBack link is posted back"""
+        target = get_postback_target(link["href"])
+        if target is not None:
+            return self.post_back(page, event_target=target[0], event_argument=target[1])
+        return self.get(urljoin(page.url, link["href"]))
+
+    def click_button(self, page, button_id, fields=None) -> WebFormsPage:
+        return self.post_back(page, fields=fields, button_id=button_id)
+
+    def select_option(self, page, select_id, visible_text, fields=None):
+        """
+        Selects the option of the dropdown. Returns the page posted back if the dropdown posts back
+        on change, otherwise returns None and the value is to be posted with the next postback.
+        """
+        value = page.get_option_value(select_id, visible_text)
+        field = page.get_field(select_id)
+        target = get_postback_target(field["onchange"])
+        if target is None:
+            field["options"] = [dict(option, selected=(option["value"] == value)) for option in field["options"]]
+            return None
+        data = dict(fields or dict())
+        data[select_id] = value
+        return self.post_back(page, fields=data, event_target=target[0] or field["name"], event_argument=target[1])
+
+
+def http_single_invoice_input(results, client, agreement_cache=None, before_write=None) -> int:
+    """
+    Inputs one invoice into PPS with the HTTP client, in the same steps as pps_single_invoice_input.
+    The checks and the funding are read first. If a page does not look as expected before the new invoice
+    is created, PPSHttpFallback is raised, and the invoice can be inputted with the browser instead.
+    Funding requests are always left to the browser.
+    :param agreement_cache: the AgreementCache of the batch, shared with the browser
+    :param before_write: a function called before the first change is made in PPS
+    :return: 2 indicates requested payment approval
+    """
+    # Check if amount is greater that the maximum amount threshold
+    if convert_to_float(results["amount_due"]) > Global_variables.maximum_payment_amount:
+        raise UnsaveableError(results['account_number'], "Exceeds maximum amount threshold")
+
+    agreement = (AgreementCache() if agreement_cache is None else agreement_cache).get(results["account_number"])
+    if agreement.comments is not None:
+        check_agreement_comments(agreement.comments, results)
+
+    try:
+        page = _open_agreement_invoices(results, client, agreement)
+    except (PPSHttpError, requests.RequestException) as e:
+        raise PPSHttpFallback(str(e)) from e
+
+    try:
+        if before_write is not None:
+            before_write()
+        return _create_invoice(results, client, page, agreement)
+    except (PPSHttpError, requests.RequestException) as e:
+        # Part of the invoice may be in PPS already, so the browser must not input it again
+        raise UnsaveableError(results['account_number'], f"HTTP input stopped, check the invoice in PPS: {e}") from e
+
+
+def http_read_agreement(results, client, agreement):
+    """
+    Reads the comments and the invoice history of the agreement into its snapshot, for the pre-flight check.
+    Read-only, PPSHttpFallback is raised if a page does not look as expected.
+    """
+    try:
+        page = _open_agreement(results, client, agreement)
+        agreement.comments = page.get_field("contentPlaceHolder_agreementControl_ctl00_description")["value"]
+        page = client.click_link(page, page.get_link("tabControl_InvoicesTab_HyperLink"))
+        agreement.invoice_rows = page.get_table_rows("contentPlaceHolder_invoiceControl_invoices")
+    except (PPSHttpError, requests.RequestException) as e:
+        raise PPSHttpFallback(str(e)) from e
+
+
+def _open_agreement(results, client, agreement) -> WebFormsPage:
+    """Opens the only approved agreement, by its URL if it was opened before in this run"""
+    if agreement.agreement_url is not None:
+        page = client.get(agreement.agreement_url)
+        if page.has_element("contentPlaceHolder_agreementControl_ctl00_description"):
+            return page
+        agreement.agreement_url = None
+
+    page = client.get(Global_variables.pps_url)
+    view_update_links = [link for link in page.links if link["class"] == "homeLink"
+                         and "AwardTypeId=8" in link["href"] and link["text"].strip() == "View/Update"]
+    if len(view_update_links) == 0:
+        raise PPSHttpError("'View/Update' link not found")
+    page = client.click_link(page, view_update_links[0])
+    search_url = page.url
+
+    # Search the account number
+    page = client.click_button(page, "contentPlaceHolder_pbSearch", {
+        "contentPlaceHolder_utilityAccount": results["account_number"].replace("-", "").replace(" ", "")})
+
+    # Open the only approved agreement
+    row_index = find_approved_row(page.get_table_rows("contentPlaceHolder_searchResult"), results)
+    hrefs = page.tables["contentPlaceHolder_searchResult"][row_index][0]["hrefs"]
+    if len(hrefs) == 0:
+        raise PPSHttpError("The approved agreement has no link")
+    page = client.click_link(page, {"href": hrefs[0]})
+    agreement.set_agreement_url(page.url, search_url)
+    return page
+
+
+def _open_agreement_invoices(results, client, agreement) -> WebFormsPage:
+    """Opens the agreement, checks it and its funding, and returns the invoices tab. Read-only."""
+    page = _open_agreement(results, client, agreement)
+
+    # Check if 'Do not pay' is written in comments
+    if agreement.comments is None:
+        agreement.comments = page.get_field("contentPlaceHolder_agreementControl_ctl00_description")["value"]
+        check_agreement_comments(agreement.comments, results)
+
+    # Check if enough funding in the fiscal year, funding requests are left to the browser
+    current_fiscal_year = calculate_fiscal_year(results['statement_date'])
+    if current_fiscal_year is None:
+        raise UnsaveableError(results['account_number'], 'failed to calculate fiscal year')
+    if not agreement.has_funding_for(results, current_fiscal_year):
+        remaining = convert_to_float(page.get_text("contentPlaceHolder_awardTitle_remaining"))
+        if convert_to_float(results['amount_due']) > remaining:
+            raise PPSHttpFallback("A funding request is needed")
+        is_funding_pending = page.get_link("tabControl_Financials_HyperLink")["text"].strip() == 'Financial (Approval Pending)'
+        page = client.click_link(page, page.get_link("tabControl_Financials_HyperLink"))
+        page = client.click_button(page, "contentPlaceHolder_operationsControl_btnNew")
+        remaining = get_fiscal_year_remaining(
+            remaining, page.get_table_rows("contentPlaceHolder_financialControl_distribution_gridFiscal"), current_fiscal_year)
+        agreement.set_remaining_funding(current_fiscal_year, remaining, is_funding_pending)
+        if convert_to_float(results['amount_due']) > remaining:
+            raise PPSHttpFallback("A funding request is needed")
+
+    # Check if any payment is pending and if the suggested invoice number exists
+    page = client.click_link(page, page.get_link("tabControl_InvoicesTab_HyperLink"))
+    agreement.invoice_rows = page.get_table_rows("contentPlaceHolder_invoiceControl_invoices")
+    check_invoice_history(agreement.invoice_rows, results)
+    return page
+
+
+def _create_invoice(results, client, page, agreement) -> int:
+    """Creates the invoice, its line items and its payment certificate, and requests approval"""
+    comment = results["suggested_file_name"][-7:-4] + " " + results["suggested_file_name"][-4:]
+
+    # Press 'new invoice', fill the header and press 'Line Items'
+    page = client.click_button(page, "contentPlaceHolder_invoiceControl_btnNewInvoice")
+    page = client.click_button(page, "contentPlaceHolder_btnNext", {
+        "contentPlaceHolder_ContentPlaceHolder1_ctl00_txtInvoiceNumber": get_pps_invoice_number(results),
+        "contentPlaceHolder_ContentPlaceHolder1_ctl00_workPeriodFrom": results["period_start_date"],
+        "contentPlaceHolder_ContentPlaceHolder1_ctl00_workPeriodTo": results["period_end_date"],
+        "contentPlaceHolder_ContentPlaceHolder1_ctl00_invoiceDate": results["statement_date"],
+        "contentPlaceHolder_ContentPlaceHolder1_ctl00_dateReceived": get_today_date(),
+        "contentPlaceHolder_ContentPlaceHolder1_ctl00_summaryInvoiceTotal": str(results["invoice_subtotal"]),
+        "contentPlaceHolder_ContentPlaceHolder1_ctl00_summaryHSTTotal": str(results["hst"]),
+        "contentPlaceHolder_ContentPlaceHolder1_ctl00_commentsBox": comment,
+    })
+
+    # Input the line items
+    page = _add_invoice_line(client, page, "Electricity", results["total_electricity_charges"])
+    if results["Late Payment Charge"] is not None and results["Late Payment Charge"] != 0:
+        page = _add_invoice_line(client, page, "Late Payment Charges", results["Late Payment Charge"])
+    ETE = round(results["balance_forward"] + results["ontario_electricity_rebate"], 2)
+    if ETE is not None and ETE != 0:
+        page = _add_invoice_line(client, page, "Electricity (Tax Exempt)", ETE)
+
+    # Check if the line items match
+    if page.get_text("PPSHeader_messageText") != "The line items total matches the invoice total.":
+        raise ExtractedDataUnmatchError(results["account_number"])
+
+    # Press 'Confirmation', 'Save As Pending Payment' and 'New Payment Certificate'
+    page = client.click_button(page, "contentPlaceHolder_btnNext")
+    page = client.click_button(page, "contentPlaceHolder_ContentPlaceHolder1_btnSaveAsPendingPayment")
+    agreement.record_submission(results, get_pps_invoice_number(results))
+    page = client.click_button(page, "contentPlaceHolder_TabContainer1_TabPanel4_btnNewPaymentCertificate")
+
+    # Input comment again, press 'Confirmation', 'Save As Draft' and 'Request Approval'
+    page = client.click_button(page, "contentPlaceHolder_btnNext", {
+        "contentPlaceHolder_ContentPlaceHolder1_paymentCertificateHeader_comments": comment})
+    page = client.click_button(page, "contentPlaceHolder_ContentPlaceHolder1_SavePC")
+    page = client.click_button(page, "contentPlaceHolder_TabContainer1_TabPanel4_btnRequestApproval")
+
+    # If the button 'Request Approval' still exists, the approval was not requested
+    if page.has_element("contentPlaceHolder_TabContainer1_TabPanel4_btnRequestApproval"):
+        raise RequestApprovalError(results["account_number"])
+    return 2
+
+
+def _add_invoice_line(client, page, line_type, amount) -> WebFormsPage:
+    """Adds one line item, the HTTP version of fill_invoice_line_and_confirm"""
+    page = client.click_button(page, "contentPlaceHolder_ContentPlaceHolder1_invoiceLines_newLine")
+    amount_field = {"contentPlaceHolder_ContentPlaceHolder1_invoiceLines_amount": str(amount).replace(",", "")}
+    posted_back_page = client.select_option(page, "contentPlaceHolder_ContentPlaceHolder1_invoiceLines_accountDescription",
+                                            line_type)
+    if posted_back_page is not None:
+        page = posted_back_page
+    page = client.click_button(page, "contentPlaceHolder_ContentPlaceHolder1_invoiceLines_btnSave", amount_field)
+    if page.has_message("Line Amount is mandatory."):
+        raise PPSHttpError(f"'{line_type}' line amount was not accepted")
+    return page
@@ -0,0 +1,101 @@
+import bisect
+import re
+
+# Queries shorter than this only match the start of a term, see SearchIndex.find
+_GRAM_LENGTH = 3
+
+
+def normalize_search_text(text) -> str:
+    """Lowercase letters and digits only, so '1234-567 89' is found by '123456789' and 'Hydro One' by 'hydroone'"""
+    return re.sub(r"[^0-9a-z]", "", str(text).lower())
+
+
+def _get_grams(term) -> set:
+    return {term[i:i + _GRAM_LENGTH] for i in range(len(term) - _GRAM_LENGTH + 1)}
+
+
+class SearchIndex:
+    """
+    An in-memory index of the texts of some keys, e.g. the account number and vendor of each todo invoice.
+    A query of 3 characters or more finds the keys with a text containing it, through the trigrams of the texts.
+    A shorter query finds the keys with a text starting with it, through the sorted texts.
+
+    Usage:
+        search_index = SearchIndex()
+        search_index.add("1234-5678", ["1234-5678", "Hydro One"])
+        search_index.find("hydro")  # {"1234-5678"}
+    """
+    def __init__(self):
+        self.key_terms = dict()  # key -> its normalized texts
+        self.term_keys = dict()  # normalized text -> the keys having it
+        self.sorted_terms = []
+        self.gram_terms = dict()  # trigram -> the normalized texts containing it
+
+    def add(self, key, texts):
+        """Indexes the texts of the key, replacing the texts indexed before"""
+        self.remove(key)
+        terms = {normalize_search_text(text) for text in texts if text is not None}
+        terms.discard("")
+        self.key_terms[key] = terms
+        for term in terms:
+            if term not in self.term_keys:
+                self.term_keys[term] = set()
+                bisect.insort(self.sorted_terms, term)
+                for gram in _get_grams(term):
+                    self.gram_terms.setdefault(gram, set()).add(term)
+            self.term_keys[term].add(key)
+
+    def remove(self, key):
+        for term in self.key_terms.pop(key, ()):
+            keys = self.term_keys[term]
+            keys.discard(key)
+            if len(keys) > 0:
+                continue
+            # No key has the term any more
+            del self.term_keys[term]
+            del self.sorted_terms[bisect.bisect_left(self.sorted_terms, term)]
+            for gram in _get_grams(term):
+                terms = self.gram_terms[gram]
+                terms.discard(term)
+                if len(terms) == 0:
+                    del self.gram_terms[gram]
+
+    def clear(self):
+        self.__init__()
+
+    def find(self, query) -> set:
+        """Returns the keys with a text matching the query"""
+        query = normalize_search_text(query)
+        if query == "":
+            return set()
+        keys = set()
+        for term in self._find_terms(query):
+            keys.update(self.term_keys[term])
+        return keys
+
+    def matches(self, key, query) -> bool:
+        """Whether 'key' is one of find(query), without looking at the other keys"""
+        query = normalize_search_text(query)
+        if query == "":
+            return False
+        if len(query) < _GRAM_LENGTH:
+            return any(term.startswith(query) for term in self.key_terms.get(key, ()))
+        return any(query in term for term in self.key_terms.get(key, ()))
+
+    def _find_terms(self, query) -> list:
+        if len(query) < _GRAM_LENGTH:
+            # Every term starting with the query is next to it in the sorted terms
+            start = bisect.bisect_left(self.sorted_terms, query)
+            end = bisect.bisect_left(self.sorted_terms, query + "\uffff")
+            return self.sorted_terms[start:end]
+
+        # Only the terms having every trigram of the query can contain it
+        candidates = None
+        for gram in sorted(_get_grams(query), key=lambda gram: len(self.gram_terms.get(gram, ()))):
+            terms = self.gram_terms.get(gram)
+            if terms is None:
+                return []
+            candidates = set(terms) if candidates is None else candidates & terms
+            if len(candidates) == 0:
+                return []
+        return [term for term in candidates if query in term]
@@ -0,0 +1,131 @@
+import csv
+import os
+import re
+import zipfile
+
+import openpyxl
+from openpyxl.utils.exceptions import InvalidFileException
+
+from VendorInvoicesExtraction.registry import get_vendor_names
+
+# Digits with spaces or dashes between them, e.g. '1234-567 89', not amounts or names
+_ACCOUNT_NUMBER = re.compile(r"\d[\d -]*\d")
+# The shortest fixed-length account numbers (Fortis, Grimsby) have 7 digits, shorter numbers are row numbers,
+# years or counts. A shorter account is reported as a rejected row, and can still be added by hand
+MIN_ACCOUNT_DIGITS = 7
+# Dates which look like account numbers, e.g. '2024 01 05' or '05-01-2024'
+_DATE = re.compile(r"\d{4}[ -]\d{1,2}[ -]\d{1,2}|\d{1,2}[ -]\d{1,2}[ -]\d{4}")
+# The cells of a pasted line, e.g. copied from Excel (tabs) or an email (commas)
+_CELL_SEPARATOR = re.compile(r"[\t,;]")
+# Headers of the account number column, lowercase letters only, e.g. 'Account #' -> 'account'
+ACCOUNT_HEADERS = {"account", "accountnumber", "accountno", "accountnum", "utilityaccount", "invoicenumber"}
+VENDOR_HEADERS = {"vendor", "utility", "vendorname"}
+# The most rejected rows quoted in the notification
+MAX_REJECTED_ROWS_SHOWN = 5
+
+
+def _get_cell_text(cell) -> str:
+    if isinstance(cell, float) and cell.is_integer():
+        # An account number stored as a number in Excel
+        cell = int(cell)
+    return "" if cell is None else str(cell).strip()
+
+
+def _get_header_key(cell) -> str:
+    return re.sub(r"[^a-z]", "", cell.lower())
+
+
+def is_account_number(text) -> bool:
+    """Whether the text of a cell is an account number, and not a row number, a date or an amount"""
+    if not _ACCOUNT_NUMBER.fullmatch(text) or _DATE.fullmatch(text):
+        return False
+    return sum(character.isdigit() for character in text) >= MIN_ACCOUNT_DIGITS
+
+
+def _find_vendor(cells, vendors):
+    for cell in cells:
+        if cell.lower() in vendors:
+            return vendors[cell.lower()]
+    return None
+
+
+def read_account_rows(rows) -> tuple:
+    """
+    Returns the todo invoices of a table, e.g. pasted from Excel or read from a CSV file,
+    and the rows which gave no account number, so they can be reported instead of imported.
+    If the first row has an 'Account Number' header, only that column is read, and a 'Vendor' column gives the vendors.
+    Otherwise every cell which is an account number is imported, and a vendor name in its row is its vendor.
+    :param rows: lists of the cell texts
+    :return: ([account number, vendor], [(row number, row text)]), the vendor is None if the row names none
+    """
+    vendors = {name.lower(): name for name in get_vendor_names()}
+    rows = [(row_number, cells) for row_number, cells in enumerate(rows, start=1) if any(cells)]
+    account_column = None
+    vendor_column = None
+    if len(rows) > 0:
+        header_keys = [_get_header_key(cell) for cell in rows[0][1]]
+        account_columns = [i for i, key in enumerate(header_keys) if key in ACCOUNT_HEADERS]
+        if len(account_columns) > 0:
+            account_column = account_columns[0]
+            vendor_columns = [i for i, key in enumerate(header_keys) if key in VENDOR_HEADERS]
+            vendor_column = vendor_columns[0] if len(vendor_columns) > 0 else None
+            rows = rows[1:]
+
+    invoices = []
+    rejected_rows = []
+    for row_number, cells in rows:
+        if vendor_column is not None and vendor_column < len(cells):
+            vendor = _find_vendor([cells[vendor_column]], vendors)
+        else:
+            vendor = _find_vendor(cells, vendors)
+        if account_column is not None:
+            account_cells = cells[account_column:account_column + 1]
+        else:
+            account_cells = cells
+        accounts = [cell.replace(" ", "") for cell in account_cells if is_account_number(cell)]
+        if len(accounts) == 0:
+            rejected_rows.append((row_number, " ".join(cell for cell in cells if cell)))
+        for account in accounts:
+            invoices.append([account, vendor])
+    return invoices, rejected_rows
+
+
+def parse_pasted_text(text) -> tuple:
+    """
+    Returns the todo invoices in the pasted text, and the lines which gave no account number, see read_account_rows.
+    Each line is a row, its cells are separated by tabs, commas or semicolons.
+    """
+    return read_account_rows([[cell.strip() for cell in _CELL_SEPARATOR.split(line)] for line in text.splitlines()])
+
+
+def read_import_file(file_path) -> tuple:
+    """
+    Returns the todo invoices of a CSV or Excel file, e.g. the list sent by finance,
+    and the rows which gave no account number, see read_account_rows.
+    Only the first sheet of an Excel file is read.
+    """
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension in (".csv", ".txt"):
+        with open(file_path, "r", newline="", encoding="utf-8-sig") as f:
+            rows = list(csv.reader(f))
+    elif extension in (".xlsx", ".xlsm"):
+        try:
+            wb = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+        except (zipfile.BadZipFile, InvalidFileException):
+            raise ValueError("The file is not a valid Excel workbook")
+        try:
+            rows = list(wb.worksheets[0].iter_rows(values_only=True))
+        finally:
+            # A read-only workbook keeps the file open until it is closed
+            wb.close()
+    else:
+        raise ValueError(f"Unsupported file type '{extension}', please import a CSV or .xlsx file")
+    return read_account_rows([[_get_cell_text(cell) for cell in row] for row in rows])
+
+
+def describe_rejected_rows(rejected_rows) -> str:
+    """e.g. "2 rows have no account number: row 3 '12', row 5 'total'" """
+    shown = ", ".join(f"row {row_number} '{text}'" for row_number, text in rejected_rows[:MAX_REJECTED_ROWS_SHOWN])
+    if len(rejected_rows) > MAX_REJECTED_ROWS_SHOWN:
+        shown += ", ..."
+    return f"{len(rejected_rows)} rows have no account number: {shown}"
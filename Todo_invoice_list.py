@@ -0,0 +1,354 @@
+from PyQt5.QtCore import Qt, QAbstractListModel, QSortFilterProxyModel, QModelIndex, QRect, QSize, QEvent, pyqtSignal
+from PyQt5.QtGui import QColor, QPainter, QPen, QFont
+from PyQt5.QtWidgets import QApplication, QListView, QStyledItemDelegate, QStyle, QStyleOptionButton, QAbstractItemView
+
+from Outcome_journal import SUCCEED, FUNDING_REQUESTED, FAILED, SAVED, DONE
+from Search_index import SearchIndex
+
+# Data roles of a todo invoice row, the account number is the display role
+VENDOR_ROLE = Qt.UserRole + 1
+STATUS_ROLE = Qt.UserRole + 2
+HIGHLIGHT_ROLE = Qt.UserRole + 3
+
+# The text and color of each outcome shown on a row, see BatchWorker.invoiceFinished
+INVOICE_STATUSES = {
+    SUCCEED: ("Succeed", "#2E86C1"),
+    FUNDING_REQUESTED: ("Funding Requested", "#17A589"),
+    FAILED: ("Failed", "#D4AC0D"),
+    SAVED: ("Saved", "#7D3C98"),
+    DONE: ("Done", "#2E86C1"),
+    "": ("Left in To Do", "#AAB7B8"),
+}
+
+ROW_HEIGHT = 60
+
+
+class _InvoiceRow:
+    __slots__ = ("account", "vendor", "checkbox_state", "status")
+
+    def __init__(self, account, vendor, checkbox_state):
+        self.account = account
+        self.vendor = vendor
+        self.checkbox_state = checkbox_state
+        self.status = None  # the outcome of the running batch, None until the invoice is processed
+
+
+class TodoInvoiceListModel(QAbstractListModel):
+    """
+    The todo invoices shown in the middle section, one row per account number.
+    It only holds what View shows, the todo invoices themselves are kept by Model.
+    """
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.rows = []
+        # account number -> row, the row number is looked up with list.index, which stays fast for
+        # thousands of rows, while keeping row numbers in a dict costs a renumbering per removed row
+        self.rows_by_account = dict()
+        # The account numbers and vendors, so a search does not visit every row
+        self.search_index = SearchIndex()
+        self.search_text = ""
+        self.matching_accounts = None  # the accounts found by the search, None if there is no search
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row = self.rows[index.row()]
+        if role == Qt.DisplayRole:
+            return row.account
+        if role == Qt.CheckStateRole:
+            return Qt.Checked if row.checkbox_state else Qt.Unchecked
+        if role == VENDOR_ROLE:
+            return row.vendor
+        if role == STATUS_ROLE:
+            return row.status
+        if role == HIGHLIGHT_ROLE:
+            return self.matching_accounts is not None and row.account in self.matching_accounts
+        return None
+
+    def flags(self, index):
+        return Qt.ItemIsEnabled
+
+    def has_account(self, account) -> bool:
+        return account in self.rows_by_account
+
+    def get_accounts(self) -> list:
+        return [row.account for row in self.rows]
+
+    def get_index(self, account):
+        """Returns the index of the row of the account, None if it is not in the list"""
+        row = self.rows_by_account.get(account)
+        return None if row is None else self.index(self.rows.index(row))
+
+    def add_row(self, account, vendor="", checkbox_state=False):
+        if account in self.rows_by_account:
+            return
+        self.beginInsertRows(QModelIndex(), len(self.rows), len(self.rows))
+        row = _InvoiceRow(account, vendor, checkbox_state)
+        self.rows_by_account[account] = row
+        self.rows.append(row)
+        self._index_row(row)
+        self.endInsertRows()
+
+    def add_rows(self, rows):
+        """
+        Adds many rows with one insertion, so the view is laid out once.
+        :param rows: a list of (account number, vendor, checkbox state), the accounts already listed are skipped
+        """
+        new_rows = []
+        for account, vendor, checkbox_state in rows:
+            if account not in self.rows_by_account:
+                row = _InvoiceRow(account, vendor, checkbox_state)
+                self.rows_by_account[account] = row
+                new_rows.append(row)
+        if len(new_rows) == 0:
+            return
+        self.beginInsertRows(QModelIndex(), len(self.rows), len(self.rows) + len(new_rows) - 1)
+        self.rows.extend(new_rows)
+        for row in new_rows:
+            self._index_row(row)
+        self.endInsertRows()
+
+    def remove_row(self, account):
+        row = self.rows_by_account.pop(account, None)
+        if row is None:
+            return
+        row_number = self.rows.index(row)
+        self.beginRemoveRows(QModelIndex(), row_number, row_number)
+        del self.rows[row_number]
+        self.search_index.remove(account)
+        if self.matching_accounts is not None:
+            self.matching_accounts.discard(account)
+        self.endRemoveRows()
+
+    def clear(self):
+        self.beginResetModel()
+        self.rows = []
+        self.rows_by_account = dict()
+        self.search_index.clear()
+        if self.matching_accounts is not None:
+            self.matching_accounts = set()
+        self.endResetModel()
+
+    def set_row(self, account, vendor=None, checkbox_state=None, status=None):
+        """Changes the given values of one row, the others are kept"""
+        row = self.rows_by_account.get(account)
+        if row is None:
+            return
+        if vendor is not None and vendor != row.vendor:
+            row.vendor = vendor
+            self._index_row(row)
+        if checkbox_state is not None:
+            row.checkbox_state = checkbox_state
+        if status is not None:
+            row.status = status
+        index = self.index(self.rows.index(row))
+        self.dataChanged.emit(index, index)
+
+    def set_all_rows(self, vendor=None, checkbox_state=None):
+        """Changes the given values of every row, with one repaint"""
+        if len(self.rows) == 0:
+            return
+        for row in self.rows:
+            if vendor is not None and vendor != row.vendor:
+                row.vendor = vendor
+                self._index_row(row)
+            if checkbox_state is not None:
+                row.checkbox_state = checkbox_state
+        self.dataChanged.emit(self.index(0), self.index(len(self.rows) - 1))
+
+    def _index_row(self, row):
+        self.search_index.add(row.account, (row.account, row.vendor))
+        if self.matching_accounts is not None:
+            # Keeps the search up to date, e.g. when a vendor is dropped on a row while searching
+            if self.search_index.matches(row.account, self.search_text):
+                self.matching_accounts.add(row.account)
+            else:
+                self.matching_accounts.discard(row.account)
+
+    def set_search_text(self, search_text):
+        """Looks the text up in the index, see TodoInvoiceFilterModel for the rows shown"""
+        self.search_text = search_text
+        self.matching_accounts = None if search_text == "" else self.search_index.find(search_text)
+
+    def is_shown(self, row_number) -> bool:
+        return self.matching_accounts is None or self.rows[row_number].account in self.matching_accounts
+
+
+class TodoInvoiceFilterModel(QSortFilterProxyModel):
+    """
+    Shows only the todo invoices found by the search of TodoInvoiceListModel.
+    A row added or changed while searching is filtered as soon as it changes.
+    """
+    def set_search_text(self, search_text):
+        self.sourceModel().set_search_text(search_text)
+        self.invalidateFilter()
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        return self.sourceModel().is_shown(source_row)
+
+
+class TodoInvoiceDelegate(QStyledItemDelegate):
+    """
+    Draws a todo invoice row: checkbox, account number, vendor drop area, status and delete button.
+    The rows are painted rather than built from widgets, so only the rows on screen cost anything.
+    """
+    checkboxClicked = pyqtSignal(str, bool)
+    deleteClicked = pyqtSignal(str)
+
+    def __init__(self, list_view):
+        super().__init__(list_view)
+        self.list_view = list_view
+
+    def sizeHint(self, option, index):
+        return QSize(option.rect.width(), ROW_HEIGHT)
+
+    @staticmethod
+    def get_rects(rect, has_status) -> dict:
+        """The rectangles of the parts of a row, laid out like the former TextBar widget"""
+        inner = rect.adjusted(10, 5, -10, -5)
+        center_y = inner.center().y()
+        rects = {"checkbox": QRect(inner.left(), center_y - 8, 16, 16),
+                 "delete": QRect(inner.right() - 29, center_y - 15, 30, 30)}
+        right = rects["delete"].left() - 10
+        if has_status:
+            rects["status"] = QRect(right - 129, inner.top() + 8, 130, inner.height() - 16)
+            right = rects["status"].left() - 10
+        rects["vendor"] = QRect(right - 149, inner.top(), 150, inner.height())
+        left = rects["checkbox"].right() + 11
+        rects["account"] = QRect(left, inner.top(), rects["vendor"].left() - 10 - left, inner.height())
+        return rects
+
+    def paint(self, painter, option, index):
+        account = index.data(Qt.DisplayRole)
+        vendor = index.data(VENDOR_ROLE)
+        status = index.data(STATUS_ROLE)
+        rects = self.get_rects(option.rect, status is not None)
+
+        painter.save()
+        painter.setRenderHint(QPainter.Antialiasing)
+
+        # Row background
+        painter.setPen(QPen(QColor("#CCCCCC"), 1))
+        painter.setBrush(QColor("#FFFFFF"))
+        painter.drawRoundedRect(option.rect.adjusted(0, 0, -1, -1), 8, 8)
+
+        # Checkbox
+        checkbox_option = QStyleOptionButton()
+        checkbox_option.rect = rects["checkbox"]
+        checkbox_option.state = (QStyle.State_Enabled if self.list_view.is_editable else QStyle.State_None) | \
+            (QStyle.State_On if index.data(Qt.CheckStateRole) == Qt.Checked else QStyle.State_Off)
+        style = option.widget.style() if option.widget is not None else QApplication.style()
+        style.drawControl(QStyle.CE_CheckBox, checkbox_option, painter, option.widget)
+
+        # Account number, highlighted when it matches the search
+        painter.setFont(QFont("Arial", 10))
+        if index.data(HIGHLIGHT_ROLE):
+            painter.setPen(QPen(QColor("#F1C40F"), 2))
+            painter.setBrush(QColor("#FFF3B0"))
+        else:
+            painter.setPen(QPen(QColor("#E5E7E9"), 1))
+            painter.setBrush(QColor("#F8F9F9"))
+        painter.drawRoundedRect(rects["account"], 4, 4)
+        painter.setPen(QColor("#000000"))
+        painter.drawText(rects["account"].adjusted(6, 0, -6, 0), Qt.AlignVCenter | Qt.AlignLeft, account)
+
+        # Vendor drop area
+        painter.setPen(QPen(QColor("#B2BABB"), 2, Qt.DashLine))
+        painter.setBrush(QColor("#E5E8E8" if index.row() == self.list_view.drop_row else "#F0F3F4"))
+        painter.drawRoundedRect(rects["vendor"].adjusted(1, 1, -1, -1), 6, 6)
+        painter.setPen(QColor("#000000"))
+        painter.drawText(rects["vendor"], Qt.AlignCenter, vendor if vendor else "Drop here")
+
+        # Outcome of the running batch
+        if status is not None:
+            text, color = INVOICE_STATUSES.get(status, INVOICE_STATUSES[""])
+            painter.setPen(Qt.NoPen)
+            painter.setBrush(QColor(color))
+            painter.drawRoundedRect(rects["status"], 4, 4)
+            painter.setPen(QColor("#FFFFFF"))
+            painter.setFont(QFont("Arial", 9, QFont.Bold))
+            painter.drawText(rects["status"], Qt.AlignCenter, text)
+
+        # Delete button
+        painter.setPen(Qt.NoPen)
+        painter.setBrush(QColor("#F1948A" if self.list_view.is_editable else "#D5D8DC"))
+        painter.drawEllipse(rects["delete"])
+        painter.setPen(QColor("#FFFFFF"))
+        painter.setFont(QFont("Arial", 14, QFont.Bold))
+        painter.drawText(rects["delete"], Qt.AlignCenter, "×")
+
+        painter.restore()
+
+    def editorEvent(self, event, model, option, index):
+        if event.type() != QEvent.MouseButtonRelease or event.button() != Qt.LeftButton:
+            return False
+        if not self.list_view.is_editable:
+            return False
+        rects = self.get_rects(option.rect, index.data(STATUS_ROLE) is not None)
+        account = index.data(Qt.DisplayRole)
+        if rects["checkbox"].adjusted(-5, -5, 5, 5).contains(event.pos()):
+            self.checkboxClicked.emit(account, index.data(Qt.CheckStateRole) != Qt.Checked)
+            return True
+        if rects["delete"].contains(event.pos()):
+            self.deleteClicked.emit(account)
+            return True
+        return False
+
+
+class TodoInvoiceListView(QListView):
+    """The list of todo invoices, a vendor name dropped on a row is assigned to its invoice"""
+    vendorDropped = pyqtSignal(str, str)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.drop_row = -1  # the row under a vendor being dragged
+        self.is_editable = True  # False while a batch is running, see set_editable
+        self.setUniformItemSizes(True)
+        self.setSpacing(5)
+        self.setSelectionMode(QAbstractItemView.NoSelection)
+        self.setVerticalScrollMode(QAbstractItemView.ScrollPerPixel)
+        self.setFocusPolicy(Qt.NoFocus)
+        self.setAcceptDrops(True)
+        self.setDragDropMode(QAbstractItemView.DropOnly)
+        self.setStyleSheet("""
+            QListView {
+                border: none;
+                background-color: transparent;
+            }
+        """)
+
+    def set_editable(self, is_editable):
+        """Locks the checkboxes, delete buttons and vendor drops, the list can still be scrolled and searched"""
+        self.is_editable = is_editable
+        self.setAcceptDrops(is_editable)
+        self.viewport().update()
+
+    def set_drop_row(self, row):
+        if row != self.drop_row:
+            self.drop_row = row
+            self.viewport().update()
+
+    def dragEnterEvent(self, event):
+        if event.mimeData().hasText():
+            event.acceptProposedAction()
+
+    def dragMoveEvent(self, event):
+        index = self.indexAt(event.pos())
+        self.set_drop_row(index.row() if index.isValid() else -1)
+        if index.isValid() and event.mimeData().hasText():
+            event.acceptProposedAction()
+        else:
+            event.ignore()
+
+    def dragLeaveEvent(self, event):
+        self.set_drop_row(-1)
+
+    def dropEvent(self, event):
+        index = self.indexAt(event.pos())
+        self.set_drop_row(-1)
+        if index.isValid() and event.mimeData().hasText():
+            event.acceptProposedAction()
+            self.vendorDropped.emit(index.data(Qt.DisplayRole), event.mimeData().text())
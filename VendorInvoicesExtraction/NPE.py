@@ -1,9 +1,26 @@
-import pdfplumber
 import re
-import fitz
 
 from OCR_helper import convert_date
-from scan_helper import get_month_year, convert_to_float, format_date_str, switch_date_and_month
+from PDF_helper import parse_pdf_with_fallback
+from scan_helper import get_month_year, convert_to_float, format_date_str, switch_date_and_month, search_fields
+
+
+# Field patterns of the bill, compiled once and searched at most once per bill by search_fields
+FIELD_PATTERNS = {
+    "account_number": re.compile(r"MESSAGES:\s*\n?(\d{3,9}-?\d{0,2})", re.IGNORECASE),
+    "statement_date": re.compile(r'REGULAR\n[^\n]*\n(\d{2}/\d{2}/\d{4})', re.IGNORECASE),
+    "amount_due": re.compile(r'TOTAL\s*AMOUNT\s*DUE\s*\$?(\d{1,3}(?:,\d{3})*\.\d{1,2})', re.IGNORECASE),
+    "ontario_electricity_rebate": re.compile(r'Ontario\s*Electricity\s*Rebate\s*\$?(-?\d{1,3}(?:,\d{3})*\.\d{1,2})', re.IGNORECASE),
+    "late_payment_charge": re.compile(r"Late\s*Payment\s*Charge\s*(\d{1,3}(?:,\d{3})*\.\d{1,2})", re.IGNORECASE),
+    "interest_charge": re.compile(r"Interest\s*Charge\s*(\d{1,3}(?:,\d{3})*\.\d{1,2})", re.IGNORECASE),
+    "electric_charges_subtotal": re.compile(r'Electric\s*Charges\s*Sub-total:?\s*\$?(\d{1,3}(?:,\d{3})*\.\d{1,2})', re.IGNORECASE),
+    "hst": re.compile(r'HST\s*\(#R871969127\)\s*(\d{1,3}(?:,\d{3})*\.\d{1,2})', re.IGNORECASE),
+    "balance_forward": re.compile(r'BALANCE\s*FORWARD\s*(-?\$?\d{1,3}(?:,\d{3})*\.\d{1,2})', re.IGNORECASE),
+    "period": re.compile(r"ELE:\s*\d{8,12}\s*(\d{2}/\d{2}/\d{4})\n(\d{2}/\d{2}/\d{4})", re.IGNORECASE),
+}
+
+# Pages tried before the whole bill, the rest is only read when a field is missing or the amounts do not add up
+PAGE_HINTS = (1,)
 
 
 def parse_NPE_bill(pdf_path):
@@ -21,6 +38,11 @@ def parse_NPE_bill(pdf_path):
     - Period Start Date
     - Period End Date
     """
+    return parse_pdf_with_fallback(pdf_path, extract_NPE_fields, backends=("fitz",), page_hints=PAGE_HINTS)
+
+
+def extract_NPE_fields(text):
+    """Extract the key fields from the text of a NPE bill, see parse_NPE_bill"""
     # Initialize a dictionary to store extracted data
     extracted_data = {
         "account_number": None,
@@ -37,14 +59,11 @@ def parse_NPE_bill(pdf_path):
         "suggested_file_name" : None
     }
 
-    text = ""
-    doc = fitz.open(pdf_path)
-    for page in doc:
-        text += page.get_text()
+    matches = search_fields(text, FIELD_PATTERNS)
 
     # 1) Account Number
     # Example snippet: "MESSAGES:
-    match = re.search(r"MESSAGES:\s*\n?(\d{3,9}-?\d{0,2})", text, re.IGNORECASE)
+    match = matches["account_number"]
     if match:
         extracted_data["account_number"] = match.group(1).upper()
 
@@ -52,37 +71,37 @@ def parse_NPE_bill(pdf_path):
     # Example snippet: "REGULAR
     # INTERVAL >50KW
     # 02/21/2025"
-    match = re.search(r'REGULAR\n[^\n]*\n(\d{2}/\d{2}/\d{4})', text, re.IGNORECASE)
+    match = matches["statement_date"]
     if match:
         extracted_data["statement_date"] = match.group(1).upper().replace(",", "").replace(".", "")
 
     # 3) Amount Due
     # Example snippet: "Total Amount Due: $168.60"
-    match = re.search(r'TOTAL\s*AMOUNT\s*DUE\s*\$?(\d{1,3}(?:,\d{3})*\.\d{1,2})', text, re.IGNORECASE)
+    match = matches["amount_due"]
     if match:
         extracted_data["amount_due"] = convert_to_float(match.group(1).replace(",", ""))
 
     # 4) Ontario Electricity Rebate
     # Example snippet: "Ontario Electricity Rebate -13.67"
-    match = re.search(r'Ontario\s*Electricity\s*Rebate\s*\$?(-?\d{1,3}(?:,\d{3})*\.\d{1,2})', text, re.IGNORECASE)
+    match = matches["ontario_electricity_rebate"]
     if match:
         extracted_data["ontario_electricity_rebate"] = convert_to_float(match.group(1).replace(",", ""))
 
     # 9) Late Payment Charge
     # Example snippet: "Late Payment Charge 2.84"
-    match = re.search(r"Late\s*Payment\s*Charge\s*(\d{1,3}(?:,\d{3})*\.\d{1,2})", text, re.IGNORECASE)
+    match = matches["late_payment_charge"]
     if match:
         extracted_data["Late Payment Charge"] = convert_to_float(match.group(1))
     # Example snippet: "Interest Charge 2.84"
-    match = re.search(r"Interest\s*Charge\s*(\d{1,3}(?:,\d{3})*\.\d{1,2})", text, re.IGNORECASE)
+    match = matches["interest_charge"]
     if match:
         extracted_data["Late Payment Charge"] += convert_to_float(match.group(1))
 
     # 5) Total Electricity Charges
-    subtotal_text = re.search(r'Electric\s*Charges\s*Sub-total:?\s*\$?(\d{1,3}(?:,\d{3})*\.\d{1,2})', text, re.IGNORECASE)
+    subtotal_text = matches["electric_charges_subtotal"]
     if subtotal_text:
         subtotal_text = subtotal_text.group(1)
-    hst_text = re.search(r'HST\s*\(#R871969127\)\s*(\d{1,3}(?:,\d{3})*\.\d{1,2})', text, re.IGNORECASE)
+    hst_text = matches["hst"]
     if subtotal_text and hst_text:
         extracted_data["total_electricity_charges"] = round((convert_to_float(subtotal_text.replace(',', '')) -
                                                              convert_to_float(hst_text.group(1)) - extracted_data["Late Payment Charge"]), 2)
@@ -92,20 +111,20 @@ def parse_NPE_bill(pdf_path):
 
     # 7) Balance Forward
     # Example snippet: "Balance forward $0.00"
-    match = re.search(r'BALANCE\s*FORWARD\s*(-?\$?\d{1,3}(?:,\d{3})*\.\d{1,2})', text, re.IGNORECASE)
+    match = matches["balance_forward"]
     if match:
         extracted_data["balance_forward"] = convert_to_float(match.group(1).replace(",", "").replace("$", ""))
 
     # 8) Period
     # Example snippet: "ELE: 0000064543 02/01/2025
     # 01/01/2025"
-    match = re.search(r"ELE:\s*\d{8,12}\s*(\d{2}/\d{2}/\d{4})\n(\d{2}/\d{2}/\d{4})", text, re.IGNORECASE)
+    match = matches["period"]
     if match:
         extracted_data["period_start_date"] = match.group(2).upper().replace(",", "")
         extracted_data["period_end_date"] = match.group(1).upper().replace(",", "")
 
     # 10) Invoice subtotal = amount_due - h.s.t.
-    match = re.search(r'HST\s*\(#R871969127\)\s*(\d{1,3}(?:,\d{3})*\.\d{1,2})', text, re.IGNORECASE)
+    match = matches["hst"]
     if match and extracted_data["amount_due"]:
         hst = convert_to_float(match.group(1))
         extracted_data["invoice_subtotal"] = round(convert_to_float(extracted_data["amount_due"]) - hst, 2)
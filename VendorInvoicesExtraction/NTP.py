@@ -1,9 +1,27 @@
-import pdfplumber
 import re
-import fitz
 
 from OCR_helper import convert_date
-from scan_helper import get_month_year, convert_to_float, format_date_str, switch_date_and_month
+from PDF_helper import parse_pdf_with_fallback
+from scan_helper import get_month_year, convert_to_float, format_date_str, switch_date_and_month, search_fields
+
+
+# Field patterns of the bill, compiled once and searched at most once per bill by search_fields
+FIELD_PATTERNS = {
+    "account_number": re.compile(r"Account\s*Type:\s*(\d{3,10}-?\d{0,6})", re.IGNORECASE),
+    "statement_date": re.compile(r'([A-Za-z]{3} \d{2}, \d{4})\s*[A-Za-z]{3} \d{2}, \d{4} - [A-Za-z]{3} \d{2}, \d{4}', re.IGNORECASE),
+    "amount_due": re.compile(r'Total\s*Amount\s*Due\s*\$?(\d{1,3}(?:,\d{3})*\.\d{1,2})', re.IGNORECASE),
+    "ontario_electricity_rebate": re.compile(r'ONTARIO\s*ELECTRICITY\s*REBATE\s*\(\$?(\d{1,3}(?:,\d{3})*\.\d{1,2})\)', re.IGNORECASE),
+    "other_charges": re.compile(r"OTHER\s*CHARGES\s*\$?(\d{1,3}(?:,\d{3})*\.\d{1,2})", re.IGNORECASE),
+    "electricity": re.compile(r'ELECTRICITY\s*\$(\d{1,3}(?:,\d{3})*\.\d{1,2})', re.IGNORECASE),
+    "delivery": re.compile(r'DELIVERY\s*\$(\d{1,3}(?:,\d{3})*\.\d{1,2})', re.IGNORECASE),
+    "regulatory_charges": re.compile(r'REGULATORY\s*CHARGES\s*\$(\d{1,3}(?:,\d{3})*\.\d{1,2})', re.IGNORECASE),
+    "balance_forward": re.compile(r'Balance\s*Forward\s*(-?\$?\d{1,3}(?:,\d{3})*\.\d{1,2})', re.IGNORECASE),
+    "period": re.compile(r"[A-Za-z]{3} \d{2}, \d{4}\s*([A-Za-z]{3} \d{2}, \d{4}) - ([A-Za-z]{3} \d{2}, \d{4})", re.IGNORECASE),
+    "hst": re.compile(r'HST\s*ON\s*ELECTRIC\s*\(HST\s*#\s*869077925RT0001\)\s*\$?(\d{1,3}(?:,\d{3})*\.\d{1,2})', re.IGNORECASE),
+}
+
+# Pages tried before the whole bill, the rest is only read when a field is missing or the amounts do not add up
+PAGE_HINTS = (1,)
 
 
 def parse_NTP_bill(pdf_path):
@@ -21,6 +39,11 @@ def parse_NTP_bill(pdf_path):
     - Period Start Date
     - Period End Date
     """
+    return parse_pdf_with_fallback(pdf_path, extract_NTP_fields, backends=("fitz",), page_hints=PAGE_HINTS)
+
+
+def extract_NTP_fields(text):
+    """Extract the key fields from the text of a NTP bill, see parse_NTP_bill"""
     # Initialize a dictionary to store extracted data
     extracted_data = {
         "account_number": None,
@@ -37,48 +60,45 @@ def parse_NTP_bill(pdf_path):
         "suggested_file_name" : None
     }
 
-    text = ""
-    doc = fitz.open(pdf_path)
-    for page in doc:
-        text += page.get_text()
+    matches = search_fields(text, FIELD_PATTERNS)
 
     # 1) Account Number
-    match = re.search(r"Account\s*Type:\s*(\d{3,10}-?\d{0,6})", text, re.IGNORECASE)
+    match = matches["account_number"]
     if match:
         extracted_data["account_number"] = match.group(1).upper()
 
     # 2) Statement Date$228.94
-    match = re.search(r'([A-Za-z]{3} \d{2}, \d{4})\s*[A-Za-z]{3} \d{2}, \d{4} - [A-Za-z]{3} \d{2}, \d{4}', text, re.IGNORECASE)
+    match = matches["statement_date"]
     if match:
         extracted_data["statement_date"] = match.group(1).upper().replace(",", "").replace(".", "")
 
     # 3) Amount Due
     # Example snippet: "Total Amount Due $168.60"
-    match = re.search(r'Total\s*Amount\s*Due\s*\$?(\d{1,3}(?:,\d{3})*\.\d{1,2})', text, re.IGNORECASE)
+    match = matches["amount_due"]
     if match:
         extracted_data["amount_due"] = convert_to_float(match.group(1).replace(",", ""))
 
     # 4) Ontario Electricity Rebate
     # Example snippet: "ONTARIO ELECTRICITY REBATE ($14.93)"
-    match = re.search(r'ONTARIO\s*ELECTRICITY\s*REBATE\s*\(\$?(\d{1,3}(?:,\d{3})*\.\d{1,2})\)', text, re.IGNORECASE)
+    match = matches["ontario_electricity_rebate"]
     if match:
         extracted_data["ontario_electricity_rebate"] = convert_to_float(match.group(1).replace(",", "")) * -1
 
     # 9) Late Payment Charge
     # Example snippet: "OTHER CHARGES 2.84"
-    match = re.search(r"OTHER\s*CHARGES\s*\$?(\d{1,3}(?:,\d{3})*\.\d{1,2})", text, re.IGNORECASE)
+    match = matches["other_charges"]
     if match:
         extracted_data["Late Payment Charge"] = convert_to_float(match.group(1))
 
     # 5) Total Electricity Charges
     subtotal_text = 0
-    subtotal_raw_text = re.search(r'ELECTRICITY\s*\$(\d{1,3}(?:,\d{3})*\.\d{1,2})', text, re.IGNORECASE)
+    subtotal_raw_text = matches["electricity"]
     if subtotal_raw_text:
         subtotal_text += convert_to_float(subtotal_raw_text.group(1).replace(',', ''))
-    subtotal_raw_text = re.search(r'DELIVERY\s*\$(\d{1,3}(?:,\d{3})*\.\d{1,2})', text, re.IGNORECASE)
+    subtotal_raw_text = matches["delivery"]
     if subtotal_raw_text:
         subtotal_text += convert_to_float(subtotal_raw_text.group(1).replace(',', ''))
-    subtotal_raw_text = re.search(r'REGULATORY\s*CHARGES\s*\$(\d{1,3}(?:,\d{3})*\.\d{1,2})', text, re.IGNORECASE)
+    subtotal_raw_text = matches["regulatory_charges"]
     if subtotal_raw_text:
         subtotal_text += convert_to_float(subtotal_raw_text.group(1).replace(',', ''))
     extracted_data["total_electricity_charges"] = round(subtotal_text, 2)
@@ -88,18 +108,18 @@ def parse_NTP_bill(pdf_path):
 
     # 7) Balance Forward
     # Example snippet: "Balance forward $0.00"
-    match = re.search(r'Balance\s*Forward\s*(-?\$?\d{1,3}(?:,\d{3})*\.\d{1,2})', text, re.IGNORECASE)
+    match = matches["balance_forward"]
     if match:
         extracted_data["balance_forward"] = convert_to_float(match.group(1).replace(",", "").replace("$", ""))
 
     # 8) Period
-    match = re.search(r"[A-Za-z]{3} \d{2}, \d{4}\s*([A-Za-z]{3} \d{2}, \d{4}) - ([A-Za-z]{3} \d{2}, \d{4})", text, re.IGNORECASE)
+    match = matches["period"]
     if match:
         extracted_data["period_start_date"] = match.group(1).upper().replace(",", "")
         extracted_data["period_end_date"] = match.group(2).upper().replace(",", "")
 
     # 10) Invoice subtotal = amount_due - h.s.t.
-    match = re.search(r'HST\s*ON\s*ELECTRIC\s*\(HST\s*#\s*869077925RT0001\)\s*\$?(\d{1,3}(?:,\d{3})*\.\d{1,2})', text, re.IGNORECASE)
+    match = matches["hst"]
     if match and extracted_data["amount_due"]:
         hst = convert_to_float(match.group(1))
         extracted_data["invoice_subtotal"] = round(convert_to_float(extracted_data["amount_due"]) - hst, 2)
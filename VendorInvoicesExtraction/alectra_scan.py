@@ -1,6 +1,23 @@
-import pdfplumber
 import re
-from scan_helper import get_month_year, convert_to_float, format_date_str, switch_date_and_month, convert_date_from_full
+from PDF_helper import parse_pdf_with_fallback
+from scan_helper import get_month_year, convert_to_float, format_date_str, switch_date_and_month, convert_date_from_full, search_fields
+
+
+# Field patterns of the bill, compiled once and searched at most once per bill by search_fields
+FIELD_PATTERNS = {
+    "account_number": re.compile(r'Account\s*Number:*\s*(\d{9,13})', re.IGNORECASE),
+    "statement_date": re.compile(r'Statement\s*Date\s*([A-Za-z]{3,10}\s*\d{1,2},\s*\d{4})', re.IGNORECASE),
+    "amount_due": re.compile(r'Amount\s*Due\s*\$?(\d{1,3}(?:,\d{3})*\.\d{1,2})', re.IGNORECASE),
+    "total_electricity_charges": re.compile(r'Your\s*Total\s*Electricity\s*Charges\s*\$?(\d{1,3}(?:,\d{3})*\.\d{1,2})', re.IGNORECASE),
+    "ontario_electricity_rebate": re.compile(r'Ontario\s*Electricity\s*Rebate\s*\$(\d{1,3}(?:,\d{3})*\.\d{1,2})', re.IGNORECASE),
+    "balance_forward": re.compile(r'Balance\s*Forward\s*[a-zA-Z-\s]{0,30}\$(\d{1,3}(?:,\d{3})*\.\d{1,2})(\s*CR)?', re.IGNORECASE),
+    "period": re.compile(r'(\d{2}/\d{2}/\d{4})\s*(\d{2}/\d{2}/\d{4})', re.IGNORECASE),
+    "penalty_adjustment": re.compile(r'Penalty\s*Adjustment\s*\$(\d{1,3}(?:,\d{3})*\.\d{1,2})', re.IGNORECASE),
+    "hst": re.compile(r'H\.S\.T\.\s*\(H\.S\.T\.\s*Registration\s*728604299\)\s*\$(\d{1,3}(?:,\d{3})*\.\d{1,2})', re.IGNORECASE),
+}
+
+# Pages tried before the whole bill, the rest is only read when a field is missing or the amounts do not add up
+PAGE_HINTS = (1,)
 
 
 def parse_alectra_bill(pdf_path):
@@ -18,6 +35,11 @@ def parse_alectra_bill(pdf_path):
     - Period Start Date
     - Period End Date
     """
+    return parse_pdf_with_fallback(pdf_path, extract_alectra_fields, page_hints=PAGE_HINTS)
+
+
+def extract_alectra_fields(text):
+    """Extract the key fields from the text of a Alectra bill, see parse_alectra_bill"""
     # Initialize a dictionary to store extracted data
     extracted_data = {
         "account_number": None,
@@ -35,32 +57,29 @@ def parse_alectra_bill(pdf_path):
     }
 
 
-    with pdfplumber.open(pdf_path) as pdf:
-        text = ""
-        for page in pdf.pages:
-            text += page.extract_text() + "\n"
+    matches = search_fields(text, FIELD_PATTERNS)
 
     # 1) Account Number
     # Example snippet: "Account Number: 4062320000"
-    match = re.search(r'Account\s*Number:*\s*(\d{9,13})', text, re.IGNORECASE)
+    match = matches["account_number"]
     if match:
         extracted_data["account_number"] = match.group(1).upper()
 
     # 2) Statement Date
     # Example snippet: "Statement Date January 29, 2025"
-    match = re.search(r'Statement\s*Date\s*([A-Za-z]{3,10}\s*\d{1,2},\s*\d{4})', text, re.IGNORECASE)
+    match = matches["statement_date"]
     if match:
         extracted_data["statement_date"] = match.group(1).upper()
 
     # 3) Amount Due
     # Example snippet: "Amount Due $168.60"
-    match = re.search(r'Amount\s*Due\s*\$?(\d{1,3}(?:,\d{3})*\.\d{1,2})', text, re.IGNORECASE)
+    match = matches["amount_due"]
     if match:
         extracted_data["amount_due"] = convert_to_float(match.group(1))
 
     # 4) Your Total Electricity Charges
     # Example snippet: "Your Total Electricity Charges 82.72"
-    match = re.search(r'Your\s*Total\s*Electricity\s*Charges\s*\$?(\d{1,3}(?:,\d{3})*\.\d{1,2})', text, re.IGNORECASE)
+    match = matches["total_electricity_charges"]
     if match:
         extracted_data["total_electricity_charges"] = convert_to_float(match.group(1))
 
@@ -69,14 +88,14 @@ def parse_alectra_bill(pdf_path):
 
     # 6) Ontario Electricity Rebate
     # Example snippet: "Ontario Electricity Rebate $16.01"
-    match = re.search(r'Ontario\s*Electricity\s*Rebate\s*\$(\d{1,3}(?:,\d{3})*\.\d{1,2})', text, re.IGNORECASE)
+    match = matches["ontario_electricity_rebate"]
     if match:
         extracted_data["ontario_electricity_rebate"] = convert_to_float(match.group(1)) * -1
 
     # 7) Balance Forward
     # Example snippet 1: "Balance Forward $85.97"
     # Example snippet 2: "Balance Forward - IF LATE PAY IMMEDIATELY $688.99"
-    match = re.search(r'Balance\s*Forward\s*[a-zA-Z-\s]{0,30}\$(\d{1,3}(?:,\d{3})*\.\d{1,2})(\s*CR)?', text, re.IGNORECASE)
+    match = matches["balance_forward"]
     if match:
         # The numeric part (e.g. '19,299.99')
         amount_str = match.group(1)
@@ -92,20 +111,20 @@ def parse_alectra_bill(pdf_path):
 
     # 8) Period
     # Example snippet: "12/23/2024 01/23/2025"
-    match = re.search(r'(\d{2}/\d{2}/\d{4})\s*(\d{2}/\d{2}/\d{4})', text, re.IGNORECASE)
+    match = matches["period"]
     if match:
         extracted_data["period_start_date"] = match.group(1)
         extracted_data["period_end_date"] = match.group(2)
 
     # 9) Late payment charge
     # Example snippet: "Penalty Adjustment $0.64"
-    match = re.search(r'Penalty\s*Adjustment\s*\$(\d{1,3}(?:,\d{3})*\.\d{1,2})', text, re.IGNORECASE)
+    match = matches["penalty_adjustment"]
     if match:
         extracted_data["Late Payment Charge"] = float(match.group(1))
 
     # 10) Invoice subtotal = amount_due - h.s.t.
     # Example snippet : "H.S.T. (H.S.T. Registration 728604299) $15.88"
-    match = re.search(r'H\.S\.T\.\s*\(H\.S\.T\.\s*Registration\s*728604299\)\s*\$(\d{1,3}(?:,\d{3})*\.\d{1,2})', text, re.IGNORECASE)
+    match = matches["hst"]
     if match:
         hst = convert_to_float(match.group(1))
         extracted_data["invoice_subtotal"] = round(convert_to_float(extracted_data["amount_due"]) - hst, 2)
@@ -1,8 +1,28 @@
-import pdfplumber
 import re
 
 from OCR_helper import convert_date
-from scan_helper import get_month_year, convert_to_float
+from PDF_helper import parse_pdf_with_fallback
+from scan_helper import get_month_year, convert_to_float, search_fields
+
+
+# Field patterns of the bill, compiled once and searched at most once per bill by search_fields
+FIELD_PATTERNS = {
+    "account_number": re.compile(r"Account\s*Number:\s*(\d{6}-\d{7})", re.IGNORECASE),
+    "statement_date": re.compile(r'Statement\s*Date:\s*([A-Za-z]{3}\s*\d{1,2},\s*\d{4})', re.IGNORECASE),
+    "amount_due": re.compile(r'TOTAL\s*AMOUNT\s*DUE\s*[A-Za-z]{3}\s*\d{1,2},\s*\d{4}\s*\$(\d{1,3}(?:,\d{3})*(?:\.\d{2})?)', re.IGNORECASE),
+    "ontario_electricity_rebate": re.compile(r'Ontario\s*Electricity\s*Rebate\s*(\d{1,3}(?:,\d{3})*\.\d{1,2})', re.IGNORECASE),
+    "monthly_deposit_interest": re.compile(r'Monthly\s*Deposit\s*Interest\s*(\d{1,3}(?:,\d{3})*\.\d{1,2})', re.IGNORECASE),
+    "total_electricity_charges": re.compile(r'Total\s*Electricity\s*Charges\s*\$?(\d{1,3}(?:,\d{3})*\.\d{1,2})', re.IGNORECASE),
+    "hst": re.compile(r'H\.S\.T\.\s*REG\.#\s*86829\s*1980\s*(\d{1,3}(?:,\d{3})*\.\d{1,2})', re.IGNORECASE),
+    "last_statement_amount": re.compile(r'Last\s*Statement\s*Amount\s*\$(\d{1,3}(?:,\d{3})*\.\d{1,2})(\s*CR)?', re.IGNORECASE),
+    "payments_since_last_statement": re.compile(r'Payments\s*since\s*last\s*statement,\s*Thank\s*you\s*\$(\d{1,3}(?:,\d{3})*\.\d{1,2})(\s*CR)?', re.IGNORECASE),
+    "customer_transfer_discount": re.compile(r'Customer\s*Transfer\s*Discount\s*\$(\d{1,3}(?:,\d{3})*\.\d{1,2})(\s*CR)?', re.IGNORECASE),
+    "late_penalties": re.compile(r'TOTAL\s*LATE\s*PENALTIES\s*APPLIED\s*\$?(\d{1,3}(?:,\d{3})*\.\d{1,2})', re.IGNORECASE),
+    "period": re.compile(r'([A-Za-z]{3}\s*\d{1,2},\s*\d{4})\s*TO\s*([A-Za-z]{3}\s*\d{1,2},\s*\d{4})', re.IGNORECASE),
+}
+
+# Pages tried before the whole bill, the rest is only read when a field is missing or the amounts do not add up
+PAGE_HINTS = (1,)
 
 
 def parse_burlington_hydro_bill(pdf_path):
@@ -20,6 +40,11 @@ def parse_burlington_hydro_bill(pdf_path):
     - Period Start Date
     - Period End Date
     """
+    return parse_pdf_with_fallback(pdf_path, extract_burlington_hydro_fields, page_hints=PAGE_HINTS)
+
+
+def extract_burlington_hydro_fields(text):
+    """Extract the key fields from the text of a Burlington Hydro bill, see parse_burlington_hydro_bill"""
     # Initialize a dictionary to store extracted data
     extracted_data = {
         "account_number": None,
@@ -36,37 +61,34 @@ def parse_burlington_hydro_bill(pdf_path):
         "suggested_file_name" : None
     }
 
-    with pdfplumber.open(pdf_path) as pdf:
-        text = ""
-        for page in pdf.pages:
-            text += page.extract_text() + "\n"
+    matches = search_fields(text, FIELD_PATTERNS)
 
     # 1) Account Number
     # Example snippet: "Account Number: 106703-0001284"
-    match = re.search(r"Account\s*Number:\s*(\d{6}-\d{7})", text, re.IGNORECASE)
+    match = matches["account_number"]
     if match:
         extracted_data["account_number"] = match.group(1).upper()
 
 
     # 2) Statement Date
     # Example snippet: "Statement Date Dec 11 2024"
-    match = re.search(r'Statement\s*Date:\s*([A-Za-z]{3}\s*\d{1,2},\s*\d{4})', text, re.IGNORECASE)
+    match = matches["statement_date"]
     if match:
         extracted_data["statement_date"] = match.group(1).upper().replace(",", "")
 
     # 3) Amount Due
     # Example snippet: "Amount Due $168.60"
-    match = re.search(r'TOTAL\s*AMOUNT\s*DUE\s*[A-Za-z]{3}\s*\d{1,2},\s*\d{4}\s*\$(\d{1,3}(?:,\d{3})*(?:\.\d{2})?)', text, re.IGNORECASE)
+    match = matches["amount_due"]
     if match:
         extracted_data["amount_due"] = match.group(1)
 
     # 5) Ontario Electricity Rebate
     # Example snippet: "Ontario Electricity Rebate 10.84 CR" OR "Monthly Deposit Interest 33.38CR"
     # The actual amount might come before "CR", so we can capture the numeric portion.
-    match = re.search(r'Ontario\s*Electricity\s*Rebate\s*(\d{1,3}(?:,\d{3})*\.\d{1,2})', text, re.IGNORECASE)
+    match = matches["ontario_electricity_rebate"]
     if match:
         extracted_data["ontario_electricity_rebate"] = convert_to_float(match.group(1)) * -1
-    match = re.search(r'Monthly\s*Deposit\s*Interest\s*(\d{1,3}(?:,\d{3})*\.\d{1,2})', text, re.IGNORECASE)
+    match = matches["monthly_deposit_interest"]
     if match:
         if extracted_data["ontario_electricity_rebate"]:
             extracted_data["ontario_electricity_rebate"] += convert_to_float(match.group(1)) * -1
@@ -76,8 +98,8 @@ def parse_burlington_hydro_bill(pdf_path):
 
     # 4) Total Electricity Charges
     # Example snippet: "Total Electricity Charges $82.72"
-    match = re.search(r'Total\s*Electricity\s*Charges\s*\$?(\d{1,3}(?:,\d{3})*\.\d{1,2})', text, re.IGNORECASE)
-    hst_text = re.search(r'H\.S\.T\.\s*REG\.#\s*86829\s*1980\s*(\d{1,3}(?:,\d{3})*\.\d{1,2})', text, re.IGNORECASE)
+    match = matches["total_electricity_charges"]
+    hst_text = matches["hst"]
     if match:
         extracted_data["total_electricity_charges"] = round((convert_to_float(match.group(1).replace(',', '')) -
                                                        convert_to_float(hst_text.group(1)) - extracted_data["ontario_electricity_rebate"]), 2)
@@ -85,8 +107,8 @@ def parse_burlington_hydro_bill(pdf_path):
     # 6) H.S.T.
     # Example snippet: "H.S.T. 10.75" or "H.S.T. (H.S.T. Registration 895...) 10.75"
     hst = 0
-    match = re.search(r'H\.S\.T\.\s*REG\.#\s*86829\s*1980\s*(\d{1,3}(?:,\d{3})*\.\d{1,2})', text, re.IGNORECASE)
-    total_electricity_charges = convert_to_float(re.search(r'Total\s*Electricity\s*Charges\s*\$?(\d{1,3}(?:,\d{3})*\.\d{1,2})', text, re.IGNORECASE).group(1).replace(",", ""))
+    match = matches["hst"]
+    total_electricity_charges = convert_to_float(matches["total_electricity_charges"].group(1).replace(",", ""))
     if match:
         hst = convert_to_float(match.group(1))
     extracted_data["hst"] = round((total_electricity_charges - hst - extracted_data["ontario_electricity_rebate"]) * 0.13, 2)
@@ -105,19 +127,17 @@ def parse_burlington_hydro_bill(pdf_path):
             amount_val *= -1
         return amount_val
 
-    match = re.search(r'Last\s*Statement\s*Amount\s*\$(\d{1,3}(?:,\d{3})*\.\d{1,2})(\s*CR)?', text, re.IGNORECASE)
+    match = matches["last_statement_amount"]
     if match:
         amount_val = check_for_cr(match.group(1), match.group(2))
         extracted_data["balance_forward"] += amount_val
 
-    match = re.search(r'Payments\s*since\s*last\s*statement,\s*Thank\s*you\s*\$(\d{1,3}(?:,\d{3})*\.\d{1,2})(\s*CR)?',
-                      text, re.IGNORECASE)
+    match = matches["payments_since_last_statement"]
     if match:
         amount_val = check_for_cr(match.group(1), match.group(2))
         extracted_data["balance_forward"] += amount_val
 
-    match = re.search(r'Customer\s*Transfer\s*Discount\s*\$(\d{1,3}(?:,\d{3})*\.\d{1,2})(\s*CR)?',
-                      text, re.IGNORECASE)
+    match = matches["customer_transfer_discount"]
     if match:
         amount_val = check_for_cr(match.group(1), match.group(2))
         extracted_data["balance_forward"] += amount_val
@@ -127,21 +147,19 @@ def parse_burlington_hydro_bill(pdf_path):
 
     # 8) Period
     # Example snippet: "NOV 07 2024 TO DEC 05 2024"
-    pattern = r'([A-Za-z]{3}\s*\d{1,2},\s*\d{4})\s*TO\s*([A-Za-z]{3}\s*\d{1,2},\s*\d{4})'
-
-    match = re.search(pattern, text, re.IGNORECASE)
+    match = matches["period"]
     if match:
         extracted_data["period_start_date"] = match.group(1).upper().replace(",", "")
         extracted_data["period_end_date"] = match.group(2).upper().replace(",", "")
 
     # 9) Late payment charge
     # Example snippet: "TOTAL LATE PENALTIES APPLIED $16.16"
-    match = re.search(r'TOTAL\s*LATE\s*PENALTIES\s*APPLIED\s*\$?(\d{1,3}(?:,\d{3})*\.\d{1,2})', text, re.IGNORECASE)
+    match = matches["late_penalties"]
     if match:
         extracted_data["Late Payment Charge"] = match.group(1)
 
     # 10) Invoice subtotal = amount_due - h.s.t.
-    match = re.search(r'H\.S\.T\.\s*REG\.#\s*86829\s*1980\s*(\d{1,3}(?:,\d{3})*\.\d{1,2})', text, re.IGNORECASE)
+    match = matches["hst"]
     if match and extracted_data["amount_due"]:
         hst = convert_to_float(match.group(1))
         extracted_data["invoice_subtotal"] = round(convert_to_float(extracted_data["amount_due"]) - hst, 2)
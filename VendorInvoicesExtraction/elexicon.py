@@ -1,11 +1,30 @@
-import fitz
 import re
 
 from OCR_helper import convert_date
-from scan_helper import get_month_year, convert_to_float, switch_date_and_month, format_date_str
+from PDF_helper import parse_pdf_with_fallback
+from scan_helper import get_month_year, convert_to_float, switch_date_and_month, format_date_str, search_fields
 from datetime import datetime, timedelta
 
 
+# Field patterns of the bill, compiled once and searched at most once per bill by search_fields
+FIELD_PATTERNS = {
+    "account_number": re.compile(r"visit\s*ontario.ca/yourelectricitybill\.\s*(\d{3,10}-?\d{0,3})", re.IGNORECASE),
+    "unmetered": re.compile(r'(Unmetered)', re.IGNORECASE),
+    "unmetered_statement_date": re.compile(r'([A-Za-z]{3}\s*\d{2},\s*\d{4})', re.IGNORECASE),
+    "statement_date": re.compile(r'[A-Za-z]{3}\s*\d{2}\s*-\s*[A-Za-z]{3}\s*\d{2},\s*\d{4}\s*([A-Za-z]{3}\s*\d{2},\s*\d{4})', re.IGNORECASE),
+    "amount_due": re.compile(r'TOTAL\s*Account\s*Balance\s*\$?(\d{1,3}(?:,\d{3})*\.\d{1,2})', re.IGNORECASE),
+    "ontario_electricity_rebate": re.compile(r'Ontario\s*Electricity\s*Rebate\s*(-?\$?\d{1,3}(?:,\d{3})*\.\d{1,2})', re.IGNORECASE),
+    "late_payment_charge": re.compile(r"Interest\s*Charge\s*on\s*Overdue\s*Amount\s*\$?(\d{1,3}(?:,\d{3})*\.\d{1,2})", re.IGNORECASE),
+    "current_charges": re.compile(r'CURRENT\s*CHARGES\s*\$?(\d{1,3}(?:,\d{3})*\.\d{1,2})', re.IGNORECASE),
+    "hst": re.compile(r'H\.S\.T\.\s*\(Registration\s*#\s*88628-2920-RT0001\)\s*\$?(\d{1,3}(?:,\d{3})*\.\d{1,2})', re.IGNORECASE),
+    "balance_forward": re.compile(r'BALANCE\s*FORWARD\s*(-?\$?\d{1,3}(?:,\d{3})*\.\d{1,2})', re.IGNORECASE),
+    "period": re.compile(r"([A-Za-z]{3}\s*\d{2}\s*-\s*[A-Za-z]{3}\s*\d{2},\s*\d{4})", re.IGNORECASE),
+}
+
+# Pages tried before the whole bill, the rest is only read when a field is missing or the amounts do not add up
+PAGE_HINTS = (1,)
+
+
 def parse_elexicon_bill(pdf_path):
     """
     Parse the hydro bill PDF and extract key fields:
@@ -21,6 +40,11 @@ def parse_elexicon_bill(pdf_path):
     - Period Start Date
     - Period End Date
     """
+    return parse_pdf_with_fallback(pdf_path, extract_elexicon_fields, backends=("fitz",), page_hints=PAGE_HINTS)
+
+
+def extract_elexicon_fields(text):
+    """Extract the key fields from the text of a Elexicon bill, see parse_elexicon_bill"""
     # Initialize a dictionary to store extracted data
     extracted_data = {
         "account_number": None,
@@ -37,15 +61,12 @@ def parse_elexicon_bill(pdf_path):
         "suggested_file_name" : None
     }
 
-    text = ""
-    doc = fitz.open(pdf_path)
-    for page in doc:
-        text += page.get_text()
+    matches = search_fields(text, FIELD_PATTERNS)
 
     # 1) Account Number
     # Example snippet: "visit ontario.ca/yourelectricitybill.
     # 00051774-03
-    match = re.search(r"visit\s*ontario.ca/yourelectricitybill\.\s*(\d{3,10}-?\d{0,3})", text, re.IGNORECASE)
+    match = matches["account_number"]
     if match:
         extracted_data["account_number"] = match.group(1).upper()
 
@@ -53,41 +74,40 @@ def parse_elexicon_bill(pdf_path):
     # Example snippet: "Jan 07 - Feb 07, 2025
     # Feb 25, 2025"
     # If this invoice is unmetered, then there is no read period, only statement is available
-    is_unmetered = re.search(r'(Unmetered)', text, re.IGNORECASE)
+    is_unmetered = matches["unmetered"]
     if is_unmetered:
-        match = re.search(r'([A-Za-z]{3}\s*\d{2},\s*\d{4})', text, re.IGNORECASE)
+        match = matches["unmetered_statement_date"]
         if match:
             extracted_data["statement_date"] = match.group(1).replace(",", "")
     else:
-        match = re.search(r'[A-Za-z]{3}\s*\d{2}\s*-\s*[A-Za-z]{3}\s*\d{2},\s*\d{4}\s*([A-Za-z]{3}\s*\d{2},\s*\d{4})', text, re.IGNORECASE)
+        match = matches["statement_date"]
         if match:
             extracted_data["statement_date"] = match.group(1).replace(",", "")
 
     # 3) Amount Due
     # Example snippet: "Total Account Balance:
     # $180.32
-    match = re.search(r'TOTAL\s*Account\s*Balance\s*\$?(\d{1,3}(?:,\d{3})*\.\d{1,2})', text, re.IGNORECASE)
+    match = matches["amount_due"]
     if match:
         extracted_data["amount_due"] = convert_to_float(match.group(1).replace(",", ""))
 
     # 4) Ontario Electricity Rebate
     # Example snippet: "Ontario Electricity Rebate -$7.67"
-    match = re.search(r'Ontario\s*Electricity\s*Rebate\s*(-?\$?\d{1,3}(?:,\d{3})*\.\d{1,2})', text, re.IGNORECASE)
+    match = matches["ontario_electricity_rebate"]
     if match:
         extracted_data["ontario_electricity_rebate"] = convert_to_float(match.group(1).replace(",", "").replace('$', ''))
 
     # 9) Late Payment Charge
     # Example snippet: "Interest Charge on Overdue Amount $1.17"
-    match = re.search(r"Interest\s*Charge\s*on\s*Overdue\s*Amount\s*\$?(\d{1,3}(?:,\d{3})*\.\d{1,2})", text, re.IGNORECASE)
+    match = matches["late_payment_charge"]
     if match:
         extracted_data["Late Payment Charge"] = convert_to_float(match.group(1))
 
     # 5) Total Electricity Charges
-    subtotal_text = re.search(r'CURRENT\s*CHARGES\s*\$?(\d{1,3}(?:,\d{3})*\.\d{1,2})', text,
-                              re.IGNORECASE)
+    subtotal_text = matches["current_charges"]
     if subtotal_text:
         subtotal_text = subtotal_text.group(1)
-    hst_text = re.search(r'H\.S\.T\.\s*\(Registration\s*#\s*88628-2920-RT0001\)\s*\$?(\d{1,3}(?:,\d{3})*\.\d{1,2})', text, re.IGNORECASE)
+    hst_text = matches["hst"]
     if subtotal_text and hst_text:
         extracted_data["total_electricity_charges"] = round((convert_to_float(subtotal_text.replace(',', '')) -
                                                              convert_to_float(hst_text.group(1)) - extracted_data[
@@ -98,7 +118,7 @@ def parse_elexicon_bill(pdf_path):
 
     # 7) Balance Forward
     # Example snippet: "Balance forward $0.00"
-    match = re.search(r'BALANCE\s*FORWARD\s*(-?\$?\d{1,3}(?:,\d{3})*\.\d{1,2})', text, re.IGNORECASE)
+    match = matches["balance_forward"]
     if match:
         extracted_data["balance_forward"] = convert_to_float(match.group(1).replace(",", "").replace("$", ""))
 
@@ -109,14 +129,14 @@ def parse_elexicon_bill(pdf_path):
         extracted_data["period_start_date"] = periods[0]
         extracted_data["period_end_date"] = periods[1]
     else:
-        match = re.search(r"([A-Za-z]{3}\s*\d{2}\s*-\s*[A-Za-z]{3}\s*\d{2},\s*\d{4})", text, re.IGNORECASE)
+        match = matches["period"]
         if match:
             periods = parse_date_range(match.group(1))
             extracted_data["period_start_date"] = periods[0]
             extracted_data["period_end_date"] = periods[1]
 
     # 10) Invoice subtotal = amount_due - h.s.t.
-    match = re.search(r'H\.S\.T\.\s*\(Registration\s*#\s*88628-2920-RT0001\)\s*\$?(\d{1,3}(?:,\d{3})*\.\d{1,2})', text, re.IGNORECASE)
+    match = matches["hst"]
     if match and extracted_data["amount_due"]:
         hst = convert_to_float(match.group(1))
         extracted_data["invoice_subtotal"] = round(convert_to_float(extracted_data["amount_due"]) - hst, 2)
@@ -1,8 +1,27 @@
-import pdfplumber
 import re
 
 from OCR_helper import convert_date
-from scan_helper import get_month_year, convert_to_float
+from PDF_helper import parse_pdf_with_fallback
+from scan_helper import get_month_year, convert_to_float, search_fields
+
+
+# Field patterns of the bill, compiled once and searched at most once per bill by search_fields
+FIELD_PATTERNS = {
+    "account_number": re.compile(r"Amount\s*Due:\s*\n?(\d{7})", re.IGNORECASE),
+    "statement_date": re.compile(r'([A-Za-z]{3}\.\s*\d{1,2},\s*\d{4})', re.IGNORECASE),
+    "amount_due": re.compile(r'Amount\s*Due:\s*\$?(\d{1,3}(?:,\d{3})*\.\d{1,2})', re.IGNORECASE),
+    "ontario_electricity_rebate": re.compile(r'Ontario\s*Electricity\s*Rebate\s*\$?(-?\d{1,3}(?:,\d{3})*\.\d{1,2})', re.IGNORECASE),
+    "subtotal": re.compile(r'Subtotal:?\s*\$?(\d{1,3}(?:,\d{3})*\.\d{1,2})', re.IGNORECASE),
+    "hst": re.compile(r'HST\s*87249\s*8225\s*RT0001\s*(\d{1,3}(?:,\d{3})*\.\d{1,2})', re.IGNORECASE),
+    "balance_forward_from_previous_amount": re.compile(r'Balance\s*Forward\s*From\s*Previous\s*Amount\s*Owing\s*(-?\$\d{1,3}(?:,\d{3})*\.\d{1,2})', re.IGNORECASE),
+    "balance_forward": re.compile(r'Balance\s*forward\s*(-?\$\d{1,3}(?:,\d{3})*\.\d{1,2})', re.IGNORECASE),
+    "period_start_date": re.compile(r"From:\s*([A-Za-z]{3}\.?\s*\d{1,2},\s*\d{4})", re.IGNORECASE),
+    "period_end_date": re.compile(r"To:\s*([A-Za-z]{3}\.?\s*\d{1,2},\s*\d{4})", re.IGNORECASE),
+    "late_payment_charge": re.compile(r"Late\s*Payment\s*Charge\s*(\d{1,3}(?:,\d{3})*\.\d{1,2})", re.IGNORECASE),
+}
+
+# Pages tried before the whole bill, the rest is only read when a field is missing or the amounts do not add up
+PAGE_HINTS = (1,)
 
 
 def parse_fortis_bill(pdf_path):
@@ -20,6 +39,11 @@ def parse_fortis_bill(pdf_path):
     - Period Start Date
     - Period End Date
     """
+    return parse_pdf_with_fallback(pdf_path, extract_fortis_fields, page_hints=PAGE_HINTS)
+
+
+def extract_fortis_fields(text):
+    """Extract the key fields from the text of a Fortis bill, see parse_fortis_bill"""
     # Initialize a dictionary to store extracted data
     extracted_data = {
         "account_number": None,
@@ -36,15 +60,12 @@ def parse_fortis_bill(pdf_path):
         "suggested_file_name" : None
     }
 
-    with pdfplumber.open(pdf_path) as pdf:
-        text = ""
-        for page in pdf.pages:
-            text += page.extract_text() + "\n"
+    matches = search_fields(text, FIELD_PATTERNS)
 
     # 1) Account Number
     # Example snippet: "Account #: Amount Due:
     #                   1008968    $ 104.20"
-    match = re.search(r"Amount\s*Due:\s*\n?(\d{7})", text, re.IGNORECASE)
+    match = matches["account_number"]
     if match:
         extracted_data["account_number"] = match.group(1).upper()
 
@@ -52,19 +73,19 @@ def parse_fortis_bill(pdf_path):
     # Example snippet: "Statement Date: Due Date:
     #                   Jan. 08, 2025   Feb. 03, 2025"
     # It usually to appears at first
-    match = re.search(r'([A-Za-z]{3}\.\s*\d{1,2},\s*\d{4})', text, re.IGNORECASE)
+    match = matches["statement_date"]
     if match:
         extracted_data["statement_date"] = match.group(1).upper().replace(",", "").replace(".", "")
 
     # 3) Amount Due
     # Example snippet: "Amount Due: $168.60"
-    match = re.search(r'Amount\s*Due:\s*\$?(\d{1,3}(?:,\d{3})*\.\d{1,2})', text, re.IGNORECASE)
+    match = matches["amount_due"]
     if match:
         extracted_data["amount_due"] = float(match.group(1).replace(",", ""))
 
     # 4) Ontario Electricity Rebate
     # Example snippet: "Ontario Electricity Rebate -13.67"
-    match = re.search(r'Ontario\s*Electricity\s*Rebate\s*\$?(-?\d{1,3}(?:,\d{3})*\.\d{1,2})', text, re.IGNORECASE)
+    match = matches["ontario_electricity_rebate"]
     if match:
         extracted_data["ontario_electricity_rebate"] = float(match.group(1).replace(",", ""))
 
@@ -79,8 +100,8 @@ def parse_fortis_bill(pdf_path):
     # HST 87249 8225 RT0001 13.56
     # Ontario Electricity Rebate -13.67
     # Subtotal: $104.20
-    subtotal_text = re.search(r'Subtotal:?\s*\$?(\d{1,3}(?:,\d{3})*\.\d{1,2})', text, re.IGNORECASE).group(1)
-    hst_text = re.search(r'HST\s*87249\s*8225\s*RT0001\s*(\d{1,3}(?:,\d{3})*\.\d{1,2})', text, re.IGNORECASE).group(1)
+    subtotal_text = matches["subtotal"].group(1)
+    hst_text = matches["hst"].group(1)
     if subtotal_text:
         extracted_data["total_electricity_charges"] = round((float(subtotal_text.replace(',', '')) -
                                                              float(hst_text) - extracted_data[
@@ -91,19 +112,18 @@ def parse_fortis_bill(pdf_path):
 
     # 7) Balance Forward
     # Example snippet: "Balance forward $0.00"
-    match = re.search(r'Balance\s*Forward\s*From\s*Previous\s*Amount\s*Owing\s*(-?\$\d{1,3}(?:,\d{3})*\.\d{1,2})', text, re.IGNORECASE)
+    match = matches["balance_forward_from_previous_amount"]
     if match:
         extracted_data["balance_forward"] = float(match.group(1).replace(",", "").replace("$", ""))
-    match = re.search(r'Balance\s*forward\s*(-?\$\d{1,3}(?:,\d{3})*\.\d{1,2})', text,
-                      re.IGNORECASE)
+    match = matches["balance_forward"]
     if match:
         extracted_data["balance_forward"] = float(match.group(1).replace(",", "").replace("$", ""))
 
     # 8) Period
     # Example snippet: "From: Dec 1, 2024 00:00
     # To: Jan 1, 2025 00:00"
-    match1 = re.search(r"From:\s*([A-Za-z]{3}\.?\s*\d{1,2},\s*\d{4})", text, re.IGNORECASE)
-    match2 = re.search(r"To:\s*([A-Za-z]{3}\.?\s*\d{1,2},\s*\d{4})", text, re.IGNORECASE)
+    match1 = matches["period_start_date"]
+    match2 = matches["period_end_date"]
     if match1:
         extracted_data["period_start_date"] = match1.group(1).upper().replace(",", "")
     if match2:
@@ -111,12 +131,12 @@ def parse_fortis_bill(pdf_path):
 
     # 9) Late Payment Charge
     # Example snippet: "Late Payment Charge 2.84"
-    match = re.search(r"Late\s*Payment\s*Charge\s*(\d{1,3}(?:,\d{3})*\.\d{1,2})", text, re.IGNORECASE)
+    match = matches["late_payment_charge"]
     if match:
         extracted_data["Late Payment Charge"] = match.group(1)
 
     # 10) Invoice subtotal = amount_due - h.s.t.
-    match = re.search(r'HST\s*87249\s*8225\s*RT0001\s*(\d{1,3}(?:,\d{3})*\.\d{1,2})', text, re.IGNORECASE)
+    match = matches["hst"]
     if match and extracted_data["amount_due"]:
         hst = convert_to_float(match.group(1))
         extracted_data["invoice_subtotal"] = round(convert_to_float(extracted_data["amount_due"]) - hst, 2)
@@ -1,9 +1,27 @@
-import pdfplumber
 import re
-import fitz
 
 from OCR_helper import convert_date
-from scan_helper import get_month_year, convert_to_float, format_date_str, switch_date_and_month, convert_date_from_full
+from PDF_helper import parse_pdf_with_fallback
+from scan_helper import get_month_year, convert_to_float, format_date_str, switch_date_and_month, convert_date_from_full, search_fields
+
+
+# Field patterns of the bill, compiled once and searched at most once per bill by search_fields
+FIELD_PATTERNS = {
+    "account_number": re.compile(r"Your account number[ is]?:\s*((?:\d\s*)*)", re.IGNORECASE),
+    "statement_date": re.compile(r'This statement is issued on:\s*([A-Za-z]{3,10}\s*\d{1,2},\s*\d{4})', re.IGNORECASE),
+    "billing_date": re.compile(r'Billing date:\s*([A-Za-z]{3,10}\s*\d{1,2},\s*\d{4})', re.IGNORECASE),
+    "amount_due": re.compile(r'Total amount you owe\s*\$?(\d{1,3}(?:,\d{3})*\.\d{1,2})', re.IGNORECASE),
+    "ontario_electricity_rebate": re.compile(r'ONTARIO\s*ELECTRICITY\s*REBATE\s*\.*\s*(-?\$\d{1,3}(?:,\d{3})*\.\d{1,2})', re.IGNORECASE),
+    "late_payment_charge": re.compile(r"Your Adjustments\s*(-?\$?\d{1,3}(?:,\d{3})*\.\d{1,2})", re.IGNORECASE),
+    "total_of_electricity_charges": re.compile(r'Total of your electricity charges\s*\.*\s*\$(\d{1,3}(?:,\d{3})*\.\d{1,2})', re.IGNORECASE),
+    "hst": re.compile(r'HST \(87086-5821-RT0001\)\s*\.*\s*\$(\d{1,3}(?:,\d{3})*\.\d{1,2})', re.IGNORECASE),
+    "ontario_electricity_rebate_in_charges": re.compile(r'Ontario Electricity Rebate\s*\.*\s*\$(\d{1,3}(?:,\d{3})*\.\d{1,2})', re.IGNORECASE),
+    "balance_forward": re.compile(r'Balance carried forward from previous statement\s*(-?\$?\d{1,3}(?:,\d{3})*\.\d{1,2})', re.IGNORECASE),
+    "period": re.compile(r"For the period of:\s*([A-Za-z]{3,10}\s*\d{1,2},\s*\d{4}) - ([A-Za-z]{3,10}\s*\d{1,2},\s*\d{4})", re.IGNORECASE),
+}
+
+# Pages tried before the whole bill, the rest is only read when a field is missing or the amounts do not add up
+PAGE_HINTS = (1,)
 
 
 def parse_hydro_one_bill(pdf_path):
@@ -21,6 +39,11 @@ def parse_hydro_one_bill(pdf_path):
     - Period Start Date
     - Period End Date
     """
+    return parse_pdf_with_fallback(pdf_path, extract_hydro_one_fields, backends=("fitz",), page_hints=PAGE_HINTS)
+
+
+def extract_hydro_one_fields(text):
+    """Extract the key fields from the text of a Hydro One bill, see parse_hydro_one_bill"""
     # Initialize a dictionary to store extracted data
     extracted_data = {
         "account_number": None,
@@ -37,51 +60,48 @@ def parse_hydro_one_bill(pdf_path):
         "suggested_file_name" : None
     }
 
-    text = ""
-    doc = fitz.open(pdf_path)
-    for page in doc:
-        text += page.get_text()
+    matches = search_fields(text, FIELD_PATTERNS)
 
     print(text)
 
     # 1) Account Number
-    match = re.search(r"Your account number[ is]?:\s*((?:\d\s*)*)", text, re.IGNORECASE)
+    match = matches["account_number"]
     if match:
         extracted_data["account_number"] = match.group(1).upper().replace(' ', '').replace('\n', '')
 
     # 2) Statement Date
-    match = re.search(r'This statement is issued on:\s*([A-Za-z]{3,10}\s*\d{1,2},\s*\d{4})', text, re.IGNORECASE)
+    match = matches["statement_date"]
     if match:
         extracted_data["statement_date"] = convert_date_from_full(match.group(1).upper())
     else:
-        match = re.search(r'Billing date:\s*([A-Za-z]{3,10}\s*\d{1,2},\s*\d{4})', text, re.IGNORECASE)
+        match = matches["billing_date"]
         if match:
             extracted_data["statement_date"] = convert_date_from_full(match.group(1).upper())
 
     # 3) Amount Due
-    match = re.search(r'Total amount you owe\s*\$?(\d{1,3}(?:,\d{3})*\.\d{1,2})', text, re.IGNORECASE)
+    match = matches["amount_due"]
     if match:
         extracted_data["amount_due"] = convert_to_float(match.group(1).replace(",", ""))
 
     # 4) Ontario Electricity Rebate
-    match = re.search(r'ONTARIO\s*ELECTRICITY\s*REBATE\s*\.*\s*(-?\$\d{1,3}(?:,\d{3})*\.\d{1,2})', text, re.IGNORECASE)
+    match = matches["ontario_electricity_rebate"]
     if match:
         extracted_data["ontario_electricity_rebate"] = convert_to_float(match.group(1)) * -1
 
     # 9) Late Payment Charge
-    match = re.search(r"Your Adjustments\s*(-?\$?\d{1,3}(?:,\d{3})*\.\d{1,2})", text, re.IGNORECASE)
+    match = matches["late_payment_charge"]
     if match:
         extracted_data["Late Payment Charge"] = convert_to_float(match.group(1))
 
     # 5) Total Electricity Charges
     subtotal_text = 0
-    subtotal_raw_text = re.search(r'Total of your electricity charges\s*\.*\s*\$(\d{1,3}(?:,\d{3})*\.\d{1,2})', text, re.IGNORECASE)
+    subtotal_raw_text = matches["total_of_electricity_charges"]
     if subtotal_raw_text:
         subtotal_text = convert_to_float(subtotal_raw_text.group(1))
-    hst_raw_text = re.search(r'HST \(87086-5821-RT0001\)\s*\.*\s*\$(\d{1,3}(?:,\d{3})*\.\d{1,2})', text, re.IGNORECASE)
+    hst_raw_text = matches["hst"]
     if hst_raw_text:
         subtotal_text -= convert_to_float(hst_raw_text.group(1))
-    rebate_raw_text = re.search(r'Ontario Electricity Rebate\s*\.*\s*\$(\d{1,3}(?:,\d{3})*\.\d{1,2})', text, re.IGNORECASE)
+    rebate_raw_text = matches["ontario_electricity_rebate_in_charges"]
     if rebate_raw_text:
         subtotal_text -= convert_to_float(rebate_raw_text.group(1))
     extracted_data["total_electricity_charges"] = round(subtotal_text, 2)
@@ -91,18 +111,18 @@ def parse_hydro_one_bill(pdf_path):
 
     # 7) Balance Forward
     # Example snippet: "Balance forward $0.00"
-    match = re.search(r'Balance carried forward from previous statement\s*(-?\$?\d{1,3}(?:,\d{3})*\.\d{1,2})', text, re.IGNORECASE)
+    match = matches["balance_forward"]
     if match:
         extracted_data["balance_forward"] = convert_to_float(match.group(1))
 
     # 8) Period
-    match = re.search(r"For the period of:\s*([A-Za-z]{3,10}\s*\d{1,2},\s*\d{4}) - ([A-Za-z]{3,10}\s*\d{1,2},\s*\d{4})", text, re.IGNORECASE)
+    match = matches["period"]
     if match:
         extracted_data["period_start_date"] = convert_date_from_full(match.group(1).upper())
         extracted_data["period_end_date"] = convert_date_from_full(match.group(2).upper())
 
     # 10) Invoice subtotal = amount_due - h.s.t.
-    match = re.search(r'HST \(87086-5821-RT0001\)\s*\.*\s*\$(\d{1,3}(?:,\d{3})*\.\d{1,2})', text, re.IGNORECASE)
+    match = matches["hst"]
     if match and extracted_data["amount_due"]:
         hst = convert_to_float(match.group(1))
         extracted_data["invoice_subtotal"] = round(convert_to_float(extracted_data["amount_due"]) - hst, 2)
@@ -0,0 +1,56 @@
+import importlib
+import re
+
+# Vendor name -> (module, scanning function)
+# The module is only imported the first time the vendor is used, so pdfplumber and fitz are not loaded at startup
+VENDOR_PARSERS = {
+    "Alectra": ("VendorInvoicesExtraction.alectra_scan", "parse_alectra_bill"),
+    "Burlington Hydro": ("VendorInvoicesExtraction.burlington_hydro_scan", "parse_burlington_hydro_bill"),
+    "Elexicon": ("VendorInvoicesExtraction.elexicon", "parse_elexicon_bill"),
+    "Fortis": ("VendorInvoicesExtraction.fortis_scan", "parse_fortis_bill"),
+    "Grimsby": ("VendorInvoicesExtraction.grimsby", "parse_grimsby_bill"),
+    "Hydro One": ("VendorInvoicesExtraction.hydro_one", "parse_hydro_one_bill"),
+    "NPE": ("VendorInvoicesExtraction.NPE", "parse_NPE_bill"),
+    "NTP": ("VendorInvoicesExtraction.NTP", "parse_NTP_bill"),
+    "Toronto Hydro": ("VendorInvoicesExtraction.toronto_hydro_scan", "parse_toronto_hydro_bill"),
+    "Welland": ("VendorInvoicesExtraction.welland_scan", "parse_welland_bill"),
+}
+
+# Vendor name -> the format of its account numbers, anchored so no two formats match the same account number.
+# Only formats no other scanner captures are listed: plain digits could be Hydro One (any digits), Alectra, Fortis,
+# Grimsby or Toronto Hydro, and 'digits-2 digits' could be Welland, Elexicon, NPE or NTP, so those are left to the user
+VENDOR_ACCOUNT_PATTERNS = {
+    "Burlington Hydro": re.compile(r"\d{6}-\d{7}"),
+    "NTP": re.compile(r"\d{3,10}-\d{4,6}"),
+}
+
+_loaded_parsers = dict()
+
+
+def get_vendor_names() -> list:
+    """Returns the names of all supported vendors, in the order shown in the GUI"""
+    return list(VENDOR_PARSERS.keys())
+
+
+def get_vendor_parser(vendor):
+    """
+    Returns the scanning function of the vendor, its module is imported on first use.
+    Returns None if the vendor is not supported.
+    """
+    if vendor not in VENDOR_PARSERS:
+        return None
+    if vendor not in _loaded_parsers:
+        module_name, function_name = VENDOR_PARSERS[vendor]
+        module = importlib.import_module(module_name)
+        _loaded_parsers[vendor] = getattr(module, function_name)
+    return _loaded_parsers[vendor]
+
+
+def get_vendor_for_account(account_number):
+    """
+    Returns the vendor of an account number from its format, e.g. '123456-1234567' is Burlington Hydro.
+    Returns None if no format or more than one format matches.
+    """
+    account_number = str(account_number).replace(" ", "")
+    vendors = [vendor for vendor, pattern in VENDOR_ACCOUNT_PATTERNS.items() if pattern.fullmatch(account_number)]
+    return vendors[0] if len(vendors) == 1 else None
@@ -1,8 +1,22 @@
-import pdfplumber
 import re
 
 from OCR_helper import convert_date
-from scan_helper import get_month_year, convert_to_float
+from PDF_helper import get_pdf_region_text, parse_pdf_with_fallback
+from scan_helper import get_month_year, convert_to_float, search_fields
+
+
+# Field patterns of the bill, compiled once and searched at most once per bill by search_fields
+FIELD_PATTERNS = {
+    "statement_date": re.compile(r'Statement\s*Date\s*([A-Za-z]{3}\s*\d{1,2}\s*\d{4})', re.IGNORECASE),
+    "amount_due": re.compile(r'Amount\s*Due\s*\$?(\d{1,3}(?:,\d{3})*\.\d{1,2})', re.IGNORECASE),
+    "total_electricity_charges": re.compile(r'Your\s*Total\s*Electricity\s*Charges\s*(\d{1,3}(?:,\d{3})*\.\d{1,2})', re.IGNORECASE),
+    "ontario_electricity_rebate": re.compile(r'Ontario\s*Electricity\s*Rebate\s*(\d{1,3}(?:,\d{3})*\.\d{1,2})', re.IGNORECASE),
+    "total_ontario_support": re.compile(r'Total\s*Ontario\s*support:\s*\$(\d{1,3}(?:,\d{3})*\.\d{1,2})', re.IGNORECASE),
+    "balance_forward": re.compile(r'Balance\s*Forward\s*(\d{1,3}(?:,\d{3})*\.\d{1,2})(\s*CR)?', re.IGNORECASE),
+    "late_payment_charge": re.compile(r'Late\s*Payment\s*Charge\s*(\d{1,3}(?:,\d{3})*\.\d{1,2})', re.IGNORECASE),
+    "hst": re.compile(r'H\.S\.T\.\s*\(?[^\)]*\)?\s*(\d{1,3}(?:,\d{3})*\.\d{1,2})', re.IGNORECASE),
+    "period": re.compile(r'([A-Za-z]{3}\s*\d{1,2}\s*\d{4})\s*TO\s*([A-Za-z]{3}\s*\d{1,2}\s*\d{4})', re.IGNORECASE),
+}
 
 
 def parse_toronto_hydro_bill(pdf_path):
@@ -20,9 +34,33 @@ def parse_toronto_hydro_bill(pdf_path):
     - Period Start Date
     - Period End Date
     """
+    # ---------------------------------------------------------------------
+    # 1) ACCOUNT NUMBER BY CROPPING
+    #    Suppose we know that “Account Number” text and the actual number
+    #    are in a region from x=50 to x=300, y=100 to y=150 on page 1.
+    #    (Coordinates will differ in your PDF.)
+    #    The crop layout needs pdfplumber, the rest of the bill is read with fitz.
+    # ---------------------------------------------------------------------
+    account_bbox = (50, 100, 300, 150)
+    account_text = get_pdf_region_text(pdf_path, account_bbox)
+
+    # Now parse the text. Possibly the text is something like:
+    #   "Account Number\n5697020993"
+    # or "5697020993\nAccount Number"
+    # so we can search for a sequence of digits near the phrase “Account Number”.
+    account_number = None
+    match = re.search(r'(\d{8,})', account_text)  # capture a big chunk of digits
+    if match:
+        account_number = match.group(1)
+
+    return parse_pdf_with_fallback(pdf_path, lambda text: extract_toronto_hydro_fields(text, account_number))
+
+
+def extract_toronto_hydro_fields(text, account_number):
+    """Extract the key fields from the text of a Toronto Hydro bill, see parse_toronto_hydro_bill"""
     # Initialize a dictionary to store extracted data
     extracted_data = {
-        "account_number": None,
+        "account_number": account_number,
         "period_start_date": None,
         "period_end_date": None,
         "statement_date": None,
@@ -35,51 +73,24 @@ def parse_toronto_hydro_bill(pdf_path):
         "amount_due": None,
         "suggested_file_name" : None
     }
-
-    with pdfplumber.open(pdf_path) as pdf:
-        # If your data is always on page 1, just reference pdf.pages[0].
-        page = pdf.pages[0]
-        # ---------------------------------------------------------------------
-        # 1) ACCOUNT NUMBER BY CROPPING
-        #    Suppose we know that “Account Number” text and the actual number
-        #    are in a region from x=50 to x=300, y=100 to y=150.
-        #    (Coordinates will differ in your PDF.)
-        # ---------------------------------------------------------------------
-        account_bbox = (50, 100, 300, 150)
-        cropped_account = page.crop(account_bbox)
-
-        # Extract the text in that region
-        account_text = cropped_account.extract_text() or ""
-
-        # Now parse the text. Possibly the text is something like:
-        #   "Account Number\n5697020993"
-        # or "5697020993\nAccount Number"
-        # so we can search for a sequence of digits near the phrase “Account Number”.
-        match = re.search(r'(\d{8,})', account_text)  # capture a big chunk of digits
-        if match:
-            extracted_data["account_number"] = match.group(1)
-
-    with pdfplumber.open(pdf_path) as pdf:
-        text = ""
-        for page in pdf.pages:
-            text += page.extract_text() + "\n"
+    matches = search_fields(text, FIELD_PATTERNS)
 
     # 2) Statement Date
     # Example snippet: "Statement Date Dec 11 2024"
-    match = re.search(r'Statement\s*Date\s*([A-Za-z]{3}\s*\d{1,2}\s*\d{4})', text, re.IGNORECASE)
+    match = matches["statement_date"]
     if match:
         extracted_data["statement_date"] = match.group(1).upper()
 
     # 3) Amount Due
     # Example snippet: "Amount Due $168.60"
-    match = re.search(r'Amount\s*Due\s*\$?(\d{1,3}(?:,\d{3})*\.\d{1,2})', text, re.IGNORECASE)
+    match = matches["amount_due"]
     if match:
         extracted_data["amount_due"] = match.group(1)
 
     # 4) Your Total Electricity Charges
     # Example snippet: "Your Total Electricity Charges 82.72"
     electricity_sum = 0
-    for match in re.finditer(r'Your\s*Total\s*Electricity\s*Charges\s*(\d{1,3}(?:,\d{3})*\.\d{1,2})', text, re.IGNORECASE):
+    for match in FIELD_PATTERNS["total_electricity_charges"].finditer(text):
         amount_str = match.group(1)
         # Remove commas and convert to float
         amount_val = float(amount_str.replace(',', ''))
@@ -95,17 +106,17 @@ def parse_toronto_hydro_bill(pdf_path):
     # 6) Ontario Electricity Rebate
     # Example snippet: "Ontario Electricity Rebate 10.84 CR"
     # The actual amount might come before "CR", so we can capture the numeric portion.
-    match = re.search(r'Ontario\s*Electricity\s*Rebate\s*(\d{1,3}(?:,\d{3})*\.\d{1,2})', text, re.IGNORECASE)
+    match = matches["ontario_electricity_rebate"]
     if match:
         extracted_data["ontario_electricity_rebate"] = convert_to_float(match.group(1)) * -1
     if extracted_data["ontario_electricity_rebate"] == 0:
-        match = re.search(r'Total\s*Ontario\s*support:\s*\$(\d{1,3}(?:,\d{3})*\.\d{1,2})', text, re.IGNORECASE)
+        match = matches["total_ontario_support"]
         if match:
             extracted_data["ontario_electricity_rebate"] = convert_to_float(match.group(1)) * -1
 
     # 7) Balance Forward
     # Example snippet: "Balance Forward 85.97"
-    match = re.search(r'Balance\s*Forward\s*(\d{1,3}(?:,\d{3})*\.\d{1,2})(\s*CR)?', text, re.IGNORECASE)
+    match = matches["balance_forward"]
     if match:
         # The numeric part (e.g. '19,299.99')
         amount_str = match.group(1)
@@ -121,21 +132,19 @@ def parse_toronto_hydro_bill(pdf_path):
 
     # 8) Period
     # Example snippet: "NOV 07 2024 TO DEC 05 2024"
-    pattern = r'([A-Za-z]{3}\s*\d{1,2}\s*\d{4})\s*TO\s*([A-Za-z]{3}\s*\d{1,2}\s*\d{4})'
-
-    match = re.search(pattern, text, re.IGNORECASE)
+    match = matches["period"]
     if match:
         extracted_data["period_start_date"] = match.group(1)
         extracted_data["period_end_date"] = match.group(2)
 
     # 9) Late payment charge
     # Example snippet: "Late Payment Charge 85.97"
-    match = re.search(r'Late\s*Payment\s*Charge\s*(\d{1,3}(?:,\d{3})*\.\d{1,2})', text, re.IGNORECASE)
+    match = matches["late_payment_charge"]
     if match:
         extracted_data["Late Payment Charge"] = match.group(1)
 
     # 10) Invoice subtotal = amount_due - h.s.t.
-    match = re.search(r'H\.S\.T\.\s*\(?[^\)]*\)?\s*(\d{1,3}(?:,\d{3})*\.\d{1,2})', text, re.IGNORECASE)
+    match = matches["hst"]
     if match:
         hst = convert_to_float(match.group(1))
         extracted_data["invoice_subtotal"] = round(convert_to_float(extracted_data["amount_due"]) - hst, 2)
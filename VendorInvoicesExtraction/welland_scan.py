@@ -1,6 +1,23 @@
-import fitz
 import re
-from scan_helper import get_month_year, convert_to_float, format_date_str, switch_date_and_month
+from PDF_helper import parse_pdf_with_fallback
+from scan_helper import get_month_year, convert_to_float, format_date_str, switch_date_and_month, search_fields
+
+
+# Field patterns of the bill, compiled once and searched at most once per bill by search_fields
+FIELD_PATTERNS = {
+    "account_number": re.compile(r'Account\s*Number\n(\d{5,10}-\d{2})', re.IGNORECASE),
+    "statement_date": re.compile(r'Amount\s*Due\n(\d{4}-\d{2}-\d{2})', re.IGNORECASE),
+    "amount_due": re.compile(r'Amount\s*Due\s*\$?(\d{1,3}(?:,\d{3})*\.\d{1,2})', re.IGNORECASE),
+    "total_electricity_charges": re.compile(r'TOTAL\s*ELECTRICITY\s*CHARGES\n\$?(\d{1,3}(?:,\d{3})*\.\d{1,2})', re.IGNORECASE),
+    "ontario_electricity_rebate": re.compile(r'ONTARIO\s*ELECTRICITY\s*REBATE\n-\$(\d{1,3}(?:,\d{3})*\.\d{1,2})', re.IGNORECASE),
+    "balance_forward": re.compile(r'BALANCE\s*FORWARD\s*\(Due Now\)\n(-)?\$(\d{1,3}(?:,\d{3})*\.\d{1,2})', re.IGNORECASE),
+    "period": re.compile(r'Billing\s*Period:\s*(\d{4}-\d{2}-\d{2})\s*to\s*(\d{4}-\d{2}-\d{2})', re.IGNORECASE),
+    "late_payment_charge": re.compile(r'OVERDUE\s*INTEREST\n\$(\d{1,3}(?:,\d{3})*\.\d{1,2})', re.IGNORECASE),
+    "hst": re.compile(r'TAXES\s*\*HST\s*\(863759692RT0001\)\n\$(\d{1,3}(?:,\d{3})*\.\d{1,2})', re.IGNORECASE),
+}
+
+# Pages tried before the whole bill, the rest is only read when a field is missing or the amounts do not add up
+PAGE_HINTS = (1,)
 
 
 def parse_welland_bill(pdf_path):
@@ -18,6 +35,11 @@ def parse_welland_bill(pdf_path):
     - Period Start Date
     - Period End Date
     """
+    return parse_pdf_with_fallback(pdf_path, extract_welland_fields, backends=("fitz",), page_hints=PAGE_HINTS)
+
+
+def extract_welland_fields(text):
+    """Extract the key fields from the text of a Welland bill, see parse_welland_bill"""
     # Initialize a dictionary to store extracted data
     extracted_data = {
         "account_number": None,
@@ -33,20 +55,17 @@ def parse_welland_bill(pdf_path):
         "amount_due": None,
         "suggested_file_name" : None
     }
-    text = ""
-    doc = fitz.open(pdf_path)
-    for page in doc:
-        text += page.get_text()
+    matches = search_fields(text, FIELD_PATTERNS)
 
     # 1) Account Number
     # Example snippet: "Account Number\n00019232-00"
-    match = re.search(r'Account\s*Number\n(\d{5,10}-\d{2})', text, re.IGNORECASE)
+    match = matches["account_number"]
     if match:
         extracted_data["account_number"] = match.group(1).upper()
 
     # 2) Statement Date
     # Example snippet: "Amount Due\n2025-01-17"
-    match = re.search(r'Amount\s*Due\n(\d{4}-\d{2}-\d{2})', text, re.IGNORECASE)
+    match = matches["statement_date"]
     if match:
         extracted_data["statement_date"] = match.group(1).upper()
     year = extracted_data["statement_date"][:4]
@@ -56,14 +75,13 @@ def parse_welland_bill(pdf_path):
 
     # 3) Amount Due
     # Example snippet: "Amount Due $168.60"
-    match = re.search(r'Amount\s*Due\s*\$?(\d{1,3}(?:,\d{3})*\.\d{1,2})', text, re.IGNORECASE)
+    match = matches["amount_due"]
     if match:
         extracted_data["amount_due"] = match.group(1)
 
     # 4) Your Total Electricity Charges
     # Example snippet: "TOTAL ELECTRICITY CHARGES\n$120.70"
-    match = re.search(r'TOTAL\s*ELECTRICITY\s*CHARGES\n\$?(\d{1,3}(?:,\d{3})*\.\d{1,2})', text,
-                      re.IGNORECASE)
+    match = matches["total_electricity_charges"]
     if match:
         extracted_data["total_electricity_charges"] = convert_to_float(match.group(1))
 
@@ -72,13 +90,13 @@ def parse_welland_bill(pdf_path):
 
     # 6) Ontario Electricity Rebate
     # Example snippet: "ONTARIO ELECTRICITY REBATE\n-$15.81"
-    match = re.search(r'ONTARIO\s*ELECTRICITY\s*REBATE\n-\$(\d{1,3}(?:,\d{3})*\.\d{1,2})', text, re.IGNORECASE)
+    match = matches["ontario_electricity_rebate"]
     if match:
         extracted_data["ontario_electricity_rebate"] = convert_to_float(match.group(1).replace(", ", "")) * -1
 
     # 7) Balance Forward
     # Example snippet: "BALANCE FORWARD (Due Now)\n$117.68"
-    match = re.search(r'BALANCE\s*FORWARD\s*\(Due Now\)\n(-)?\$(\d{1,3}(?:,\d{3})*\.\d{1,2})', text, re.IGNORECASE)
+    match = matches["balance_forward"]
     if match:
         # The numeric part (e.g. '19,299.99')
         amount_str = match.group(2)
@@ -94,7 +112,7 @@ def parse_welland_bill(pdf_path):
 
     # 8) Period
     # Example snippet: "Billing Period: 2024-12-01 to 2025-01-01"
-    match = re.search(r'Billing\s*Period:\s*(\d{4}-\d{2}-\d{2})\s*to\s*(\d{4}-\d{2}-\d{2})', text, re.IGNORECASE)
+    match = matches["period"]
     if match:
         extracted_data["period_start_date"] = match.group(1)
         extracted_data["period_end_date"] = match.group(2)
@@ -109,14 +127,13 @@ def parse_welland_bill(pdf_path):
 
     # 9) Late payment charge
     # Example snippet: "OVERDUE INTEREST\n$0.46"
-    match = re.search(r'OVERDUE\s*INTEREST\n\$(\d{1,3}(?:,\d{3})*\.\d{1,2})', text, re.IGNORECASE)
+    match = matches["late_payment_charge"]
     if match:
         extracted_data["Late Payment Charge"] = convert_to_float(match.group(1))
 
     # 10) Invoice subtotal = amount_due - h.s.t.
     # Example snippet : "TAXES *HST (863759692RT0001)\n$15.69"
-    match = re.search(r'TAXES\s*\*HST\s*\(863759692RT0001\)\n\$(\d{1,3}(?:,\d{3})*\.\d{1,2})',
-                      text, re.IGNORECASE)
+    match = matches["hst"]
     if match:
         hst = convert_to_float(match.group(1).replace(", ", ""))
         extracted_data["invoice_subtotal"] = round(convert_to_float(extracted_data["amount_due"]) - hst, 2)
@@ -1,32 +1,35 @@
-import time
+import os
+import threading
 import Global_variables
 from selenium import webdriver
-from selenium.common import TimeoutException
+from selenium.common import TimeoutException, WebDriverException, StaleElementReferenceException, \
+    ElementClickInterceptedException, NoSuchElementException
 from selenium.webdriver import Keys
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait, Select
 from selenium.webdriver.support import expected_conditions as EC
 
-from Excel_helper import read_column_values, populate_invoice_numbers, delete_cell_content_if_matches, \
-    insert_tuples_in_excel, read_cell_content_from_first_two_col
 from OCR_helper import convert_month_abbr, get_today_date
-from VendorInvoicesExtraction.NPE import parse_NPE_bill
-from VendorInvoicesExtraction.NTP import parse_NTP_bill
-from VendorInvoicesExtraction.alectra_scan import parse_alectra_bill
-from VendorInvoicesExtraction.burlington_hydro_scan import parse_burlington_hydro_bill
-from CustomizedExceptions import RequestApprovalError, InvoiceScanError, AmountError, PendingPaymentError, AccountNumberError, ExtractedDataUnmatchError, UnsaveableError
-from VendorInvoicesExtraction.elexicon import parse_elexicon_bill
-from VendorInvoicesExtraction.fortis_scan import parse_fortis_bill
-from VendorInvoicesExtraction.grimsby import parse_grimsby_bill
-from VendorInvoicesExtraction.hydro_one import parse_hydro_one_bill
-from VendorInvoicesExtraction.toronto_hydro_scan import parse_toronto_hydro_bill
-from VendorInvoicesExtraction.welland_scan import parse_welland_bill
-from scan_helper import find_file_with_substring, self_check, copy_as_pdf_in_original_and_destination, convert_to_float, \
+from CustomizedExceptions import RequestApprovalError, PendingPaymentError, AccountNumberError, ExtractedDataUnmatchError, UnsaveableError, \
+    InvoiceFolderError
+from Invoice_parser import create_parse_executor, submit_invoices_for_parsing, get_parsed_invoice
+from PDF_helper import prune_pdf_text_cache
+from Browser_pool import run_browser_pool, BrowserPoolError
+from Agreement_cache import AgreementCache
+from Batch_checkpoint import BatchCheckpoint, get_invoice_key, VALIDATED, SUBMITTING, SUBMITTED, PDF_COPIED, LEDGERED
+from Outcome_journal import OutcomeJournal, sync_excel_from_journal, SUCCEED, FUNDING_REQUESTED, FAILED, SAVED, DONE
+from scan_helper import copy_as_pdf_in_original_and_destination, convert_to_float, InvoicePDFIndex, \
     calculate_fiscal_year, months_to_next_fiscal_period, months_since_invoice
 
-TARGET_URL = "https://pps.mto.ad.gov.on.ca/Home.aspx"
 
-def login(driver):
+def read_login_configuration():
+    """
+    Reads the login email and password from the configuration file,
+    and applies the validation settings of the configuration file.
+    :return: (email, password)
+    """
+    ONTARIO_EMAIL = ""
+    ONTARIO_PASSWORD = ""
     try:
         with open(Global_variables.configuration_file_path, 'r') as f:
             lines = f.readlines()
@@ -48,6 +51,11 @@ def login(driver):
         print(f"Warning","Configuration file not found. A new one will be created on save.")
     except Exception as e:
         print(f"Error", f"Failed to load config: {str(e)}")
+    return ONTARIO_EMAIL, ONTARIO_PASSWORD
+
+
+def login(driver):
+    ONTARIO_EMAIL, ONTARIO_PASSWORD = read_login_configuration()
 
     # 2. Navigate to Microsoft login page.
     #    Often, just going to your target URL will redirect you to the MS login page,
@@ -97,224 +105,753 @@ def login(driver):
     except:
         print("No 'Stay signed in?' prompt appeared, continuing...")
 
+def create_driver(profile_dir_path=None):
+    """
+    Creates the Chrome driver with the browser options in Global_variables:
+    headless mode, image/font and stylesheet blocking, page load strategy and window size.
+    :param profile_dir_path: the Chrome profile folder, None for a temporary profile
+    """
+    options = webdriver.ChromeOptions()
+    if Global_variables.browser_headless:
+        options.add_argument("--headless=new")
+    options.add_argument(f"--window-size={Global_variables.browser_window_size[0]},{Global_variables.browser_window_size[1]}")
+    if Global_variables.browser_block_images:
+        options.add_experimental_option("prefs", {"profile.managed_default_content_settings.images": 2})
+    # 'eager' returns from driver.get once the DOM is ready, without waiting for images and fonts,
+    # the elements are waited for by WebDriverWait anyway
+    options.page_load_strategy = Global_variables.browser_page_load_strategy
+    if profile_dir_path is not None:
+        options.add_argument(f"--user-data-dir={os.path.abspath(profile_dir_path)}")
+
+    driver = webdriver.Chrome(options=options)
+
+    blocked_urls = []
+    if Global_variables.browser_block_images:
+        blocked_urls += ["*.woff", "*.woff2", "*.ttf", "*.otf"]
+    if Global_variables.browser_block_stylesheets:
+        blocked_urls += ["*.css"]
+    if len(blocked_urls) > 0:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": blocked_urls})
+    return driver
+
+
+def is_logged_in(driver, timeout=15) -> bool:
+    """
+    Checks whether the driver still has a valid PPS session, by opening the PPS home page once.
+    Without a session, PPS redirects to the Microsoft login page and the PPS tabs are missing.
+    With the 'eager' page load strategy, driver.get returns while the SSO redirects are still going,
+    so it waits for the end of the redirects: the PPS tabs, or the Microsoft login form waiting for the email.
+    """
+    driver.get(Global_variables.pps_url)
+    try:
+        WebDriverWait(driver, timeout).until(EC.any_of(
+            EC.presence_of_element_located((By.ID, "contentPlaceHolder_tabControl1_tabA4")),
+            EC.visibility_of_element_located((By.NAME, "loginfmt"))
+        ))
+    except TimeoutException:
+        # Stuck on another page, e.g. the account picker, login starts again from the login page
+        return False
+    return len(driver.find_elements(By.ID, "contentPlaceHolder_tabControl1_tabA4")) > 0
+
+
+class PPSSession:
+    """
+    One long-lived, logged-in browser.
+    The browser keeps its profile in 'profile_dir_path', so the Microsoft "Stay signed in" cookies
+    survive across batches and app restarts, and the full login only runs when the session expired.
+    """
+    def __init__(self, profile_dir_path):
+        self.profile_dir_path = profile_dir_path
+        self.driver = None
+
+    def _is_driver_alive(self) -> bool:
+        if self.driver is None:
+            return False
+        try:
+            # Raises if the browser was closed or crashed
+            self.driver.current_url
+            return True
+        except WebDriverException:
+            return False
+
+    def get_driver(self):
+        """Returns the logged-in driver, starting the browser or logging in again only when needed"""
+        if not self._is_driver_alive():
+            self.quit()
+            os.makedirs(self.profile_dir_path, exist_ok=True)
+            self.driver = create_driver(self.profile_dir_path)
+
+        if is_logged_in(self.driver):
+            # The validation settings are applied by login, so apply them here as well
+            read_login_configuration()
+        else:
+            login(self.driver)
+        return self.driver
+
+    def quit(self):
+        if self.driver is not None:
+            try:
+                self.driver.quit()
+            except WebDriverException:
+                pass
+            self.driver = None
+
+
+class PPSSessionPool:
+    """
+    The PPS sessions kept across batches, one per browser worker.
+    Every session has its own profile folder, because Chrome can not share a profile between browsers.
+    """
+    def __init__(self):
+        self.sessions = []
+        self.idle_sessions = []
+        self.busy_sessions = dict()
+        self.lock = threading.Lock()
+
+    def acquire_driver(self):
+        """Returns the logged-in driver of an idle session, a new session is created if none is idle"""
+        with self.lock:
+            if len(self.idle_sessions) > 0:
+                session = self.idle_sessions.pop()
+            else:
+                session = PPSSession(os.path.join(Global_variables.browser_profile_dir_path,
+                                                  f"Worker {len(self.sessions) + 1}"))
+                self.sessions.append(session)
+        try:
+            driver = session.get_driver()
+        except Exception:
+            session.quit()
+            with self.lock:
+                self.idle_sessions.append(session)
+            raise
+        with self.lock:
+            self.busy_sessions[id(driver)] = session
+        return driver
+
+    def release_driver(self, driver):
+        """Gives the driver back, the browser stays open and logged in for the next batch"""
+        with self.lock:
+            self.idle_sessions.append(self.busy_sessions.pop(id(driver)))
+
+    def quit_all(self):
+        """Closes every browser, called when the app quits"""
+        with self.lock:
+            for session in self.sessions:
+                session.quit()
+
+
+# The browsers kept across batches of the app
+pps_sessions = PPSSessionPool()
+
+
 def get_invoice_dir_path():
     try:
         with open(Global_variables.configuration_file_path, 'r') as f:
             lines = f.readlines()
-            return lines[2].strip() if len(lines) > 1 else ""
+            return lines[2].strip() if len(lines) > 2 else ""
     except FileNotFoundError:
         print(f"Warning","Configuration file not found. A new one will be created on save.")
     except Exception as e:
         print(f"Error", f"Failed to load config: {str(e)}")
 
 
-def pps_multiple_invoices_input(invoices_todo_lst):
+def pps_multiple_invoices_input(invoices_todo_lst, on_progress=None, cancel_event=None):
     """
     This function takes the invoice number in 'Invoice To Do.xlsx' and invoice pdf in 'Invoice PDF' as input,
     automatically input into PPS, generated a named pdf into 'Temp Hydro Invoices', and recorded in 'Succeed Invoices'.
     If an account has no enough fund to pay or already has a payment on pending, it will be recorded in 'Saved Invoices'.
     If an unexpected error happened during the inputting process, it will be recorded in 'Failed Invoices'
+    :param on_progress: a function of (account_number, outcome, finished_count, total_count), called once per invoice,
+        outcome is SUCCEED, FUNDING_REQUESTED, FAILED, SAVED, DONE, or None if the invoice stays in To Do
+    :param cancel_event: a threading.Event, once set the invoices in progress are finished and the others stay in To Do
     """
-    # Read email and password from config
+    # Skip empty invoices and empty vendor invoices
+    # invoice[0] is account number, invoice[1] is vendor
+    invoices_todo_lst = [invoice for invoice in invoices_todo_lst
+                         if invoice is not None and invoice[0] is not None
+                         and invoice[1] is not None and invoice[1].replace(" ", "") != ""]
+    if len(invoices_todo_lst) == 0:
+        return
+
+    # Without the invoice folder every invoice would fail, so the batch stops before anything is changed
+    invoice_dir_path = get_invoice_dir_path()
+    if not invoice_dir_path:
+        raise InvoiceFolderError("The invoice PDF folder is not configured, set it in the configuration")
+    if not os.path.isdir(invoice_dir_path):
+        raise InvoiceFolderError(f"The invoice PDF folder '{invoice_dir_path}' is not found")
+
+    # List the invoice folder once for the whole batch
+    invoice_pdf_index = InvoicePDFIndex(invoice_dir_path)
+    # The texts of bills not scanned for a long time are not needed any more
+    prune_pdf_text_cache()
+
+    # The state of every invoice is checkpointed, so a batch stopped by a crash resumes where it stopped
+    with BatchCheckpoint() as checkpoint:
+        # Scan all invoice PDFs in worker processes, while the browsers log in and input invoices
+        executor = create_parse_executor(len(invoices_todo_lst))
+        is_completed = False
+        try:
+            parse_futures = submit_invoices_for_parsing(executor, invoices_todo_lst, invoice_pdf_index, checkpoint)
+            invoice_keys = get_invoice_keys(invoices_todo_lst, invoice_pdf_index)
+
+            # What is read from an agreement is reused by the next bills of the same account
+            agreement_cache = AgreementCache()
+
+            # Outcomes are journaled per invoice, and written into the Excel files when the batch ends
+            finished_invoices = []
+            with OutcomeJournal() as journal:
+                def report_progress(invoice, outcome):
+                    finished_invoices.append(invoice)
+                    if on_progress is not None:
+                        on_progress(invoice[0], outcome, len(finished_invoices), len(invoices_todo_lst))
+
+                def on_result(invoice, result):
+                    if isinstance(result, BrowserPoolError):
+                        # Never inputted, the invoice stays in To Do
+                        print(f"{result}: {invoice[0]}")
+                        report_progress(invoice, None)
+                        return
+                    if isinstance(result, Exception):
+                        result = (FAILED, (invoice[0], "Please report this problem to the developer, " + type(result).__name__))
+                    outcome, row = result
+                    if outcome is not None:
+                        journal.record(outcome, invoice[0], row)
+                    journal.record(DONE, invoice[0], checkpoint_key=invoice_keys[id(invoice)])
+                    if invoice_keys[id(invoice)] is not None:
+                        checkpoint.record(invoice_keys[id(invoice)], LEDGERED)
+                    report_progress(invoice, DONE if outcome is None else outcome)
+
+                def preflight(invoice, parse_future, driver):
+                    return preflight_todo_invoice(invoice, parse_future, driver, agreement_cache,
+                                                  checkpoint, invoice_keys[id(invoice)])
+
+                def input_invoice(invoice, parse_future, driver):
+                    return input_todo_invoice(invoice, parse_future, driver, agreement_cache,
+                                              checkpoint, invoice_keys[id(invoice)])
+
+                items = list(zip(invoices_todo_lst, parse_futures))
+                if Global_variables.preflight_check:
+                    # Reject duplicates, pending payments and 'Do not pay' agreements before any form is filled
+                    passed_invoice_ids = set()
+
+                    def on_preflight_result(invoice, result):
+                        if result is None or (isinstance(result, Exception) and not isinstance(result, BrowserPoolError)):
+                            # Passed, or could not be checked, the input checks it again anyway
+                            passed_invoice_ids.add(id(invoice))
+                        else:
+                            on_result(invoice, result)
+
+                    run_browser_pool(items, Global_variables.browser_workers,
+                                     pps_sessions.acquire_driver, pps_sessions.release_driver, preflight, on_preflight_result,
+                                     cancel_event)
+                    items = [item for item in items if id(item[0]) in passed_invoice_ids]
+
+                # Input the invoices with a pool of logged-in browsers, which stay open for the next batch
+                if cancel_event is not None and cancel_event.is_set():
+                    # Cancelled during the pre-flight check, nothing is inputted
+                    for invoice, parse_future in items:
+                        on_result(invoice, BrowserPoolError("The batch was cancelled"))
+                elif len(items) > 0:
+                    run_browser_pool(items, Global_variables.browser_workers,
+                                     pps_sessions.acquire_driver, pps_sessions.release_driver, input_invoice, on_result,
+                                     cancel_event)
+            is_completed = True
+        finally:
+            # Waits for the scans in progress, so no parse callback writes into the checkpoint after it is closed.
+            # The PDFs of a cancelled or failed batch are not scanned any further
+            executor.shutdown(cancel_futures=not is_completed or (cancel_event is not None and cancel_event.is_set()))
 
+        # Only the invoices which are not ledgered are kept, e.g. left in To Do, or submitted by a crashed batch
+        checkpoint.finish()
 
-    # Login in
-    driver = webdriver.Chrome()
-    login(driver)
+    # A locked Excel file does not fail anything, it is written on the next sync
+    if not sync_excel_from_journal():
+        print("Some Excel files are open in Excel, they are updated on the next refresh")
 
-    succeed_invoices = []
 
-    # Iterate all invoices
+def get_invoice_keys(invoices_todo_lst, invoice_pdf_index) -> dict:
+    """Returns id(invoice) -> the key of the invoice in the BatchCheckpoint, None if its PDF is not found"""
+    invoice_keys = dict()
     for invoice in invoices_todo_lst:
-        # invoice[0] is account number, invoice[1] is vendor
-        print('-----------------------------')
-        if invoice is None or invoice[0] is None:
-            continue
+        try:
+            invoice_keys[id(invoice)] = get_invoice_key(invoice[0], invoice_pdf_index.find(invoice[0]))
+        except (UnsaveableError, OSError):
+            invoice_keys[id(invoice)] = None
+    return invoice_keys
 
-        # Skip empty vendor invoice
-        if invoice[1] is None or invoice[1].replace(" ", "") == "":
-            continue
 
-        print(f"Start inputting '{invoice[0]}'")
-        info = None
+def input_invoice_into_pps(results, driver, agreement_cache=None, before_write=None) -> int:
+    """
+    Input the scanned invoice into PPS, with plain HTTP postbacks if 'pps_http_client' is enabled,
+    otherwise (or if the HTTP client gives up before writing anything) with the browser.
+    :param agreement_cache: the AgreementCache of the batch
+    :param before_write: a function called before the first change is made in PPS
+    :return: 1 indicates requested funding, 2 indicates requested payment approval
+    """
+    if Global_variables.pps_http_client:
+        # requests is only needed when the HTTP client is enabled
+        from PPS_http_client import PPSHttpClient, PPSHttpFallback, http_single_invoice_input
         try:
-            # Scan the invoice PDF and extract the data
-            pdf_file_path = find_file_with_substring(get_invoice_dir_path(), str(invoice[0]))
-            # Use right invoice scanning method
-            if invoice[1] == "Alectra":
-                results = parse_alectra_bill(pdf_file_path)
-            elif invoice[1] == "Burlington Hydro":
-                results = parse_burlington_hydro_bill(pdf_file_path)
-            elif invoice[1] == "Elexicon":
-                results = parse_elexicon_bill(pdf_file_path)
-            elif invoice[1] == "Fortis":
-                results = parse_fortis_bill(pdf_file_path)
-            elif invoice[1] == "Grimsby":
-                results = parse_grimsby_bill(pdf_file_path)
-            elif invoice[1] == "Hydro One":
-                results = parse_hydro_one_bill(pdf_file_path)
-            elif invoice[1] == "NPE":
-                results = parse_NPE_bill(pdf_file_path)
-            elif invoice[1] == "NTP":
-                results = parse_NTP_bill(pdf_file_path)
-            elif invoice[1] == "Toronto Hydro":
-                results = parse_toronto_hydro_bill(pdf_file_path)
-            elif invoice[1] == "Welland":
-                results = parse_welland_bill(pdf_file_path)
-            elif invoice[1] == "Grimsby":
-                results = parse_grimsby_bill(pdf_file_path)
-            else:
-                print(f"Invalid Vendor Name: {invoice[1]}")
-                raise UnsaveableError(invoice[0], 'Invalid vendor name')
+            return http_single_invoice_input(results, PPSHttpClient.from_driver(driver), agreement_cache, before_write)
+        except PPSHttpFallback as e:
+            print(f"HTTP input of {results['account_number']} falls back to the browser: {e}")
+    return pps_single_invoice_input(results, driver, agreement_cache, before_write)
+
+
+def read_agreement(driver, results, agreement):
+    """Opens the agreement and reads its comments and invoice history into its snapshot, without writing anything"""
+    description = open_agreement(driver, results, agreement)
+    agreement.comments = description.get_attribute("value")
+
+    # Press 'invoice' to see all invoices
+    WebDriverWait(driver, 10).until(
+        EC.visibility_of_element_located((By.ID, "tabControl_InvoicesTab_HyperLink"))
+    ).click()
+    table = WebDriverWait(driver, 10).until(
+        EC.presence_of_element_located((By.ID, "contentPlaceHolder_invoiceControl_invoices"))
+    )
+    agreement.invoice_rows = snapshot_table(driver, table)
+
+
+def read_agreement_for_preflight(driver, results, agreement):
+    """Reads the agreement with plain HTTP requests if 'pps_http_client' is enabled, otherwise with the browser"""
+    if Global_variables.pps_http_client:
+        from PPS_http_client import PPSHttpClient, PPSHttpFallback, http_read_agreement
+        try:
+            http_read_agreement(results, PPSHttpClient.from_driver(driver), agreement)
+            return
+        except PPSHttpFallback as e:
+            print(f"HTTP pre-flight check of {results['account_number']} falls back to the browser: {e}")
+    read_agreement(driver, results, agreement)
+
+
+def preflight_todo_invoice(invoice, parse_future, driver, agreement_cache, checkpoint=None, invoice_key=None):
+    """
+    Checks one todo invoice against the agreement of its account before anything is typed into PPS.
+    The agreement is read once per account, the next bills of the account are checked against its snapshot.
+    :param checkpoint: the BatchCheckpoint of the batch, an invoice validated by an interrupted run is not checked again
+    :param invoice_key: the key of the invoice in the checkpoint
+    :return: (FAILED, row) if the invoice is rejected, None if it is to be inputted
+    """
+    if checkpoint is not None and invoice_key is not None and checkpoint.has_reached(invoice_key, VALIDATED):
+        return None
 
+    pdf_file_path, results, error = get_parsed_invoice(parse_future)
+    if error is not None:
+        # Reported by input_todo_invoice, without opening PPS
+        return None
+
+    agreement = agreement_cache.get(results["account_number"])
+    try:
+        if agreement.invoice_rows is None:
+            read_agreement_for_preflight(driver, results, agreement)
+        check_agreement_comments(agreement.comments, results)
+        check_invoice_history(agreement.invoice_rows, results)
+
+        # Two bills of the same month in this batch
+        invoice_number = get_pps_invoice_number(results)
+        if invoice_number in agreement.batch_invoice_numbers:
+            raise UnsaveableError(results['account_number'], f"{results['suggested_file_name']} is already in this batch")
+        agreement.batch_invoice_numbers.add(invoice_number)
+    except UnsaveableError as e:
+        print(f"Pre-flight check rejected '{invoice[0]}': {e.message}")
+        return FAILED, (invoice[0], e.message)
+    if checkpoint is not None and invoice_key is not None:
+        checkpoint.record(invoice_key, VALIDATED)
+    return None
+
+
+def input_todo_invoice(invoice, parse_future, driver, agreement_cache=None, checkpoint=None, invoice_key=None):
+    """
+    Input one todo invoice into PPS with the driver.
+    An invoice stopped by a crash is resumed from its checkpoint: it is never inputted into PPS twice,
+    and an invoice which may be half inputted is failed, to be checked in PPS by hand.
+    :param invoice: [account number, vendor]
+    :param parse_future: the future of the scanned invoice PDF, see submit_invoices_for_parsing
+    :param agreement_cache: the AgreementCache of the batch
+    :param checkpoint: the BatchCheckpoint of the batch
+    :param invoice_key: the key of the invoice in the checkpoint
+    :return: (outcome, row) to be recorded in the outcome journal, outcome is None if nothing is recorded
+    """
+    print('-----------------------------')
+    print(f"Start inputting '{invoice[0]}'")
+    is_checkpointed = checkpoint is not None and invoice_key is not None
+    state = checkpoint.get_state(invoice_key) if is_checkpointed else None
+
+    def record(new_state, **data):
+        if is_checkpointed:
+            checkpoint.record(invoice_key, new_state, **data)
+
+    try:
+        # Wait for the scanned and checked data of the invoice PDF
+        pdf_file_path, results, error = get_parsed_invoice(parse_future)
+
+        if results is not None:
             for key, value in results.items():
                 print(f"{key}: {value}")
 
-            # Check invoice[0] (account number) match the account number in PDF
-            if invoice[0] not in results['account_number']:
-                raise UnsaveableError(invoice[0], f"The data in file named '{invoice[0]}' contains the data of '{results['account_number']}'")
+        if error is not None:
+            raise error
 
-            # Check data is reasonable or not
-            if not self_check(results):
-                raise AmountError(invoice[0])
-
-            # Input data into PPS
-            indicator = pps_single_invoice_input(results, driver)
+        # Input data into PPS, unless it was inputted before the last run stopped
+        if state == SUBMITTING:
+            raise UnsaveableError(invoice[0], "The last run stopped while inputting it, check the invoice in PPS")
+        elif state in (SUBMITTED, PDF_COPIED):
+            indicator = checkpoint.get_data(invoice_key)["indicator"]
+            print(f"'{invoice[0]}' was inputted before the last run stopped")
+        else:
+            indicator = input_invoice_into_pps(results, driver, agreement_cache, lambda: record(SUBMITTING))
+            record(SUBMITTED, indicator=indicator)
 
-            # Rename the PDF, save into "Temp Hydro Invoices"
+        # Rename the PDF, save into "Temp Hydro Invoices"
+        if state != PDF_COPIED:
             copy_as_pdf_in_original_and_destination(pdf_file_path,
                                                     Global_variables.renamed_invoices_dir_path,
                                                     results["suggested_file_name"])
+            record(PDF_COPIED)
 
-            info = (results["account_number"], results["suggested_file_name"][-7:], results["invoice_subtotal"])
+        info = (results["account_number"], results["suggested_file_name"][-7:], results["invoice_subtotal"])
 
-        except UnsaveableError as e:
-            insert_tuples_in_excel(Global_variables.failed_invoices_excel_path,
-                "Sheet1", [(invoice[0], e.message)])
-            continue
+    except UnsaveableError as e:
+        return FAILED, (invoice[0], e.message)
 
-        except RequestApprovalError as e:
-            populate_invoice_numbers(Global_variables.saved_invoices_excel_path,
-                "Sheet1", "Invoice Number", [invoice[0]])
-            print(f"RequestApprovalError: {invoice[0]}")
-            continue
+    except RequestApprovalError as e:
+        print(f"RequestApprovalError: {invoice[0]}")
+        return SAVED, None
 
-        except PermissionError as e:
-            insert_tuples_in_excel(Global_variables.failed_invoices_excel_path,
-                "Sheet1", [(invoice[0], "Permission denied")])
-            continue
+    except PermissionError as e:
+        return FAILED, (invoice[0], "Permission denied")
+
+    except AttributeError as e:
+        return FAILED, (invoice[0], "Invoice file not found in folder")
+
+    except Exception as e:
+        print(f"{type(e).__name__}: {invoice[0]}")
+        print(str(e))
+        return FAILED, (invoice[0], "Please report this problem to the developer, " + type(e).__name__)
+
+    if indicator == 2:
+        print(f"{info[0]} is successfully inputted")
+        return SUCCEED, info
+    elif indicator == 1:
+        print(f"{info[0]} is successfully requested for funding, and payment is saved as draft")
+        return FUNDING_REQUESTED, info
+    return None, None
+
+# Returns the text of every cell of the table, one list per row, like
+# [[td.text for td in tr.find_elements("td")] for tr in table.find_elements("tr")]
+SNAPSHOT_TABLE_SCRIPT = """
+return Array.from(arguments[0].querySelectorAll('tr'), function (row) {
+    return Array.from(row.querySelectorAll('td'), function (cell) { return cell.innerText.trim(); });
+});
+"""
+
+# Returns the first element matching the selector in one cell of the table, or null
+GET_TABLE_CELL_ELEMENT_SCRIPT = """
+var row = arguments[0].querySelectorAll('tr')[arguments[1]];
+var cell = row ? row.querySelectorAll('td')[arguments[2]] : null;
+return cell ? cell.querySelector(arguments[3]) : null;
+"""
+
+
+def snapshot_table(driver, table) -> list:
+    """
+    Reads the whole table in one call, instead of one call per row and per cell.
+    :param table: the table element
+    :return: a list of rows, each a list of the cell texts, rows without cells are empty lists
+    """
+    return driver.execute_script(SNAPSHOT_TABLE_SCRIPT, table)
+
+
+def get_table_cell_element(driver, table, row_index, cell_index, selector):
+    """
+    Returns the element matching the CSS selector in the cell of snapshot_table(...)[row_index][cell_index].
+    Raises NoSuchElementException if there is no such element, the same as find_element.
+    """
+    element = driver.execute_script(GET_TABLE_CELL_ELEMENT_SCRIPT, table, row_index, cell_index, selector)
+    if element is None:
+        raise NoSuchElementException(f"No '{selector}' in cell {cell_index} of row {row_index}")
+    return element
+
+
+def wait_for_postback(driver, element, timeout=10):
+    """
+    Waits until the ASP.NET postback started by clicking 'element' is complete,
+    i.e. the page (or its update panel) is replaced and 'element' is detached from it.
+    :return: False if no postback happened within 'timeout' seconds
+    """
+    try:
+        WebDriverWait(driver, timeout).until(EC.staleness_of(element))
+        return True
+    except TimeoutException:
+        return False
+
+
+def wait_for_new_element(driver, locator, old_elements, timeout=10):
+    """
+    Waits until an element matching 'locator' is on the page and is not one of 'old_elements',
+    whether it was rendered by a postback or added by a script without one.
+    :param old_elements: the elements matching 'locator' before the click, from find_elements
+    :return: the new element
+    """
+    def find_new_element(driver):
+        for element in driver.find_elements(*locator):
+            if element not in old_elements:
+                return element
+        return False
+
+    return WebDriverWait(driver, timeout).until(find_new_element)
+
+
+def fill_invoice_line_and_confirm(driver, line_type, amount, max_attempts=3):
+    """
+    Adds one line item to the invoice, and presses 'Update' until PPS accepts the amount.
+    Every step waits for the postback of the previous one instead of sleeping, and the amount is
+    only typed again when PPS answers with "Line Amount is mandatory.".
+    :param line_type: the visible text of the line type, e.g. "Electricity"
+    :param amount: the line amount
+    """
+    amount_text = str(amount).replace(",", "")
+
+    # Press 'Add New Line', and wait for the line type dropdown of the new line,
+    # not for a postback, the new line may be added without one
+    new_line_button = WebDriverWait(driver, 10).until(
+        EC.visibility_of_element_located((By.ID, "contentPlaceHolder_ContentPlaceHolder1_invoiceLines_newLine"))
+    )
+    dropdown_locator = (By.ID, "contentPlaceHolder_ContentPlaceHolder1_invoiceLines_accountDescription")
+    old_dropdowns = driver.find_elements(*dropdown_locator)
+    new_line_button.click()
+
+    # Select amount type
+    dropdown_menu = wait_for_new_element(driver, dropdown_locator, old_dropdowns)
+    Select(dropdown_menu).select_by_visible_text(line_type)
+
+    mandatory_message = (By.XPATH, "//li[normalize-space()='Line Amount is mandatory.']")
+    for attempt in range(max_attempts):
+        # Input amount
+        amount_input = WebDriverWait(driver, 10).until(
+            EC.visibility_of_element_located((By.ID, "contentPlaceHolder_ContentPlaceHolder1_invoiceLines_amount"))
+        )
+        amount_input.clear()
+        amount_input.send_keys(amount_text)
+        # Press 'Update'
+        save_button = WebDriverWait(driver, 10).until(
+            EC.visibility_of_element_located((By.ID, "contentPlaceHolder_ContentPlaceHolder1_invoiceLines_btnSave"))
+        )
+        old_messages = driver.find_elements(*mandatory_message)
+        save_button.click()
+        # The line is saved by a postback, or rejected by the validator, which renders its message again
+        if len(old_messages) == 0:
+            answered = EC.any_of(EC.staleness_of(save_button), EC.visibility_of_element_located(mandatory_message))
+        else:
+            answered = EC.any_of(EC.staleness_of(save_button), *[EC.staleness_of(message) for message in old_messages])
+        WebDriverWait(driver, 10).until(answered)
 
-        except AttributeError as e:
-            insert_tuples_in_excel(Global_variables.failed_invoices_excel_path,
-                                   "Sheet1", [(invoice[0], "Invoice file not found in folder")])
+        # Check if amount inputted succeed
+        if not driver.find_elements(*mandatory_message):
+            return
+        print(f"'{line_type}' line amount was not accepted, typing it again")
+
+
+def click_until_gone(driver, element_id, max_attempts=5):
+    """
+    Clicks the button until its postback moves to a page without it.
+    PPS sometimes ignores the first click, so the button is clicked again only when
+    it is still there after the postback, instead of clicking on a fixed interval.
+    """
+    for attempt in range(max_attempts):
+        buttons = [button for button in driver.find_elements(By.ID, element_id) if button.is_displayed()]
+        if len(buttons) == 0:
+            return
+        try:
+            buttons[0].click()
+        except (StaleElementReferenceException, ElementClickInterceptedException):
+            # The page is being replaced, check again
             continue
+        wait_for_postback(driver, buttons[0])
+
+
+def get_pps_invoice_number(results) -> str:
+    """The invoice number entered in PPS, account number + two-letter month + two-digit year"""
+    return results["account_number"].replace("-", "").replace(' ', '') + convert_month_abbr(results["suggested_file_name"][-7:-4]) + results["suggested_file_name"][-2:]
+
+
+def find_approved_row(rows, results) -> int:
+    """
+    Returns the index of the only 'Approved' row of the account search results.
+    :param rows: the account search results, see snapshot_table
+    """
+    approved_rows = []
+    for row_index, cells in enumerate(rows):
+        # We need at least 2 cells: first cell is clickable text, second cell is 'Approved' or 'Completed'
+        if len(cells) >= 2:
+            status_text = cells[1].strip()
+            if status_text == "Approved":
+                approved_rows.append(row_index)
+
+    # Check if exactly one row has 'Approved'
+    if len(approved_rows) != 1:
+        raise UnsaveableError(results['account_number'], 'Expected to find only one approved account, but found zero or more than one approved account')
+    return approved_rows[0]
 
-        except Exception as e:
-            insert_tuples_in_excel(Global_variables.failed_invoices_excel_path,
-            "Sheet1", [(invoice[0], "Please report this problem to the developer, " + type(e).__name__)])
-            print(f"{type(e).__name__}: {invoice[0]}")
-            print(str(e))
+
+def check_agreement_comments(comments, results):
+    """Raises if 'Do not pay' is written in the comments of the agreement"""
+    comments = comments.replace(' ', '').replace('-', '').replace("'", '')
+    if 'DONOTPAY' in comments or 'DONTPAY' in comments:
+        raise UnsaveableError(results['account_number'], "Found 'Do not pay' in comments")
+
+
+def check_invoice_history(rows, results):
+    """
+    Raises if any payment is pending, if the account haven't been paid for a long time,
+    or if the invoice number of the bill already exists.
+    :param rows: the invoices table of the agreement, see snapshot_table
+    """
+    asserted_invoice_rows = []
+    index = 0
+    is_period_checked = False
+    for cells in rows:
+        if len(cells) <= 9:
+            continue
+        # Check if last element contains text 'Pending Payment'
+        status_text = cells[9].strip()
+        if status_text == "Pending Payment" and index < 40:
+            raise PendingPaymentError(results["account_number"])
+        # Check first two asserted invoices, check if they haven't been paid for a long time
+        elif status_text == "Asserted":
+            asserted_invoice_rows.append(cells)
+            if Global_variables.is_period_validation_needed and not is_period_checked and months_since_invoice(cells[0].strip()) >= 5:
+                raise UnsaveableError(results["account_number"], "This account haven't been paid for a long time")
+            is_period_checked = True
+
+        invoice_number_text = cells[0].strip()
+        if invoice_number_text.replace("-", "").replace(' ', '') == get_pps_invoice_number(results)\
+                and status_text != 'Cancelled':
+            raise UnsaveableError(results['account_number'], f"{results['suggested_file_name']} is already exists")
+        index += 1
+
+
+def get_fiscal_year_remaining(remaining, rows, current_fiscal_year) -> float:
+    """
+    Returns the remaining funding of the fiscal year, the amounts of the later fiscal years are reserved.
+    :param remaining: the remaining funding of the whole agreement
+    :param rows: the fiscal grid, see snapshot_table
+    """
+    is_future_fiscal_year = False
+    for cells in rows:
+        if len(cells) < 3:
             continue
 
-        else:
-            if info is not None:
-                if indicator == 2:
-                    print(f"{info[0]} is successfully inputted")
-                    insert_tuples_in_excel(Global_variables.succeed_invoices_excel_path,
-                        "Sheet1", [info])
-                elif indicator == 1:
-                    print(f"{info[0]} is successfully requested for funding, and payment is saved as draft")
-                    insert_tuples_in_excel(Global_variables.funding_requested_excel_path,
-                        "Sheet1", [info])
-        finally:
-            delete_cell_content_if_matches(Global_variables.todo_invoices_excel_path,
-                "Sheet1", "Invoice Number", invoice[0])
-    driver.quit()
+        if is_future_fiscal_year:
+            remaining -= convert_to_float(cells[1].strip())
+        # Check if the fiscal year is current fiscal year'
+        fiscal_year = cells[0].strip()
+        if fiscal_year == current_fiscal_year:
+            is_future_fiscal_year = True
 
-def pps_single_invoice_input(results, driver=None) -> int:
+    return round(remaining, 2)
+
+
+def open_agreement_by_search(driver, results, agreement):
+    """Searches the account number from the home page, and opens its only approved agreement"""
+    driver.get(Global_variables.pps_url)
+
+    # Wait for the link to be present in the DOM
+    wait = WebDriverWait(driver, 10)  # up to 10 seconds
+
+    driver.find_element(By.ID, "contentPlaceHolder_tabControl1_tabA4").click()
+    view_update_link = wait.until(EC.element_to_be_clickable((
+        By.XPATH,
+        '//a[@class="homeLink" and contains(@href, "AwardTypeId=8")][text()="View/Update"]'
+    )))
+    # Click the link
+    view_update_link.click()
+
+    # Input account number
+    account_number_input_bar = WebDriverWait(driver, 10).until(
+        EC.visibility_of_element_located((By.ID, "contentPlaceHolder_utilityAccount"))
+    )
+    search_url = driver.current_url
+    account_number_input_bar.clear()
+    account_number_input_bar.send_keys(results["account_number"].replace("-", "").replace(" ", ""))
+
+    # Press 'search' for account number
+    WebDriverWait(driver, 10).until(
+        EC.visibility_of_element_located((By.ID, "contentPlaceHolder_pbSearch"))
+    ).click()
+
+    # Wait for results table and process rows
+    table = wait.until(
+        EC.presence_of_element_located((By.ID, "contentPlaceHolder_searchResult"))
+    )
+
+    # Get all rows inside the table
+    rows = snapshot_table(driver, table)
+
+    # Find the first cell of the only approved row and click the clickable link inside it
+    # Typically the first cell might contain a link, e.g. <td><a>Clickable Text</a></td>
+    clickable_link = get_table_cell_element(driver, table, find_approved_row(rows, results), 0, "a")
+    clickable_link.click()
+    print("Clicked on the only row with 'Approved'.")
+
+    description = WebDriverWait(driver, 10).until(
+        EC.visibility_of_element_located((By.ID, "contentPlaceHolder_agreementControl_ctl00_description"))
+    )
+    agreement.set_agreement_url(driver.current_url, search_url)
+    return description
+
+
+def open_agreement(driver, results, agreement):
+    """
+    Opens the only approved agreement of the account, by its URL if it was opened before in this run.
+    :return: the comments element of the agreement
+    """
+    if agreement.agreement_url is not None:
+        driver.get(agreement.agreement_url)
+        try:
+            return WebDriverWait(driver, 5).until(
+                EC.visibility_of_element_located((By.ID, "contentPlaceHolder_agreementControl_ctl00_description"))
+            )
+        except TimeoutException:
+            # The URL does not open the agreement anymore, e.g. the session was renewed
+            agreement.agreement_url = None
+    return open_agreement_by_search(driver, results, agreement)
+
+
+def pps_single_invoice_input(results, driver=None, agreement_cache=None, before_write=None) -> int:
     """
     :param results:
     :param driver:
+    :param agreement_cache: the AgreementCache of the batch, the agreement is read again for every invoice if None
+    :param before_write: a function called before the first change is made in PPS, e.g. to checkpoint the invoice
     :return: 1 indicates requested funding, 2 indicates requested payment approval
     """
     # Check if amount is greater that the maximum amount threshold
     if convert_to_float(results["amount_due"]) > Global_variables.maximum_payment_amount:
         raise UnsaveableError(results['account_number'], "Exceeds maximum amount threshold")
 
+    agreement = (AgreementCache() if agreement_cache is None else agreement_cache).get(results["account_number"])
+    # The comments of an agreement already opened in this run are checked before opening it again
+    if agreement.comments is not None:
+        check_agreement_comments(agreement.comments, results)
+
     # 1. Launch browser (make sure you have installed ChromeDriver or another WebDriver)
     quit_after = False
     if driver is None:
-        driver = webdriver.Chrome()
+        driver = create_driver()
         quit_after = True
         login(driver)
 
     try:
-        # 8. Now that you’re logged in, navigate to your actual target URL
-        driver.get(TARGET_URL)
-
-        # 9. At this point, you should be in your authenticated session.
-
-        # Wait for the link to be present in the DOM
-        wait = WebDriverWait(driver, 10)  # up to 10 seconds
-
-        driver.find_element(By.ID, "contentPlaceHolder_tabControl1_tabA4").click()
-        view_update_link = wait.until(EC.element_to_be_clickable((
-            By.XPATH,
-            '//a[@class="homeLink" and contains(@href, "AwardTypeId=8")][text()="View/Update"]'
-        )))
-        # Click the link
-        view_update_link.click()
-
-        # Input account number
-        account_number_input_bar = WebDriverWait(driver, 10).until(
-            EC.visibility_of_element_located((By.ID, "contentPlaceHolder_utilityAccount"))
-        )
-        account_number_input_bar.clear()
-        account_number_input_bar.send_keys(results["account_number"].replace("-", "").replace(" ", ""))
-
-        # Press 'search' for account number
-        WebDriverWait(driver, 10).until(
-            EC.visibility_of_element_located((By.ID, "contentPlaceHolder_pbSearch"))
-        ).click()
-
-        # Wait for results table and process rows
-        table = wait.until(
-            EC.presence_of_element_located((By.ID, "contentPlaceHolder_searchResult"))
-        )
-
-        # Get all rows inside the table
-        rows = table.find_elements(By.TAG_NAME, "tr")
-
-        approved_rows = []
-        for row in rows:
-            # Find all cells in the row
-            cells = row.find_elements(By.TAG_NAME, "td")
-
-            # We need at least 2 cells: first cell is clickable text, second cell is 'Approved' or 'Completed'
-            if len(cells) >= 2:
-                status_text = cells[1].text.strip()
-                if status_text == "Approved":
-                    approved_rows.append(row)
-
-            # Check if exactly one row has 'Approved'
-        if len(approved_rows) == 1:
-            # Find the first cell of that row and click the clickable link inside it
-            row = approved_rows[0]
-            # Typically the first cell might contain a link, e.g. <td><a>Clickable Text</a></td>
-            first_cell = row.find_elements(By.TAG_NAME, "td")[0]
-            clickable_link = first_cell.find_element(By.TAG_NAME, "a")
-            clickable_link.click()
-            print("Clicked on the only row with 'Approved'.")
-        else:
-            raise UnsaveableError(results['account_number'], 'Expected to find only one approved account, but found zero or more than one approved account')
+        # 8. Now that you’re logged in, navigate to the agreement
+        description = open_agreement(driver, results, agreement)
 
         # Check if 'Do not pay' is written in comments
-        comments = WebDriverWait(driver, 10).until(
-            EC.visibility_of_element_located((By.ID, "contentPlaceHolder_agreementControl_ctl00_description"))
-        ).get_attribute("value")
-        comments = comments.replace(' ', '').replace('-', '').replace("'", '')
-        if 'DONOTPAY' in comments or 'DONTPAY' in comments:
-            raise UnsaveableError(results['account_number'], "Found 'Do not pay' in comments")
+        if agreement.comments is None:
+            agreement.comments = description.get_attribute("value")
+            check_agreement_comments(agreement.comments, results)
 
         # Press 'invoice' to see all invoices
         WebDriverWait(driver, 10).until(
@@ -322,54 +859,33 @@ def pps_single_invoice_input(results, driver=None) -> int:
         ).click()
 
         # Check if any payment is pending and if the suggested invoice number exists
-        table = wait.until(
+        table = WebDriverWait(driver, 10).until(
             EC.presence_of_element_located((By.ID, "contentPlaceHolder_invoiceControl_invoices"))
         )
-        # Get all rows inside the table
-        rows = table.find_elements(By.TAG_NAME, "tr")
-        asserted_invoice_rows = []
-        index = 0
-        is_period_checked = False
-        for row in rows:
-            # Find all cells in the row
-            cells = row.find_elements(By.TAG_NAME, "td")
-            if len(cells) <= 9:
-                continue
-            # Check if last element contains text 'Pending Payment'
-            status_text = cells[9].text.strip()
-            if status_text == "Pending Payment" and index < 40:
-                raise PendingPaymentError(results["account_number"])
-            # Check first two asserted invoices, check if they haven't been paid for a long time
-            elif status_text == "Asserted":
-                asserted_invoice_rows.append(cells)
-                if Global_variables.is_period_validation_needed and not is_period_checked and months_since_invoice(cells[0].text.strip()) >= 5:
-                    raise UnsaveableError(results["account_number"], "This account haven't been paid for a long time")
-                is_period_checked = True
-
-            invoice_number_text = cells[0].text.strip()
-            if invoice_number_text.replace("-", "").replace(' ', '') == results["account_number"].replace("-", "").replace(' ', '') + convert_month_abbr(results["suggested_file_name"][-7:-4]) + results["suggested_file_name"][-2:]\
-                    and status_text != 'Cancelled':
-                raise UnsaveableError(results['account_number'], f"{results['suggested_file_name']} is already exists")
-            index += 1
-
-        # Check if enough funding in account
+        agreement.invoice_rows = snapshot_table(driver, table)
+        check_invoice_history(agreement.invoice_rows, results)
+
+        # Check if enough funding in account, unless the funding read for the last invoice of the account is enough
         indicator = 2
-        requested = check_and_request_funding(driver, results)
-        if requested:
-            indicator = 1
+        if not agreement.has_funding_for(results, calculate_fiscal_year(results['statement_date'])):
+            requested = check_and_request_funding(driver, results, agreement, before_write)
+            if requested:
+                indicator = 1
 
-        # Press 'invoice' to see all invoices
-        WebDriverWait(driver, 10).until(
-            EC.visibility_of_element_located((By.ID, "tabControl_InvoicesTab_HyperLink"))
-        ).click()
+            # Press 'invoice' to see all invoices
+            WebDriverWait(driver, 10).until(
+                EC.visibility_of_element_located((By.ID, "tabControl_InvoicesTab_HyperLink"))
+            ).click()
 
         # Press 'new invoice' to creat a new invoice
+        if before_write is not None:
+            before_write()
         WebDriverWait(driver, 10).until(
             EC.visibility_of_element_located((By.ID, "contentPlaceHolder_invoiceControl_btnNewInvoice"))
         ).click()
 
         # Input account number
-        temp_input_text = results["account_number"].replace("-", "").replace(' ', '') + convert_month_abbr(results["suggested_file_name"][-7:-4]) + results["suggested_file_name"][-2:]
+        temp_input_text = get_pps_invoice_number(results)
         WebDriverWait(driver, 10).until(
             EC.visibility_of_element_located((By.ID, "contentPlaceHolder_ContentPlaceHolder1_ctl00_txtInvoiceNumber"))
         ).send_keys(temp_input_text)
@@ -407,116 +923,17 @@ def pps_single_invoice_input(results, driver=None) -> int:
             EC.visibility_of_element_located((By.ID, "contentPlaceHolder_btnNext"))
         ).click()
 
-        # Press 'Add New Line'
-        WebDriverWait(driver, 10).until(
-            EC.visibility_of_element_located((By.ID, "contentPlaceHolder_ContentPlaceHolder1_invoiceLines_newLine"))
-        ).click()
-        # Select amount type
-        dropdown_menu = wait.until(
-            EC.presence_of_element_located((By.ID, "contentPlaceHolder_ContentPlaceHolder1_invoiceLines_accountDescription"))
-        )
-        select_dropdown = Select(dropdown_menu)
-        select_dropdown.select_by_visible_text("Electricity")
-        # Input amount
-        WebDriverWait(driver, 10).until(
-            EC.visibility_of_element_located((By.ID, "contentPlaceHolder_ContentPlaceHolder1_invoiceLines_amount"))
-        ).send_keys(str(results["total_electricity_charges"]).replace(",", ""))
-        # Press 'Update'
-        WebDriverWait(driver, 10).until(
-            EC.visibility_of_element_located((By.ID, "contentPlaceHolder_ContentPlaceHolder1_invoiceLines_btnSave"))
-        ).click()
-        # Check if amount inputted succeed
-        elements = driver.find_elements(By.XPATH, "//li[normalize-space()='Line Amount is mandatory.']")
-        times = 0
-        while elements and times < 10:
-            time.sleep(0.5)
-            print('wait')
-            WebDriverWait(driver, 10).until(
-                EC.visibility_of_element_located((By.ID, "contentPlaceHolder_ContentPlaceHolder1_invoiceLines_amount"))
-            ).send_keys(str(results["total_electricity_charges"]).replace(",", ""))
-            WebDriverWait(driver, 10).until(
-                EC.visibility_of_element_located((By.ID, "contentPlaceHolder_ContentPlaceHolder1_invoiceLines_btnSave"))
-            ).click()
-            elements = driver.find_elements(By.XPATH, "//li[normalize-space()='Line Amount is mandatory.']")
-            times += 1
+        # Input Electricity Info
+        fill_invoice_line_and_confirm(driver, "Electricity", results["total_electricity_charges"])
 
         # Input Late Payment Charges Info
         if results["Late Payment Charge"] is not None and results["Late Payment Charge"] != 0:
-            # Press 'Add New Line'
-            WebDriverWait(driver, 10).until(
-                EC.visibility_of_element_located((By.ID, "contentPlaceHolder_ContentPlaceHolder1_invoiceLines_newLine"))
-            ).click()
-            # Select amount type
-            dropdown_menu = wait.until(
-                EC.presence_of_element_located(
-                    (By.ID, "contentPlaceHolder_ContentPlaceHolder1_invoiceLines_accountDescription"))
-            )
-            select_dropdown = Select(dropdown_menu)
-            select_dropdown.select_by_visible_text("Late Payment Charges")
-            # Input amount
-            WebDriverWait(driver, 10).until(
-                EC.visibility_of_element_located((By.ID, "contentPlaceHolder_ContentPlaceHolder1_invoiceLines_amount"))
-            ).send_keys(str(results["Late Payment Charge"]).replace(",", ""))
-            # Press 'Update'
-            WebDriverWait(driver, 10).until(
-                EC.visibility_of_element_located((By.ID, "contentPlaceHolder_ContentPlaceHolder1_invoiceLines_btnSave"))
-            ).click()
-            # Check if amount inputted succeed
-            elements = driver.find_elements(By.XPATH, "//li[normalize-space()='Line Amount is mandatory.']")
-            times = 0
-            while elements and times < 10:
-                time.sleep(0.5)
-                print('wait')
-                WebDriverWait(driver, 10).until(
-                    EC.visibility_of_element_located(
-                        (By.ID, "contentPlaceHolder_ContentPlaceHolder1_invoiceLines_amount"))
-                ).send_keys(str(results["Late Payment Charge"]).replace(",", ""))
-                WebDriverWait(driver, 10).until(
-                    EC.visibility_of_element_located(
-                        (By.ID, "contentPlaceHolder_ContentPlaceHolder1_invoiceLines_btnSave"))
-                ).click()
-                elements = driver.find_elements(By.XPATH, "//li[normalize-space()='Line Amount is mandatory.']")
-                times += 1
+            fill_invoice_line_and_confirm(driver, "Late Payment Charges", results["Late Payment Charge"])
 
         # Input Electricity (Tax Exempt) Info
         ETE = round(results["balance_forward"] + results["ontario_electricity_rebate"], 2)
         if ETE is not None and ETE != 0:
-            # Press 'Add New Line'
-            WebDriverWait(driver, 10).until(
-                EC.visibility_of_element_located((By.ID, "contentPlaceHolder_ContentPlaceHolder1_invoiceLines_newLine"))
-            ).click()
-            # Select amount type
-            dropdown_menu = wait.until(
-                EC.presence_of_element_located(
-                    (By.ID, "contentPlaceHolder_ContentPlaceHolder1_invoiceLines_accountDescription"))
-            )
-            select_dropdown = Select(dropdown_menu)
-            select_dropdown.select_by_visible_text("Electricity (Tax Exempt)")
-            # Input amount
-            WebDriverWait(driver, 10).until(
-                EC.visibility_of_element_located((By.ID, "contentPlaceHolder_ContentPlaceHolder1_invoiceLines_amount"))
-            ).send_keys(ETE)
-            # Press 'Update'
-            WebDriverWait(driver, 10).until(
-                EC.visibility_of_element_located((By.ID, "contentPlaceHolder_ContentPlaceHolder1_invoiceLines_btnSave"))
-            ).click()
-            # Check if amount inputted succeed
-            elements = driver.find_elements(By.XPATH, "//li[normalize-space()='Line Amount is mandatory.']")
-            times = 0
-            while elements and times < 10:
-                time.sleep(0.5)
-                print('wait')
-                WebDriverWait(driver, 10).until(
-                    EC.visibility_of_element_located(
-                        (By.ID, "contentPlaceHolder_ContentPlaceHolder1_invoiceLines_amount"))
-                ).send_keys(ETE)
-                # Press 'Update'
-                WebDriverWait(driver, 10).until(
-                    EC.visibility_of_element_located(
-                        (By.ID, "contentPlaceHolder_ContentPlaceHolder1_invoiceLines_btnSave"))
-                ).click()
-                elements = driver.find_elements(By.XPATH, "//li[normalize-space()='Line Amount is mandatory.']")
-                times += 1
+            fill_invoice_line_and_confirm(driver, "Electricity (Tax Exempt)", ETE)
 
         # Check if the line items match
         message_text = WebDriverWait(driver, 10).until(
@@ -534,6 +951,7 @@ def pps_single_invoice_input(results, driver=None) -> int:
         WebDriverWait(driver, 10).until(
             EC.visibility_of_element_located((By.ID, "contentPlaceHolder_ContentPlaceHolder1_btnSaveAsPendingPayment"))
         ).click()
+        agreement.record_submission(results, temp_input_text)
 
         # Press 'New Payment Certificate'
         WebDriverWait(driver, 10).until(
@@ -545,27 +963,8 @@ def pps_single_invoice_input(results, driver=None) -> int:
             EC.visibility_of_element_located((By.ID, "contentPlaceHolder_ContentPlaceHolder1_paymentCertificateHeader_comments"))
         ).send_keys(results["suggested_file_name"][-7:-4] + " " + results["suggested_file_name"][-4:])
 
-        # Press 'Confirmation'
-        WebDriverWait(driver, 10).until(
-            EC.visibility_of_element_located((By.ID, "contentPlaceHolder_btnNext"))
-        ).click()
-
-        # Check if 'Confirmation' is clicked successfully
-        element = WebDriverWait(driver, 0.5).until(
-            EC.visibility_of_element_located((By.ID, "contentPlaceHolder_btnNext"))
-        )
-        times = 0
-        while element and times < 20:
-            try:
-                element.click()
-                element = WebDriverWait(driver, 0.5).until(
-                    EC.visibility_of_element_located((By.ID, "contentPlaceHolder_btnNext"))
-                )
-            except:
-                pass
-            finally:
-                time.sleep(0.5)
-                times += 1
+        # Press 'Confirmation', until the confirmation page is shown
+        click_until_gone(driver, "contentPlaceHolder_btnNext")
 
         # Press 'Save As Draft'
         WebDriverWait(driver, 10).until(
@@ -628,26 +1027,14 @@ def get_remaining_funding(driver, results) -> float:
         EC.presence_of_element_located((By.ID, "contentPlaceHolder_financialControl_distribution_gridFiscal"))
     )
 
-    # Get all rows inside the table
-    rows = table.find_elements(By.TAG_NAME, "tr")
-    is_future_fiscal_year = False
-    for row in rows:
-        # Find all cells in the row
-        cells = row.find_elements(By.TAG_NAME, "td")
-
-        if len(cells) < 3:
-            continue
+    return get_fiscal_year_remaining(remaining, snapshot_table(driver, table), current_fiscal_year)
 
-        if is_future_fiscal_year:
-            remaining -= convert_to_float(cells[1].text.strip())
-        # Check if the fiscal year is current fiscal year'
-        fiscal_year = cells[0].text.strip()
-        if fiscal_year == current_fiscal_year:
-            is_future_fiscal_year = True
-
-    return round(remaining, 2)
-
-def check_and_request_funding(driver, results) -> bool:
+def check_and_request_funding(driver, results, agreement=None, before_write=None) -> bool:
+    """
+    :param agreement: the AgreementSnapshot of the account, the remaining funding read is cached in it
+    :param before_write: a function called before the funding is requested
+    :return: True if funding was requested
+    """
     # Click if funding is in pending
     financial_information_button_text = WebDriverWait(driver, 10).until(
         EC.visibility_of_element_located((By.ID, "tabControl_Financials_HyperLink"))
@@ -658,6 +1045,9 @@ def check_and_request_funding(driver, results) -> bool:
 
     # Get remaining funding
     remaining_funding = get_remaining_funding(driver, results)
+    if agreement is not None:
+        agreement.set_remaining_funding(calculate_fiscal_year(results['statement_date']), remaining_funding,
+                                        is_funding_in_pending)
 
     # Check if funding request is needed
     if convert_to_float(results['amount_due']) <= remaining_funding:
@@ -688,20 +1078,16 @@ def check_and_request_funding(driver, results) -> bool:
     )
 
     # Get all rows inside the table
-    rows = table.find_elements(By.TAG_NAME, "tr")
-
-    is_future_fiscal_year = False
-    for row in rows:
-        # Find all cells in the row
-        cells = row.find_elements(By.TAG_NAME, "td")
+    rows = snapshot_table(driver, table)
 
+    for row_index, cells in enumerate(rows):
         if len(cells) < 3:
             continue
 
         # Check if the fiscal year is current fiscal year'
-        fiscal_year = cells[0].text.strip()
+        fiscal_year = cells[0].strip()
         if fiscal_year == current_fiscal_year:
-            input_bar = cells[2].find_element(By.TAG_NAME, "input")
+            input_bar = get_table_cell_element(driver, table, row_index, 2, "input")
             input_bar.send_keys(str(approximate_amount_needed))
 
     # Input total amount adjustment
@@ -717,9 +1103,13 @@ def check_and_request_funding(driver, results) -> bool:
     ).send_keys('ADJ')
 
     # Click 'Request Approval
+    if before_write is not None:
+        before_write()
     WebDriverWait(driver, 10).until(
         EC.visibility_of_element_located((By.ID, "contentPlaceHolder_operationsControl_btnRequestApproval"))
     ).click()
+    if agreement is not None:
+        agreement.record_funding_request()
 
     return True
 
@@ -728,13 +1118,13 @@ def tester_function(results, driver=None):
     # 1. Launch browser (make sure you have installed ChromeDriver or another WebDriver)
     quit_after = False
     if driver is None:
-        driver = webdriver.Chrome()
+        driver = create_driver()
         quit_after = True
         login(driver)
 
     try:
         # 8. Now that you’re logged in, navigate to your actual target URL
-        driver.get(TARGET_URL)
+        driver.get(Global_variables.pps_url)
 
         # 9. At this point, you should be in your authenticated session.
 
@@ -767,26 +1157,21 @@ def tester_function(results, driver=None):
         )
 
         # Get all rows inside the table
-        rows = table.find_elements(By.TAG_NAME, "tr")
+        rows = snapshot_table(driver, table)
 
         approved_rows = []
-        for row in rows:
-            # Find all cells in the row
-            cells = row.find_elements(By.TAG_NAME, "td")
-
+        for row_index, cells in enumerate(rows):
             # We need at least 2 cells: first cell is clickable text, second cell is 'Approved' or 'Completed'
             if len(cells) >= 2:
-                status_text = cells[1].text.strip()
+                status_text = cells[1].strip()
                 if status_text == "Approved":
-                    approved_rows.append(row)
+                    approved_rows.append(row_index)
 
             # Check if exactly one row has 'Approved'
         if len(approved_rows) == 1:
             # Find the first cell of that row and click the clickable link inside it
-            row = approved_rows[0]
             # Typically the first cell might contain a link, e.g. <td><a>Clickable Text</a></td>
-            first_cell = row.find_elements(By.TAG_NAME, "td")[0]
-            clickable_link = first_cell.find_element(By.TAG_NAME, "a")
+            clickable_link = get_table_cell_element(driver, table, approved_rows[0], 0, "a")
             clickable_link.click()
             print("Clicked on the only row with 'Approved'.")
         else:
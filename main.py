@@ -1,3 +1,5 @@
+import multiprocessing
+
 import pyautogui
 
 import time
@@ -12,12 +14,10 @@ from Model import Model
 
 from pynput.mouse import Controller as MouseController, Button
 
-from VendorInvoicesExtraction.NTP import parse_NTP_bill
-from VendorInvoicesExtraction.burlington_hydro_scan import parse_burlington_hydro_bill
-from VendorInvoicesExtraction.hydro_one import parse_hydro_one_bill
+from VendorInvoicesExtraction.registry import get_vendor_parser
+from Web_page_interact import pps_sessions
 from scan_helper import find_file_with_substring, copy_as_pdf_in_original_and_destination, self_check, \
     months_since_invoice
-from VendorInvoicesExtraction.welland_scan import parse_welland_bill
 
 def keep_active():
     print("Keeping Microsoft Teams active. Press Ctrl+C to stop.")
@@ -31,7 +31,7 @@ def keep_active():
 
 def print_results(invoice):
     pdf_file_path = find_file_with_substring(r"C:\Users\LiBo3\Downloads", invoice)
-    results = parse_hydro_one_bill(pdf_file_path)
+    results = get_vendor_parser("Hydro One")(pdf_file_path)
     for key, value in results.items():
         print(f"{key}: {value}")
     print(self_check(results))
@@ -45,8 +45,13 @@ def run_app():
     view = MainWindow()
     controller = Controller(model, view)
 
+    # The browsers are kept open across batches, close them with the app
+    app.aboutToQuit.connect(pps_sessions.quit_all)
+
     view.show()
     sys.exit(app.exec_())
 
 if __name__ == "__main__":
+    # Required by the invoice scanning process pool in the packaged exe
+    multiprocessing.freeze_support()
     print_results('200295488946')
@@ -4,7 +4,7 @@ import os
 import re
 import shutil
 
-from CustomizedExceptions import InvoicePDFNotFoundError, AmountError, NegativeAmountError
+from CustomizedExceptions import InvoicePDFNotFoundError, AmountError, NegativeAmountError, AmbiguousInvoicePDFError
 
 
 def convert_to_float(amount_str) -> float:
@@ -25,30 +25,84 @@ def convert_to_float(amount_str) -> float:
         # If there's any error in conversion, return None
         return None
 
-def find_file_with_substring(directory_path, substring):
+class FieldMatches(dict):
     """
-    Returns the first file name in 'directory_path' that contains 'substring'.
-    If no file names match, returns None.
+    Matches of a vendor's field pattern table in the text of one bill.
+    Each pattern is searched the first time its field is read, and at most once per bill.
     """
-    try:
-        # Get a list of all items in the directory
-        entries = os.listdir(directory_path)
+    def __init__(self, text, field_patterns):
+        super().__init__()
+        self.text = text
+        self.field_patterns = field_patterns
 
-        # Iterate through each entry
-        for entry in entries:
-            # Check if the substring is in the file name
-            if substring.replace(" ", "") in entry.replace(" ", ""):
-                return directory_path +  "\\" + entry  # Return the first match
+    def __missing__(self, field):
+        match = self.field_patterns[field].search(self.text)
+        self[field] = match
+        return match
 
-        # If no match is found
-        raise InvoicePDFNotFoundError(substring)
 
-    except FileNotFoundError:
-        print(f"Directory not found: {directory_path}")
-        return None
-    except PermissionError:
-        print(f"Permission denied to access: {directory_path}")
-        return None
+def search_fields(text, field_patterns) -> FieldMatches:
+    """
+    Returns the matches of the field pattern table in the text.
+    :param text: the text extracted from the invoice PDF
+    :param field_patterns: a dict of field name -> compiled pattern
+    """
+    return FieldMatches(text, field_patterns)
+
+def normalize_account_number(account_number) -> str:
+    """Removes spaces and dashes, so '1234-567 89' and '123456789' are the same account"""
+    return str(account_number).replace(" ", "").replace("-", "").upper()
+
+
+class InvoicePDFIndex:
+    """
+    The file names of the invoice folder, listed once per batch.
+    Looking up an account searches the names in memory instead of listing the folder again,
+    and the result is remembered per normalized account number.
+    """
+    def __init__(self, directory_path):
+        self.directory_path = directory_path
+        self.entries = []
+        self.found = dict()
+        try:
+            with os.scandir(directory_path) as it:
+                for entry in it:
+                    if entry.is_file():
+                        stem, _ = os.path.splitext(entry.name)
+                        self.entries.append((normalize_account_number(stem), entry.name))
+        except FileNotFoundError:
+            print(f"Directory not found: {directory_path}")
+        except PermissionError:
+            print(f"Permission denied to access: {directory_path}")
+
+    def find(self, account_number) -> str:
+        """
+        Returns the path of the only file whose name contains the account number.
+        A file named exactly as the account number is taken over longer names containing it.
+        :raise InvoicePDFNotFoundError: no file name contains the account number
+        :raise AmbiguousInvoicePDFError: more than one file name contains the account number
+        """
+        key = normalize_account_number(account_number)
+        if key not in self.found:
+            file_names = [name for stem, name in self.entries if stem == key]
+            if len(file_names) == 0:
+                file_names = [name for stem, name in self.entries if key in stem]
+            self.found[key] = file_names
+
+        file_names = self.found[key]
+        if len(file_names) == 0:
+            raise InvoicePDFNotFoundError(account_number)
+        if len(file_names) > 1:
+            raise AmbiguousInvoicePDFError(account_number, file_names)
+        return os.path.join(self.directory_path, file_names[0])
+
+
+def find_file_with_substring(directory_path, substring):
+    """
+    Returns the path of the file in 'directory_path' whose name contains 'substring'.
+    To look up many invoices, build one InvoicePDFIndex and call its find method instead.
+    """
+    return InvoicePDFIndex(directory_path).find(substring)
 
 
 def copy_as_pdf_in_original_and_destination(
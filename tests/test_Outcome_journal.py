@@ -0,0 +1,171 @@
+"""
+Tests of writing the outcome journal into the Excel files.
+Run from the project folder: python -m unittest discover tests
+"""
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import openpyxl
+
+import Excel_helper
+import Global_variables
+from Batch_checkpoint import BatchCheckpoint, PARSED, PDF_COPIED
+from Excel_helper import read_cell_content_from_first_two_col
+from Outcome_journal import OutcomeJournal, sync_excel_from_journal, read_unsynced_done_accounts, SUCCEED, FAILED, DONE
+
+PATH_NAMES = ["todo_invoices_excel_path", "succeed_invoices_excel_path", "funding_requested_excel_path",
+              "failed_invoices_excel_path", "saved_invoices_excel_path", "outcome_journal_path",
+              "outcome_journal_offsets_path", "batch_checkpoint_path"]
+
+
+def write_excel(file_path, header, rows=()):
+    wb = openpyxl.Workbook()
+    wb.active.title = "Sheet1"
+    wb.active.append(header)
+    for row in rows:
+        wb.active.append(list(row))
+    wb.save(file_path)
+
+
+class JournalTestCase(unittest.TestCase):
+    """Points Global_variables at new Excel files and an empty journal in a temp folder"""
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.old_paths = {name: getattr(Global_variables, name) for name in PATH_NAMES}
+        for name in PATH_NAMES:
+            extension = ".xlsx" if name.endswith("excel_path") else ".jsonl"
+            setattr(Global_variables, name, os.path.join(self.temp_dir.name, name + extension))
+        write_excel(Global_variables.todo_invoices_excel_path, ["Invoice Number", "Vendor"],
+                    [("1068968", "Fortis"), ("52047-01", "Welland"), ("7654321", "Grimsby")])
+        write_excel(Global_variables.succeed_invoices_excel_path, ["Invoice Number", "Date", "Accrual Total"])
+        write_excel(Global_variables.funding_requested_excel_path, ["Invoice Number", "Date", "Accrual Total"])
+        write_excel(Global_variables.failed_invoices_excel_path, ["Invoice Number", "Comments"])
+        write_excel(Global_variables.saved_invoices_excel_path, ["Invoice Number"])
+        self.real_save_workbook = Excel_helper.save_workbook
+
+    def tearDown(self):
+        for name, path in self.old_paths.items():
+            setattr(Global_variables, name, path)
+        self.temp_dir.cleanup()
+
+    def fail_saving(self, failed_path, exception):
+        def save_workbook(wb, file_path):
+            if file_path == failed_path:
+                raise exception
+            self.real_save_workbook(wb, file_path)
+        return mock.patch.object(Excel_helper, "save_workbook", save_workbook)
+
+    def read_accounts(self, file_path):
+        return [row[0] for row in read_cell_content_from_first_two_col(file_path, "Sheet1")]
+
+
+class TestSyncExcelFromJournal(JournalTestCase):
+    def record_batch(self):
+        with OutcomeJournal() as journal:
+            journal.record(SUCCEED, "1068968", ("1068968", "2025-01-05", 82.72))
+            journal.record(DONE, "1068968")
+            journal.record(FAILED, "52047-01", ("52047-01", "already has a pending payment"))
+            journal.record(DONE, "52047-01")
+
+    def test_sync_and_compact(self):
+        self.record_batch()
+        self.assertTrue(sync_excel_from_journal())
+        self.assertEqual(self.read_accounts(Global_variables.succeed_invoices_excel_path), ["1068968"])
+        self.assertEqual(self.read_accounts(Global_variables.failed_invoices_excel_path), ["52047-01"])
+        self.assertEqual(self.read_accounts(Global_variables.todo_invoices_excel_path), ["7654321"])
+        # Every entry is in the Excel files, the journal is not needed any more
+        self.assertFalse(os.path.exists(Global_variables.outcome_journal_path))
+        self.assertFalse(os.path.exists(Global_variables.outcome_journal_offsets_path))
+
+    def test_failed_save_after_saved_workbook(self):
+        # The first workbook is saved before the second one raises, its row must not be written twice
+        self.record_batch()
+        saved_paths = []
+
+        def save_workbook(wb, file_path):
+            if len(saved_paths) == 1:
+                raise OSError("disk full")
+            self.real_save_workbook(wb, file_path)
+            saved_paths.append(file_path)
+        with mock.patch.object(Excel_helper, "save_workbook", save_workbook):
+            self.assertFalse(sync_excel_from_journal())
+        self.assertEqual(len(saved_paths), 1)
+
+        self.assertTrue(sync_excel_from_journal())
+        self.assertEqual(self.read_accounts(Global_variables.succeed_invoices_excel_path), ["1068968"])
+        self.assertEqual(self.read_accounts(Global_variables.failed_invoices_excel_path), ["52047-01"])
+        self.assertEqual(self.read_accounts(Global_variables.todo_invoices_excel_path), ["7654321"])
+
+    def test_locked_todo(self):
+        self.record_batch()
+        with self.fail_saving(Global_variables.todo_invoices_excel_path, PermissionError("open in Excel")):
+            self.assertFalse(sync_excel_from_journal())
+            self.assertEqual(read_unsynced_done_accounts(), ["1068968", "52047-01"])
+        self.assertTrue(os.path.exists(Global_variables.outcome_journal_path))
+
+        self.assertTrue(sync_excel_from_journal())
+        self.assertEqual(read_unsynced_done_accounts(), [])
+        self.assertEqual(self.read_accounts(Global_variables.succeed_invoices_excel_path), ["1068968"])
+
+    def test_no_compaction_while_journal_open(self):
+        with OutcomeJournal() as journal:
+            journal.record(FAILED, "7654321", ("7654321", "Found 'Do not pay' in comments"))
+            self.assertTrue(sync_excel_from_journal())
+            self.assertTrue(os.path.exists(Global_variables.outcome_journal_path))
+            journal.record(DONE, "7654321")
+        self.assertTrue(sync_excel_from_journal())
+        self.assertEqual(self.read_accounts(Global_variables.failed_invoices_excel_path), ["7654321"])
+        self.assertFalse(os.path.exists(Global_variables.outcome_journal_path))
+
+    def test_offsets_of_removed_journal(self):
+        # Left by a sync which stopped between removing the journal and removing the offsets
+        with open(Global_variables.outcome_journal_offsets_path, "w", encoding="utf-8") as f:
+            json.dump({Global_variables.succeed_invoices_excel_path: 5000}, f)
+        self.record_batch()
+        self.assertTrue(sync_excel_from_journal())
+        self.assertEqual(self.read_accounts(Global_variables.succeed_invoices_excel_path), ["1068968"])
+
+
+class TestLedgerCheckpoint(JournalTestCase):
+    """The invoices of a batch which stopped between journaling DONE and recording LEDGERED"""
+    def record_stopped_batch(self):
+        checkpoint = BatchCheckpoint()
+        checkpoint.record("1068968|1068968.pdf|100|1", PDF_COPIED)
+        # Left in To Do by the batch, it is kept
+        checkpoint.record("7654321|7654321.pdf|100|1", PARSED)
+        with OutcomeJournal() as journal:
+            journal.record(SUCCEED, "1068968", ("1068968", "2025-01-05", 82.72))
+            journal.record(DONE, "1068968", checkpoint_key="1068968|1068968.pdf|100|1")
+        checkpoint.close()
+
+    def test_closed_checkpoint(self):
+        self.record_stopped_batch()
+        self.assertTrue(sync_excel_from_journal())
+        with BatchCheckpoint() as checkpoint:
+            self.assertIsNone(checkpoint.get_state("1068968|1068968.pdf|100|1"))
+            self.assertEqual(checkpoint.get_state("7654321|7654321.pdf|100|1"), PARSED)
+
+    def test_open_checkpoint(self):
+        self.record_stopped_batch()
+        with BatchCheckpoint() as checkpoint:
+            self.assertEqual(checkpoint.get_state("1068968|1068968.pdf|100|1"), PDF_COPIED)
+            self.assertTrue(sync_excel_from_journal())
+            self.assertIsNone(checkpoint.get_state("1068968|1068968.pdf|100|1"))
+            checkpoint.finish()
+        with BatchCheckpoint() as checkpoint:
+            self.assertEqual(list(checkpoint.states), ["7654321|7654321.pdf|100|1"])
+
+    def test_checkpoint_while_todo_locked(self):
+        # Still in To Do, so the checkpoint keeps it
+        self.record_stopped_batch()
+        with self.fail_saving(Global_variables.todo_invoices_excel_path, PermissionError("open in Excel")):
+            self.assertFalse(sync_excel_from_journal())
+        with BatchCheckpoint() as checkpoint:
+            self.assertEqual(checkpoint.get_state("1068968|1068968.pdf|100|1"), PDF_COPIED)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,203 @@
+"""
+Tests of PPS_http_client against saved PPS pages and the pages of Mock_PPS_server.
+Run from the project folder: python -m unittest discover tests
+"""
+import os
+import threading
+import unittest
+
+import requests
+
+import Global_variables
+from Mock_PPS_server import create_mock_pps_server, get_home_url, name_of
+from PPS_http_client import PPSHttpClient, PPSHttpError, WebFormsPage, get_postback_target
+
+PAGES_DIR_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pages")
+PAGE_URL = "https://pps.mto.ad.gov.on.ca/InvoiceLines.aspx?InvoiceId=48213&AwardId=9917"
+LINES = "contentPlaceHolder_ContentPlaceHolder1_invoiceLines_"
+
+
+def read_page(file_name, url=PAGE_URL) -> WebFormsPage:
+    with open(os.path.join(PAGES_DIR_PATH, file_name), "r", encoding="utf-8") as f:
+        return WebFormsPage(url, f.read())
+
+
+def make_response(url, html, status_code=200) -> requests.Response:
+    response = requests.Response()
+    response.status_code = status_code
+    response.url = url
+    response.encoding = "utf-8"
+    response._content = html.encode("utf-8")
+    return response
+
+
+class RecordingSession:
+    """Answers every request with the same saved page, and keeps what was sent"""
+    def __init__(self, response):
+        self.response = response
+        self.requests = []
+
+    def get(self, url, timeout=None):
+        self.requests.append(("GET", url, None))
+        return self.response
+
+    def post(self, url, data=None, timeout=None):
+        self.requests.append(("POST", url, data))
+        return self.response
+
+
+class PPSUrlTestCase(unittest.TestCase):
+    pps_url = "https://pps.mto.ad.gov.on.ca/Home.aspx"
+
+    def setUp(self):
+        self.old_pps_url = Global_variables.pps_url
+        Global_variables.pps_url = self.pps_url
+
+    def tearDown(self):
+        Global_variables.pps_url = self.old_pps_url
+
+
+class TestWebFormsPage(unittest.TestCase):
+    def setUp(self):
+        self.page = read_page("invoice_lines.html")
+
+    def test_hidden_fields(self):
+        data = self.page.get_form_data()
+        self.assertTrue(data["__VIEWSTATE"].startswith("/wEPDwUKMTY3NzE5MjIyMA9k"))
+        self.assertEqual(data["__VIEWSTATEGENERATOR"], "5D6A4F0C")
+        self.assertTrue(data["__EVENTVALIDATION"].startswith("/wEdAAjXq3Q2v9yOa0W5"))
+        self.assertEqual(data["__EVENTTARGET"], "")
+        self.assertEqual(data["__LASTFOCUS"], "")
+
+    def test_form_fields(self):
+        data = self.page.get_form_data()
+        # The selected option, the checked checkbox and the textarea text, no buttons
+        self.assertEqual(data[name_of(LINES + "accountDescription")], "101")
+        self.assertEqual(data[name_of(LINES + "taxable")], "on")
+        self.assertNotIn(name_of(LINES + "exempt"), data)
+        self.assertEqual(data[name_of(LINES + "note")], "Dec 2024 & Jan 2025")
+        self.assertEqual(data[name_of(LINES + "amount")], "")
+        self.assertNotIn(name_of(LINES + "btnSave"), data)
+        self.assertNotIn(name_of("contentPlaceHolder_btnNext"), data)
+
+    def test_action(self):
+        self.assertEqual(self.page.action, "https://pps.mto.ad.gov.on.ca/InvoiceLines.aspx?InvoiceId=48213&AwardId=9917")
+
+    def test_texts_and_tables(self):
+        self.assertEqual(self.page.get_text("PPSHeader_messageText"),
+                         "The line items total does not match the invoice total.")
+        self.assertEqual(self.page.get_table_rows(LINES + "lines"), [[], ["Electricity", "82.72"]])
+        self.assertEqual(self.page.get_option_value(LINES + "accountDescription", "Late Payment Charges"), "102")
+        self.assertTrue(self.page.has_message("Line Amount is mandatory."))
+        self.assertFalse(self.page.has_message("Invoice Number is mandatory."))
+
+    def test_missing_element(self):
+        with self.assertRaises(PPSHttpError):
+            self.page.get_field("contentPlaceHolder_pbSearch")
+        with self.assertRaises(PPSHttpError):
+            self.page.get_option_value(LINES + "accountDescription", "Water")
+
+
+class TestPostbackTarget(unittest.TestCase):
+    def test_do_postback_link(self):
+        link = read_page("invoice_lines.html").get_link("tabControl_Financials_HyperLink")
+        self.assertEqual(get_postback_target(link["href"]), ("ctl00$tabControl$Financials", ""))
+
+    def test_postback_options_link(self):
+        link = read_page("invoice_lines.html").get_link("tabControl_InvoicesTab_HyperLink")
+        self.assertEqual(get_postback_target(link["href"]), ("ctl00$tabControl$InvoicesTab", ""))
+
+    def test_auto_postback_dropdown(self):
+        field = read_page("invoice_lines.html").get_field(LINES + "accountDescription")
+        self.assertEqual(get_postback_target(field["onchange"]),
+                         ("ctl00$contentPlaceHolder$ContentPlaceHolder1$invoiceLines$accountDescription", ""))
+
+    def test_plain_link(self):
+        self.assertIsNone(get_postback_target("Search.aspx?AwardTypeId=8"))
+
+
+class TestPostBack(PPSUrlTestCase):
+    def setUp(self):
+        super().setUp()
+        self.page = read_page("invoice_lines.html")
+        self.session = RecordingSession(make_response(PAGE_URL, self.page.html))
+        self.client = PPSHttpClient(self.session)
+
+    def test_button_body(self):
+        self.client.click_button(self.page, LINES + "btnSave", {LINES + "amount": "16.16"})
+        method, url, data = self.session.requests[-1]
+        self.assertEqual((method, url), ("POST", self.page.action))
+        self.assertEqual(data["__VIEWSTATE"], self.page.get_field("__VIEWSTATE")["value"])
+        self.assertEqual(data["__EVENTVALIDATION"], self.page.get_field("__EVENTVALIDATION")["value"])
+        self.assertEqual(data["__EVENTTARGET"], "")
+        self.assertEqual(data[name_of(LINES + "amount")], "16.16")
+        self.assertEqual(data[name_of(LINES + "btnSave")], "Update")
+        self.assertNotIn(name_of("contentPlaceHolder_btnNext"), data)
+
+    def test_link_body(self):
+        self.client.click_link(self.page, self.page.get_link("tabControl_Financials_HyperLink"))
+        method, url, data = self.session.requests[-1]
+        self.assertEqual(method, "POST")
+        self.assertEqual(data["__EVENTTARGET"], "ctl00$tabControl$Financials")
+        self.assertEqual(data["__EVENTARGUMENT"], "")
+        self.assertNotIn(name_of(LINES + "btnSave"), data)
+
+    def test_auto_postback_select(self):
+        posted_back_page = self.client.select_option(self.page, LINES + "accountDescription", "Late Payment Charges")
+        self.assertIsNotNone(posted_back_page)
+        method, url, data = self.session.requests[-1]
+        self.assertEqual(data["__EVENTTARGET"], "ctl00$contentPlaceHolder$ContentPlaceHolder1$invoiceLines$accountDescription")
+        self.assertEqual(data[name_of(LINES + "accountDescription")], "102")
+
+    def test_login_expired(self):
+        self.session.response = make_response(
+            "https://login.microsoftonline.com/common/oauth2/authorize?client_id=1", "<html><body></body></html>")
+        with self.assertRaisesRegex(PPSHttpError, "expired"):
+            self.client.click_button(self.page, LINES + "btnSave")
+
+    def test_server_error(self):
+        self.session.response = make_response(
+            PAGE_URL, "<html><body><h1>Server Error in '/' Application.</h1></body></html>", status_code=500)
+        with self.assertRaises(requests.HTTPError):
+            self.client.click_button(self.page, LINES + "btnSave")
+
+
+class TestMockPPS(PPSUrlTestCase):
+    """Replays the postbacks against the pages served by Mock_PPS_server"""
+    def setUp(self):
+        self.server = create_mock_pps_server(seed=0)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.pps_url = get_home_url(self.server)
+        super().setUp()
+        self.client = PPSHttpClient(requests.Session())
+
+    def tearDown(self):
+        super().tearDown()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def open_search(self) -> WebFormsPage:
+        page = self.client.get(Global_variables.pps_url)
+        links = [link for link in page.links if link["class"] == "homeLink"]
+        return self.client.click_link(page, links[0])
+
+    def test_search_and_open_agreement(self):
+        page = self.client.click_button(self.open_search(), "contentPlaceHolder_pbSearch",
+                                        {"contentPlaceHolder_utilityAccount": "1068968"})
+        self.assertEqual(page.get_table_rows("contentPlaceHolder_searchResult")[1], ["1068968", "Approved"])
+        page = self.client.click_link(page, {"href": page.tables["contentPlaceHolder_searchResult"][1][0]["hrefs"][0]})
+        self.assertEqual(page.get_field("contentPlaceHolder_agreementControl_ctl00_description")["value"],
+                         "Utility account 1068968")
+        page = self.client.click_link(page, page.get_link("tabControl_InvoicesTab_HyperLink"))
+        self.assertTrue(page.has_element("contentPlaceHolder_invoiceControl_btnNewInvoice"))
+
+    def test_stale_view_state(self):
+        # A second postback from the same page posts a view state the server has replaced
+        page = self.open_search()
+        self.client.click_button(page, "contentPlaceHolder_pbSearch", {"contentPlaceHolder_utilityAccount": "1068968"})
+        with self.assertRaises(requests.HTTPError):
+            self.client.click_button(page, "contentPlaceHolder_pbSearch", {"contentPlaceHolder_utilityAccount": "1068968"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+"""
+Tests of Todo_import and of finding the vendor of an account number.
+Run from the project folder: python -m unittest discover tests
+"""
+import os
+import tempfile
+import unittest
+
+import openpyxl
+
+from Todo_import import is_account_number, parse_pasted_text, read_import_file, describe_rejected_rows
+from VendorInvoicesExtraction.registry import get_vendor_for_account
+
+
+class TestAccountNumber(unittest.TestCase):
+    def test_accounts(self):
+        for text in ("1068968", "123456-1234567", "1234 5678 90", "52047-01"):
+            self.assertTrue(is_account_number(text), text)
+
+    def test_minimum_digits(self):
+        self.assertTrue(is_account_number("1234567"))
+        self.assertTrue(is_account_number("12345-67"))
+        self.assertFalse(is_account_number("123456"))
+        self.assertFalse(is_account_number("1234-56"))
+
+    def test_not_accounts(self):
+        for text in ("1", "12", "2024", "12345", "2024 01 05", "2024-01-05", "05-01-2024", "82.72", "Hydro One", ""):
+            self.assertFalse(is_account_number(text), text)
+
+
+class TestPastedText(unittest.TestCase):
+    def test_header_column(self):
+        # Only the 'Account Number' column is read, not the row numbers or the dates
+        text = ("#\tAccount Number\tDue Date\tVendor\n"
+                "1\t1068968\t2024 01 05\tFortis\n"
+                "2\t123456-1234567\t2024 02 05\t\n"
+                "3\tpending\t2024 03 05\tGrimsby\n")
+        invoices, rejected_rows = parse_pasted_text(text)
+        self.assertEqual(invoices, [["1068968", "Fortis"], ["123456-1234567", None]])
+        self.assertEqual(rejected_rows, [(4, "3 pending 2024 03 05 Grimsby")])
+
+    def test_without_header(self):
+        text = "1068968, Grimsby\n\n7\n2024 01 05\n1234 5678 90; 52047-01\n"
+        invoices, rejected_rows = parse_pasted_text(text)
+        self.assertEqual(invoices, [["1068968", "Grimsby"], ["1234567890", None], ["52047-01", None]])
+        self.assertEqual(rejected_rows, [(3, "7"), (4, "2024 01 05")])
+
+    def test_describe_rejected_rows(self):
+        rejected_rows = [(row_number, "total") for row_number in range(2, 9)]
+        self.assertEqual(describe_rejected_rows(rejected_rows[:2]),
+                         "2 rows have no account number: row 2 'total', row 3 'total'")
+        self.assertTrue(describe_rejected_rows(rejected_rows).endswith("row 6 'total', ..."))
+
+
+class TestImportFile(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_csv(self):
+        file_path = os.path.join(self.temp_dir.name, "todo.csv")
+        with open(file_path, "w", encoding="utf-8-sig", newline="") as f:
+            f.write("Vendor,Account #,Amount\nWelland,52047-01,82.72\nTotal,,82.72\n")
+        self.assertEqual(read_import_file(file_path), ([["52047-01", "Welland"]], [(3, "Total 82.72")]))
+
+    def test_excel(self):
+        # Excel keeps account numbers typed as numbers as floats
+        file_path = os.path.join(self.temp_dir.name, "todo.xlsx")
+        wb = openpyxl.Workbook()
+        wb.active.append(["Invoice Number", "Vendor Name"])
+        wb.active.append([1068968.0, "Fortis"])
+        wb.active.append([2024.0, None])
+        wb.save(file_path)
+        self.assertEqual(read_import_file(file_path), ([["1068968", "Fortis"]], [(3, "2024")]))
+
+    def test_unsupported_file(self):
+        with self.assertRaises(ValueError):
+            read_import_file(os.path.join(self.temp_dir.name, "todo.pdf"))
+
+
+class TestVendorForAccount(unittest.TestCase):
+    def test_unique_formats(self):
+        self.assertEqual(get_vendor_for_account("123456-1234567"), "Burlington Hydro")
+        self.assertEqual(get_vendor_for_account("1234567-8901"), "NTP")
+
+    def test_ambiguous_formats(self):
+        # Plain digits could be Hydro One or any vendor with numeric accounts, 'digits-2 digits' could be Welland or NPE
+        for account_number in ("1068968", "123456789012", "52047-01", "1234567-890"):
+            self.assertIsNone(get_vendor_for_account(account_number), account_number)
+
+
+if __name__ == "__main__":
+    unittest.main()